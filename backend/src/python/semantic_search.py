@@ -19,6 +19,22 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(CURRENT_DIR, "..", "data")
 CSV_PATH = os.path.join(DATA_DIR, "hotels.csv")
 EMBEDDINGS_PATH = os.path.join(CURRENT_DIR, "hotel_embeddings.npy")
+# Stamp (digest CSV + model + code tạo text) để --create-embeddings bỏ qua khi đã cập nhật
+EMBEDDINGS_STAMP_PATH = os.path.join(CURRENT_DIR, "hotel_embeddings.stamp.json")
+BUILD_CACHE_DIR = os.path.join(CURRENT_DIR, "build_cache")
+
+# Loader hotels.csv (hotel_data.py), GeoIndex, NameIndex + pipeline build có cache dùng chung với python-ai:
+# backend bắt buộc có thư mục python-ai (mặc định cạnh backend/, đổi bằng PYTHON_AI_DIR khi deploy riêng)
+PYTHON_AI_DIR = os.path.abspath(os.getenv("PYTHON_AI_DIR") or os.path.join(CURRENT_DIR, "..", "..", "..", "python-ai"))
+if not os.path.isfile(os.path.join(PYTHON_AI_DIR, "hotel_data.py")):
+    # exit != 0 -> route Node chuyển sang fallbackSimpleSearch
+    sys.exit(f"semantic_search.py cần các module của python-ai (hotel_data, geo_index, name_index, build_pipeline); "
+             f"không tìm thấy ở {PYTHON_AI_DIR} - copy thư mục python-ai hoặc đặt PYTHON_AI_DIR")
+sys.path.insert(0, PYTHON_AI_DIR)
+from hotel_data import load_hotels, missing_coords_mask, read_hotels_csv
+from geo_index import GeoIndex
+from name_index import NameIndex
+from build_pipeline import BuildPipeline, VectorCache, code_fingerprint, file_digest
 
 # Model name
 EMBEDDING_MODEL_NAME = "AITeamVN/Vietnamese_Embedding"
@@ -29,6 +45,8 @@ _model = None
 _device = None
 _cached_df = None
 _cached_embeddings = None
+_cached_geo = None
+_cached_names = None
 
 
 def get_device():
@@ -147,25 +165,12 @@ def safe_price(x):
         return ''
 
 
-def create_embeddings():
-    """Tạo embeddings cho tất cả khách sạn và lưu file."""
-    import torch
-    import torch.nn.functional as F
-    
-    print("Creating hotel embeddings...", file=sys.stderr)
-    
-    # Load model
-    tokenizer, model, device = load_model()
-    
-    # Load CSV
-    df = pd.read_csv(CSV_PATH)
-    print(f"Loaded {len(df)} hotels from {CSV_PATH}", file=sys.stderr)
-    
-    # Tạo text cho mỗi khách sạn
+def build_hotel_texts(df):
+    """Text đại diện mỗi khách sạn để embed."""
     def get_col(name):
         return df[name] if name in df.columns else pd.Series([''] * len(df))
     
-    df['all_text'] = (
+    return (
         get_col('hotelname').apply(safe_str) + ' ' +
         get_col('address').apply(safe_str) + ' ' +
         get_col('searchString').apply(safe_str) + ' ' +
@@ -175,9 +180,11 @@ def create_embeddings():
         get_col('star').apply(parse_star_rating) + ' ' +
         get_col('amenities').apply(safe_str) + ' ' +
         get_col('reviews').apply(safe_str)
-    ).str.strip()
-    
-    all_texts = df['all_text'].tolist()
+    ).str.strip().tolist()
+
+
+def _encode_all(all_texts):
+    tokenizer, model, device = load_model()
     
     # Tạo embeddings theo batch - tăng batch size để nhanh hơn
     embeddings = []
@@ -191,30 +198,77 @@ def create_embeddings():
         progress = min(i + batch_size, len(all_texts))
         print(f"Processed {progress}/{len(all_texts)} hotels...", file=sys.stderr)
     
+    return np.vstack(embeddings)
+
+
+def create_embeddings(force=False):
+    """Tạo embeddings cho tất cả khách sạn và lưu file.
+    
+    Bỏ qua nếu CSV, model và code tạo text không đổi từ lần build trước (trừ khi force=True);
+    khi build lại chỉ encode các text mới / đã đổi (cache theo hash text).
+    """
+    print("Creating hotel embeddings...", file=sys.stderr)
+    
+    pipe = BuildPipeline(BUILD_CACHE_DIR, label="semantic_search --create-embeddings")
+    with pipe.timed("hash_csv"):
+        key = {
+            "csv": file_digest(CSV_PATH),
+            "model": EMBEDDING_MODEL_NAME,
+            "code": code_fingerprint(build_hotel_texts, safe_str, safe_price, parse_star_rating, mean_pooling, encode_texts),
+        }
+    if not force and pipe.up_to_date(EMBEDDINGS_STAMP_PATH, key, [EMBEDDINGS_PATH]):
+        pipe.print_report(file=sys.stderr)
+        return {"success": True, "message": "Embeddings already up to date", "path": EMBEDDINGS_PATH, "skipped": True}
+    
+    with pipe.timed("parse_csv"):
+        df = read_hotels_csv(CSV_PATH)
+        all_texts = build_hotel_texts(df)
+    print(f"Loaded {len(df)} hotels from {CSV_PATH}", file=sys.stderr)
+    
+    with pipe.timed("embeddings") as row:
+        hotel_embeddings, n_new = VectorCache(BUILD_CACHE_DIR, EMBEDDING_MODEL_NAME).embed(all_texts, _encode_all)
+        row.update(status="built" if n_new else "cached", embedded=n_new, reused=len(all_texts) - n_new)
+    
     # Ghép và normalize
-    hotel_embeddings = np.vstack(embeddings)
     hotel_embeddings = hotel_embeddings / np.linalg.norm(hotel_embeddings, axis=1, keepdims=True)
     
     # Lưu file
     np.save(EMBEDDINGS_PATH, hotel_embeddings)
     print(f"Saved embeddings to {EMBEDDINGS_PATH}", file=sys.stderr)
     
+    pipe.write_stamp(EMBEDDINGS_STAMP_PATH, key)
+    pipe.print_report(file=sys.stderr)
+    
     return {"success": True, "message": f"Created embeddings for {len(df)} hotels", "path": EMBEDDINGS_PATH}
 
 
-def search(query, top_k=20, min_price=None, max_price=None, min_star=None, district=None):
-    """Tìm kiếm khách sạn bằng semantic search."""
-    global _cached_df, _cached_embeddings
+def search(query, top_k=20, min_price=None, max_price=None, min_star=None, district=None,
+           near_lat=None, near_lon=None, radius_km=None, sort_by=None):
+    """Tìm kiếm khách sạn bằng semantic search.
+
+    near_lat/near_lon (+ radius_km): lọc bán kính qua GeoIndex, kết quả có distance_km;
+    sort_by="distance": lấy top_k khách sạn gần nhất trong tập đã lọc thay vì top_k giống query nhất.
+    Query chứa tên khách sạn (kể cả gõ sai / không dấu, NameIndex.lookup) -> khách sạn đó lên đầu, name_match=true.
+    """
+    global _cached_df, _cached_embeddings, _cached_geo, _cached_names
     
     # Kiểm tra embeddings file
     if not os.path.exists(EMBEDDINGS_PATH):
         return {"success": False, "error": "Embeddings file not found. Run with --create-embeddings first."}
     
     # Load data with caching (chỉ load 1 lần, lần sau dùng cache)
+    # Giá / số sao parse 1 lần lúc load bằng hotel_data (theo cột), không parse lại mỗi lần search
     if _cached_df is None or _cached_embeddings is None:
         print("Loading CSV and embeddings (first time)...", file=sys.stderr)
-        _cached_df = pd.read_csv(CSV_PATH)
+        df = load_hotels(CSV_PATH)
+        df['star_int'] = df['_star'].fillna(0).astype(int) if '_star' in df.columns else 0
+        df['price_numeric'] = df['_price_mid_vnd'].fillna(0.0) if '_price_mid_vnd' in df.columns else 0.0
+        # vẫn thiếu toạ độ sau khi ghép overlay geocode -> trả lat/lon null (không phải 0, 0)
+        df['coords_missing'] = missing_coords_mask(df)
+        _cached_df = df
         _cached_embeddings = np.load(EMBEDDINGS_PATH)
+        _cached_geo = GeoIndex.from_frame(df, "lat", "lng")
+        _cached_names = NameIndex.from_frame(df)
     
     df = _cached_df
     hotel_embeddings = _cached_embeddings
@@ -223,47 +277,6 @@ def search(query, top_k=20, min_price=None, max_price=None, min_star=None, distr
     if len(hotel_embeddings) != len(df):
         return {"success": False, "error": f"Embeddings mismatch: {len(hotel_embeddings)} vs {len(df)} hotels"}
     
-    # Parse star column thành integer để có thể filter
-    def extract_star_number(x):
-        """Extract số sao từ text hoặc số"""
-        if pd.isna(x):
-            return 0
-        try:
-            return int(float(x))
-        except (ValueError, TypeError):
-            import re
-            match = re.search(r'(\d+)', str(x))
-            if match:
-                return int(match.group(1))
-            return 0
-    
-    if 'star' in df.columns:
-        df['star_int'] = df['star'].apply(extract_star_number)
-    else:
-        df['star_int'] = 0
-    
-    # Parse price column - handle ranges like "300000 - 750000"
-    def parse_price(price_val):
-        if pd.isna(price_val):
-            return 0
-        try:
-            price_str = str(price_val).strip()
-            if '-' in price_str:
-                # Price range: take average
-                parts = price_str.split('-')
-                min_p = float(parts[0].strip())
-                max_p = float(parts[1].strip())
-                return (min_p + max_p) / 2
-            else:
-                return float(price_str)
-        except (ValueError, AttributeError):
-            return 0
-    
-    if 'price' in df.columns:
-        df['price_numeric'] = df['price'].apply(parse_price)
-    else:
-        df['price_numeric'] = 0
-    
     # Load model
     tokenizer, model, device = load_model()
     
@@ -283,6 +296,17 @@ def search(query, top_k=20, min_price=None, max_price=None, min_star=None, distr
         district_col = df.get('district', pd.Series([''] * len(df)))
         filter_mask &= district_col.str.contains(district, case=False, na=False)
     
+    # Vị trí: grid index chỉ đọc các ô quanh điểm, không tính khoảng cách cho cả catalog
+    distances = None
+    if near_lat is not None and near_lon is not None:
+        distances = np.full(len(df), np.nan)
+        if radius_km:
+            ids, dist = _cached_geo.within_radius(near_lat, near_lon, radius_km)
+            filter_mask &= df.index.isin(ids)
+        else:
+            ids, dist = _cached_geo.row_ids, _cached_geo.distances(near_lat, near_lon).to_numpy()
+        distances[ids] = dist
+    
     filtered_indices = df[filter_mask].index.to_numpy()
     
     if len(filtered_indices) == 0:
@@ -299,13 +323,24 @@ def search(query, top_k=20, min_price=None, max_price=None, min_star=None, distr
     
     # Lấy top-k - dùng argpartition nhanh hơn argsort khi k nhỏ
     top_k = min(top_k, len(filtered_indices))
-    if top_k < len(filtered_indices):
+    if sort_by == 'distance' and distances is not None:
+        top_indices_in_filtered = np.argsort(distances[filtered_indices], kind='stable')[:top_k]
+    elif top_k < len(filtered_indices):
         # argpartition nhanh hơn khi chỉ cần top k
         top_indices_in_filtered = np.argpartition(similarities, -top_k)[-top_k:]
         top_indices_in_filtered = top_indices_in_filtered[np.argsort(similarities[top_indices_in_filtered])[::-1]]
     else:
         top_indices_in_filtered = similarities.argsort()[::-1]
     
+    # Khớp tên: filtered_indices tăng dần (mask trên RangeIndex) -> searchsorted ra vị trí trong tập lọc
+    name_ids = np.asarray(_cached_names.lookup(query)[0], dtype=np.int64)
+    name_pos = np.searchsorted(filtered_indices, name_ids)
+    name_pos = name_pos[(name_pos < len(filtered_indices)) & (filtered_indices[np.minimum(name_pos, len(filtered_indices) - 1)] == name_ids)]
+    if len(name_pos) and sort_by != 'distance':
+        rest = top_indices_in_filtered[~np.isin(top_indices_in_filtered, name_pos)]
+        top_indices_in_filtered = np.concatenate([name_pos, rest])[:top_k]
+    name_hits = set(filtered_indices[name_pos].tolist())
+
     top_scores = similarities[top_indices_in_filtered]
     top_original_indices = filtered_indices[top_indices_in_filtered]
     
@@ -314,48 +349,19 @@ def search(query, top_k=20, min_price=None, max_price=None, min_star=None, distr
     for rank, (orig_idx, score) in enumerate(zip(top_original_indices, top_scores), 1):
         row = df.iloc[orig_idx]
         
-        # Parse star rating an toàn
-        star_value = row.get('star', 0)
-        star_int = 0
-        if pd.notna(star_value):
-            try:
-                star_int = int(float(star_value))
-            except (ValueError, TypeError):
-                # Nếu là text như "Khách sạn 3 sao", extract số
-                import re
-                star_str = str(star_value)
-                match = re.search(r'(\d+)', star_str)
-                if match:
-                    star_int = int(match.group(1))
-        
-        # Parse price - handle price ranges like "300000 - 750000"
-        price_value = 0
-        if pd.notna(row.get('price')):
-            try:
-                price_str = str(row.get('price', 0)).strip()
-                if '-' in price_str:
-                    # Price range: take average
-                    parts = price_str.split('-')
-                    min_price = float(parts[0].strip())
-                    max_price = float(parts[1].strip())
-                    price_value = (min_price + max_price) / 2
-                else:
-                    price_value = float(price_str)
-            except (ValueError, AttributeError):
-                price_value = 0
-        
         hotel = {
             "id": int(orig_idx) + 1,
             "hotelname": safe_str(row.get('hotelname', '')),
             "address": safe_str(row.get('address', '')),
             "district": safe_str(row.get('district', '')),
-            "price": price_value,
-            "star": star_int,
-            "lat": float(row.get('lat', 0)) if pd.notna(row.get('lat')) else 0,
-            "lon": float(row.get('lon', 0)) if pd.notna(row.get('lon')) else 0,
+            "price": float(row['price_numeric']),
+            "star": int(row['star_int']),
+            "lat": None if row['coords_missing'] else float(row['lat']),
+            "lon": None if row['coords_missing'] else float(row['lng']),
             "imageUrl": safe_str(row.get('imageUrl', '')),
             "similarity_score": float(score),
-            "rank": rank
+            "rank": rank,
+            "name_match": int(orig_idx) in name_hits
         }
         
         # Optional fields
@@ -363,6 +369,8 @@ def search(query, top_k=20, min_price=None, max_price=None, min_star=None, distr
             hotel['totalScore'] = float(row['totalScore'])
         if 'reviewsCount' in row.index and pd.notna(row['reviewsCount']):
             hotel['reviewsCount'] = int(row['reviewsCount'])
+        if distances is not None and not np.isnan(distances[orig_idx]):
+            hotel['distance_km'] = round(float(distances[orig_idx]), 2)
         
         results.append(hotel)
     
@@ -382,12 +390,17 @@ def main():
     parser.add_argument('--max_price', type=float, help='Maximum price')
     parser.add_argument('--min_star', type=int, help='Minimum star rating')
     parser.add_argument('--district', type=str, help='District filter')
+    parser.add_argument('--near_lat', type=float, help='Latitude of the search center')
+    parser.add_argument('--near_lon', type=float, help='Longitude of the search center')
+    parser.add_argument('--radius_km', type=float, help='Radius filter around near_lat/near_lon (km)')
+    parser.add_argument('--sort_by', type=str, choices=['relevance', 'distance'], default='relevance', help='Result ordering')
     parser.add_argument('--create-embeddings', action='store_true', help='Create embeddings file')
+    parser.add_argument('--force', action='store_true', help='Rebuild embeddings even if up to date')
     
     args = parser.parse_args()
     
     if args.create_embeddings:
-        result = create_embeddings()
+        result = create_embeddings(force=args.force)
     elif args.query:
         result = search(
             query=args.query,
@@ -395,7 +408,11 @@ def main():
             min_price=args.min_price,
             max_price=args.max_price,
             min_star=args.min_star,
-            district=args.district
+            district=args.district,
+            near_lat=args.near_lat,
+            near_lon=args.near_lon,
+            radius_km=args.radius_km,
+            sort_by=args.sort_by
         )
     else:
         result = {"success": False, "error": "No action specified. Use --query or --create-embeddings"}
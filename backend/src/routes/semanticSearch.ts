@@ -159,7 +159,7 @@ async function fallbackSimpleSearch(
  */
 router.post('/semantic-search', async (req: Request, res: Response) => {
   try {
-    const { query, top_k = 20, min_price, max_price, min_star, district } = req.body;
+    const { query, top_k = 20, min_price, max_price, min_star, district, near_lat, near_lon, radius_km, sort_by } = req.body;
 
     if (!query || typeof query !== 'string' || query.trim() === '') {
       return res.status(400).json({ 
@@ -178,6 +178,11 @@ router.post('/semantic-search', async (req: Request, res: Response) => {
     if (max_price) args.push('--max_price', String(max_price));
     if (min_star) args.push('--min_star', String(min_star));
     if (district) args.push('--district', district);
+    if (near_lat != null && near_lon != null) {
+      args.push('--near_lat', String(near_lat), '--near_lon', String(near_lon));
+      if (radius_km) args.push('--radius_km', String(radius_km));
+    }
+    if (sort_by === 'distance') args.push('--sort_by', 'distance');
 
     try {
       const result = await runPythonSearch(args);
@@ -214,7 +219,7 @@ router.post('/semantic-search', async (req: Request, res: Response) => {
  * GET /semantic-search (cho dễ test trên browser)
  */
 router.get('/semantic-search', async (req: Request, res: Response) => {
-  const { query, top_k, min_price, max_price, min_star, district } = req.query;
+  const { query, top_k, min_price, max_price, min_star, district, near_lat, near_lon, radius_km, sort_by } = req.query;
   
   if (!query) {
     return res.status(400).json({ success: false, error: 'Query is required', hotels: [] });
@@ -227,7 +232,11 @@ router.get('/semantic-search', async (req: Request, res: Response) => {
     min_price: min_price ? parseFloat(min_price as string) : undefined,
     max_price: max_price ? parseFloat(max_price as string) : undefined,
     min_star: min_star ? parseInt(min_star as string) : undefined,
-    district: district as string || undefined
+    district: district as string || undefined,
+    near_lat: near_lat ? parseFloat(near_lat as string) : undefined,
+    near_lon: near_lon ? parseFloat(near_lon as string) : undefined,
+    radius_km: radius_km ? parseFloat(radius_km as string) : undefined,
+    sort_by: sort_by as string || undefined
   };
 
   // Gọi lại POST handler
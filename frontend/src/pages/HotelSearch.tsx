@@ -50,6 +50,10 @@ interface Hotel {
   amenities?: string[];
 }
 
+// semantic search trả lat/lon null khi khách sạn chưa có toạ độ, /api/properties trả 0
+const hasCoords = (h: Hotel): boolean =>
+  h.lat != null && h.lon != null && h.lat !== 0 && h.lon !== 0;
+
 interface FilterOptions {
   searchStrings: string[];
   districts: string[];
@@ -218,7 +222,7 @@ const HotelSearch = () => {
 
   const getFeaturedHotelsForMap = (hotelsList: Hotel[], maxCount: number = 100): Hotel[] => {
     return hotelsList
-      .filter(h => h.lat !== 0 && h.lon !== 0)
+      .filter(hasCoords)
       .sort((a, b) => {
         const scoreA = (a.reviewsCount || 0) * 2 + (a.totalScore || 0) * 10 + (a.star || 0) * 5;
         const scoreB = (b.reviewsCount || 0) * 2 + (b.totalScore || 0) * 10 + (b.star || 0) * 5;
@@ -244,7 +248,7 @@ const HotelSearch = () => {
           setHotels(hotelsArray);
           setFilteredHotels(hotelsArray);
           // Show current page hotels on map (filter out invalid coordinates)
-          setMapHotels(hotelsArray.filter(h => h.lat !== 0 && h.lon !== 0));
+          setMapHotels(hotelsArray.filter(hasCoords));
           setTotalPages(data.pagination.totalPages);
           setTotalCount(data.pagination.totalCount);
         } else {
@@ -254,7 +258,7 @@ const HotelSearch = () => {
           setHotels(hotelsArray);
           setFilteredHotels(hotelsArray);
           // Show current hotels on map
-          setMapHotels(hotelsArray.filter(h => h.lat !== 0 && h.lon !== 0));
+          setMapHotels(hotelsArray.filter(hasCoords));
           setTotalCount(hotelsArray.length);
           setTotalPages(1);
         }
@@ -415,7 +419,7 @@ const HotelSearch = () => {
         console.log('Found', data.hotels.length, 'results sorted by cosine similarity');
         setFilteredHotels(data.hotels);
         // Show search results on map
-        setMapHotels(data.hotels.filter(h => h.lat !== 0 && h.lon !== 0));
+        setMapHotels(data.hotels.filter(hasCoords));
         setTotalCount(data.hotels.length);
         setTotalPages(1); // Semantic search returns all results in one page
       } else {
@@ -476,6 +480,7 @@ const HotelSearch = () => {
     // Filter by distance from user location
     if (useLocationFilter && userLocation) {
       filtered = filtered.filter((h) => {
+        if (!hasCoords(h)) return false;
         const distance = calculateDistance(
           userLocation[0], userLocation[1],
           h.lat, h.lon
@@ -488,7 +493,7 @@ const HotelSearch = () => {
 
     setFilteredHotels(filtered);
     // Show filtered hotels on map
-    setMapHotels(filtered.filter(h => h.lat !== 0 && h.lon !== 0));
+    setMapHotels(filtered.filter(hasCoords));
   };
 
   const listPanelClass = showMap
@@ -1,12 +1,19 @@
+import json
+import os
 from typing import Any, Dict, Optional, List
 
 import numpy as np
 import pandas as pd
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 
-app = FastAPI()
+from metrics import begin_request, render_prometheus, server_timing_header, stage
+
+try:
+    import orjson
+except Exception:  # orjson là tuỳ chọn; thiếu thì quay về json chuẩn + sanitize
+    orjson = None
 
 # -------------------------
 # NaN-safe JSON
@@ -27,6 +34,28 @@ def sanitize_for_json(obj: Any) -> Any:
         return [sanitize_for_json(x) for x in obj]
     return obj
 
+
+def dumps_json(content: Any) -> bytes:
+    """Serialize 1 lần duy nhất.
+
+    orjson: NaN -> null, NumPy scalar/array được hỗ trợ sẵn nên không cần duyệt đệ quy.
+    Không có orjson: sanitize_for_json rồi json.dumps (cách cũ).
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        sanitize_for_json(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with stage("serialize_json"):
+            return dumps_json(content)
+
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
 # -------------------------
 # Import qabot
 # -------------------------
@@ -37,6 +66,10 @@ try:
         load_vector_db,
         load_hotel_dataframe,
         build_lexical_index,
+        build_geo_index,
+        build_name_index,
+        build_suggest_index,
+        hybrid_search_hotels_batch,
     )
     _IMPORT_ERROR = None
 except Exception as e:
@@ -49,6 +82,14 @@ except Exception as e:
     load_vector_db = None
     load_hotel_dataframe = None
     build_lexical_index = None
+    build_geo_index = None
+    build_name_index = None
+    build_suggest_index = None
+    hybrid_search_hotels_batch = None
+
+# /api/search/batch: số query tối đa 1 request (vượt -> 413), top_k tối đa mỗi query
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "256"))
+BATCH_MAX_TOP_K = int(os.getenv("BATCH_MAX_TOP_K", "50"))
 
 # -------------------------
 # Cache
@@ -58,16 +99,22 @@ VECTOR_DB = None
 DF = None
 THR = None
 LEX = None
+GEO = None
+NAMES = None
+SUGGEST = None
 
 @app.on_event("startup")
 async def startup():
-    global LLM, VECTOR_DB, DF, THR, LEX
+    global LLM, VECTOR_DB, DF, THR, LEX, GEO, NAMES, SUGGEST
     if _IMPORT_ERROR is not None:
         return
     LLM = load_llm()
     VECTOR_DB = load_vector_db()
     DF, THR = load_hotel_dataframe()
     LEX = build_lexical_index(DF, THR)
+    GEO = build_geo_index(DF)
+    NAMES = build_name_index(DF)
+    SUGGEST = build_suggest_index(DF)
 
 
 class HistoryMessage(BaseModel):
@@ -76,10 +123,36 @@ class HistoryMessage(BaseModel):
 
 
 class ChatRequest(BaseModel):
-    query: str
+    query: str = ""
     top_k: Optional[int] = 10
     filters: Optional[Dict[str, Any]] = None
     history: Optional[List[HistoryMessage]] = None
+    # next_cursor của lần trả lời trước -> trang kết quả tiếp theo ("xem thêm"), bỏ qua top_k / filters
+    cursor: Optional[str] = None
+
+
+class BatchSearchItem(BaseModel):
+    query: str
+    top_k: Optional[int] = 10
+    filters: Optional[Dict[str, Any]] = None
+
+
+class BatchSearchRequest(BaseModel):
+    items: List[BatchSearchItem]
+
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    timings = begin_request()
+    response = await call_next(request)
+    if timings:
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/health")
@@ -87,6 +160,16 @@ async def health():
     return {"ok": True, "import_error": str(_IMPORT_ERROR) if _IMPORT_ERROR else None}
 
 
+@app.get("/api/suggest")
+async def api_suggest(q: str = "", k: int = 8):
+    """Gợi ý khi gõ (tên khách sạn / quận / tiện ích): chỉ tra trie trong RAM, không gọi model."""
+    if SUGGEST is None:
+        return FastJSONResponse({"query": q, "suggestions": []})
+    with stage("suggest"):
+        suggestions = SUGGEST.suggest(q, max(1, min(int(k), SUGGEST.max_k)))
+    return FastJSONResponse({"query": q, "suggestions": suggestions})
+
+
 @app.post("/api/chat")
 async def api_chat(req: ChatRequest):
     if _IMPORT_ERROR is not None:
@@ -112,12 +195,47 @@ async def api_chat(req: ChatRequest):
         df=DF,
         thr=THR,
         lex=LEX,
+        geo=GEO,
+        names=NAMES,
         filters=req.filters,
         history=history,
         top_k=top_k,
+        cursor=req.cursor,
     )
 
     answer = result.get("answer", "")
-    hotels = (result.get("tool_result") or {}).get("results") or []
+    tool_result = result.get("tool_result") or {}
+    hotels = tool_result.get("results") or []
+
+    # trả Response trực tiếp -> FastAPI bỏ qua jsonable_encoder, payload chỉ được duyệt 1 lần khi serialize
+    return FastJSONResponse({"answer": answer, "hotels": hotels, "next_cursor": tool_result.get("next_cursor")})
+
+
+@app.post("/api/search/batch")
+async def api_search_batch(req: BatchSearchRequest):
+    if _IMPORT_ERROR is not None:
+        return JSONResponse(
+            status_code=500,
+            content={"error": f"Không import được qabot.py: {_IMPORT_ERROR}", "results": []},
+        )
+    if len(req.items) > BATCH_MAX_ITEMS:
+        return JSONResponse(
+            status_code=413,
+            content={"error": f"Tối đa {BATCH_MAX_ITEMS} query mỗi request (nhận {len(req.items)})", "results": []},
+        )
 
-    return sanitize_for_json({"answer": answer, "hotels": hotels})
+    items = []
+    for it in req.items:
+        try:
+            top_k = max(1, min(BATCH_MAX_TOP_K, int(it.top_k or 10)))
+        except Exception:
+            top_k = 10
+        items.append({"query": it.query, "filters": it.filters, "top_k": top_k})
+
+    batches = hybrid_search_hotels_batch(items, df=DF, thr=THR, vector_db=VECTOR_DB, lex=LEX, geo=GEO, names=NAMES)
+
+    results = [
+        {"query": it["query"], "hotels": hotels}
+        for it, hotels in zip(items, batches)
+    ]
+    return FastJSONResponse({"results": results})
@@ -0,0 +1,341 @@
+"""Benchmark hybrid_search_hotels / lexical_topk / semantic_search.search ở nhiều quy mô dữ liệu.
+
+- Sinh catalog giả lập (synthetic_hotels.py) cho từng scale, build index, replay 1 query mix cố định.
+- Báo p50/p95/p99 latency, throughput và peak memory (tracemalloc) cho từng stage
+  (peak memory của stage build chỉ đo khi có --build-mem).
+- Chạy offline trên CPU: embedding dùng HashingEmbeddings (char n-gram + hashing), không tải model.
+  Cùng --seed -> cùng dữ liệu + cùng query mix, so sánh được giữa các lần đổi code.
+
+Usage:
+    python benchmark_search.py --scales 1000,50000 --queries 200
+    python benchmark_search.py --scales 1000000 --stages lexical,vector --json bench_1m.json
+    python benchmark_search.py --scales 1000,10000,50000,200000 --stages names   # lookup tên phải gần như phẳng
+    python benchmark_search.py --csv ../backend/src/data/hotels.csv   # chạy trên dữ liệu thật
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+from sklearn.feature_extraction.text import HashingVectorizer
+
+import qabot
+import prepare_vector_db
+from hotel_data import strip_accents
+from synthetic_hotels import DISTRICTS, generate_hotels
+
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+SEMANTIC_SEARCH_DIR = os.path.join(CURRENT_DIR, "..", "backend", "src", "python")
+
+ALL_STAGES = ["hybrid", "vector", "lexical", "constraints", "names", "suggest", "semantic", "serialize"]
+
+
+# =========================
+# OFFLINE EMBEDDINGS
+# =========================
+
+class HashingEmbeddings(Embeddings):
+    """Embedding giả lập: char n-gram trên text bỏ dấu -> hashing -> chuẩn hoá L2.
+
+    Tất định, không cần mạng/GPU; chi phí và kích thước vector (384) gần với MiniLM
+    nên đo được phần FAISS / ranking chứ không đo chất lượng ngữ nghĩa.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._hv = HashingVectorizer(
+            n_features=dim, analyzer="char_wb", ngram_range=(3, 4), alternate_sign=False, norm="l2"
+        )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self._hv.transform([qabot._norm_text(t) for t in texts]).toarray().astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+# =========================
+# QUERY MIX
+# =========================
+
+def build_query_mix(df: pd.DataFrame, n: int, seed: int) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed + 1)
+    names = df["hotelname"].dropna().astype(str).tolist()
+    districts = [d[0] for d in DISTRICTS]
+    templates = [
+        lambda: {"query": f"khách sạn {rng.choice(districts).lower()} giá rẻ"},
+        lambda: {"query": f"khách sạn {rng.integers(3, 6)} sao có hồ bơi"},
+        lambda: {"query": f"{rng.choice(names)} còn phòng không"},
+        lambda: {"query": "homestay gần chợ Bến Thành dưới 1 triệu"},
+        lambda: {"query": "resort có spa view đẹp yên tĩnh"},
+        lambda: {"query": f"khách sạn quận {rng.choice([1, 3, 5, 7, 10])} từ 1 đến 2 triệu có wifi"},
+        lambda: {"query": "khách sạn gần sân bay có xe đưa đón", "filters": {"min_star": 3}},
+        lambda: {"query": "phòng sạch sẽ nhân viên thân thiện", "filters": {"sort_by": "Rating giảm dần"}},
+    ]
+    return [templates[i % len(templates)]() for i in rng.permutation(n)]
+
+
+def build_typo_queries(df: pd.DataFrame, n: int, seed: int) -> List[Dict[str, Any]]:
+    """Tên khách sạn gõ không dấu + 1 lỗi (xoá / đảo 2 ký tự) ở từ dài nhất, kèm câu hỏi chung quanh."""
+    rng = np.random.default_rng(seed + 2)
+    names = df["hotelname"].dropna().astype(str).tolist()
+    out = []
+    for _ in range(n):
+        words = strip_accents(names[rng.integers(len(names))]).replace("đ", "d").replace("Đ", "D").split()
+        i = max(range(len(words)), key=lambda k: len(words[k]))
+        w = words[i]
+        if len(w) >= 5:
+            j = int(rng.integers(1, len(w)))
+            words[i] = w[: j - 1] + w[j:] if rng.random() < 0.5 else w[: j - 1] + w[j] + w[j - 1] + w[j + 1:]
+        out.append({"query": f"cho mình hỏi {' '.join(words)} giá bao nhiêu"})
+    return out
+
+
+# =========================
+# MEASUREMENT
+# =========================
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    a = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "p50_ms": float(np.percentile(a, 50)),
+        "p95_ms": float(np.percentile(a, 95)),
+        "p99_ms": float(np.percentile(a, 99)),
+        "mean_ms": float(a.mean()),
+    }
+
+
+def _peak_mb(fn: Callable[[], Any]) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _cur, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def measure_build(name: str, fn: Callable[[], Any], trace_mem: bool = False) -> Dict[str, Any]:
+    """Đo thời gian build (không bật tracemalloc vì làm chậm build vài lần).
+
+    trace_mem=True: chạy build thêm 1 lần dưới tracemalloc để lấy peak memory.
+    """
+    gc.collect()
+    t0 = time.perf_counter()
+    value = fn()
+    elapsed = time.perf_counter() - t0
+    peak = _peak_mb(fn) if trace_mem else float("nan")
+    return {"stage": name, "seconds": elapsed, "peak_mb": peak, "value": value}
+
+
+def measure_queries(name: str, fn: Callable[[Dict[str, Any]], Any], queries: List[Dict[str, Any]], mem_sample: int = 20) -> Dict[str, Any]:
+    fn(queries[0])  # warm-up (cache, lazy init)
+
+    samples: List[float] = []
+    t_all = time.perf_counter()
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    total = time.perf_counter() - t_all
+
+    peak = _peak_mb(lambda: [fn(q) for q in queries[:mem_sample]])
+    out = {"stage": name, "queries": len(queries), "qps": len(queries) / total if total > 0 else 0.0, "peak_mb": peak}
+    out.update(_percentiles(samples))
+    return out
+
+
+# =========================
+# HARNESS
+# =========================
+
+def _load_semantic_search(csv_path: str, embeddings_path: str, encoder: HashingEmbeddings):
+    """Trỏ semantic_search sang catalog giả lập + encoder offline (không load transformers)."""
+    if SEMANTIC_SEARCH_DIR not in sys.path:
+        sys.path.insert(0, SEMANTIC_SEARCH_DIR)
+    import semantic_search as ss
+
+    ss.CSV_PATH = csv_path
+    ss.EMBEDDINGS_PATH = embeddings_path
+    ss._cached_df = None
+    ss._cached_embeddings = None
+    ss.load_model = lambda: (None, None, "cpu")
+    ss.encode_texts = lambda texts, tokenizer, model, device: encoder.encode(list(texts))
+    return ss
+
+
+def run_scale(
+    label: str,
+    csv_path: str,
+    n_queries: int,
+    seed: int,
+    stages: List[str],
+    workdir: str,
+    build_mem: bool = False,
+) -> Dict[str, Any]:
+    encoder = HashingEmbeddings()
+    build: List[Dict[str, Any]] = []
+    query: List[Dict[str, Any]] = []
+
+    r = measure_build("load_hotel_dataframe", lambda: qabot.load_hotel_dataframe(csv_path), build_mem)
+    df, thr = r.pop("value")
+    build.append(r)
+
+    r = measure_build("build_lexical_index", lambda: qabot.build_lexical_index(df, thr), build_mem)
+    lex = r.pop("value")
+    build.append(r)
+
+    vector_db = None
+    if {"hybrid", "vector"} & set(stages):
+        db_path = os.path.join(workdir, f"db_faiss_{label}")
+        r = measure_build(
+            "create_db_from_csv",
+            lambda: prepare_vector_db.create_db_from_csv(csv_path, db_path, embedding_model=encoder),
+            build_mem,
+        )
+        r.pop("value")
+        build.append(r)
+        vector_db = qabot.load_vector_db(db_path, embeddings=encoder)
+
+    queries = build_query_mix(df, n_queries, seed)
+
+    if "hybrid" in stages:
+        query.append(measure_queries(
+            "hybrid_search_hotels",
+            lambda q: qabot.hybrid_search_hotels(q["query"], df, thr, vector_db, lex, top_k=10, filters=q.get("filters")),
+            queries,
+        ))
+    if "vector" in stages:
+        query.append(measure_queries("_vec_topk", lambda q: qabot._vec_topk(vector_db, q["query"], k=70), queries))
+    if "lexical" in stages:
+        query.append(measure_queries("lexical_topk", lambda q: qabot.lexical_topk(q["query"], lex, k=100), queries))
+    if "constraints" in stages:
+        query.append(measure_queries(
+            "_apply_constraints",
+            lambda q: qabot._apply_constraints(df, qabot._resolve_constraints(q["query"], df, thr, q.get("filters"))),
+            queries,
+        ))
+        # ước lượng độ chọn lọc + chọn plan (không lọc df)
+        query.append(measure_queries(
+            "plan_retrieval",
+            lambda q: qabot.plan_retrieval(
+                qabot._plan_stats_for(df), qabot._resolve_constraints(q["query"], df, thr, q.get("filters")), 10,
+            ),
+            queries,
+        ))
+    if "names" in stages:
+        r = measure_build("build_name_index", lambda: qabot.build_name_index(df), build_mem)
+        names = r.pop("value")
+        build.append(r)
+        typos = build_typo_queries(df, n_queries, seed)
+        query.append(measure_queries("NameIndex.match", lambda q: names.match(q["query"]), queries))
+        query.append(measure_queries("NameIndex.lookup", lambda q: names.lookup(q["query"]), queries))
+        query.append(measure_queries("NameIndex.lookup_typo", lambda q: names.lookup(q["query"]), typos))
+    if "suggest" in stages:
+        r = measure_build("build_suggest_index", lambda: qabot.build_suggest_index(df), build_mem)
+        suggest = r.pop("value")
+        build.append(r)
+        # tiền tố 2..12 ký tự như khi đang gõ
+        rng = np.random.default_rng(seed + 3)
+        prefixes = [{"query": q["query"][: int(rng.integers(2, 13))]} for q in queries]
+        query.append(measure_queries("SuggestIndex.suggest", lambda q: suggest.suggest(q["query"], 8), prefixes))
+    if "serialize" in stages:
+        query.extend(measure_serialization(df, thr, lex, queries))
+    if "semantic" in stages:
+        emb_path = os.path.join(workdir, f"hotel_embeddings_{label}.npy")
+        raw = pd.read_csv(csv_path)
+        r = measure_build("semantic_embeddings", lambda: np.save(emb_path, encoder.encode(
+            (raw["hotelname"].astype(str) + " " + raw["address"].astype(str) + " " + raw["amenities"].fillna("").astype(str)).tolist()
+        )), build_mem)
+        r.pop("value")
+        build.append(r)
+        ss = _load_semantic_search(csv_path, emb_path, encoder)
+        query.append(measure_queries(
+            "semantic_search.search",
+            lambda q: ss.search(q["query"], top_k=20, min_star=(q.get("filters") or {}).get("min_star")),
+            queries,
+        ))
+
+    return {"scale": label, "rows": int(len(df)), "build": build, "query": query}
+
+
+def measure_serialization(df: pd.DataFrame, thr, lex, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """So sánh serialize payload /api/chat: sanitize_for_json + json chuẩn (cách cũ) vs orjson."""
+    import api
+
+    payloads = {}
+    for i, q in enumerate(queries):
+        cons = qabot._resolve_constraints(q["query"], df, thr, q.get("filters"))
+        hotels = qabot._rank_candidates(df, thr, cons, [], qabot.lexical_topk(q["query"], lex, k=100), 10, q.get("filters"))
+        payloads[i] = {"answer": qabot._compact_list_answer(hotels), "hotels": hotels}
+    items = [{"i": i} for i in range(len(queries))]
+
+    out = [measure_queries(
+        "serialize_sanitize_stdlib",
+        lambda it: json.dumps(api.sanitize_for_json(payloads[it["i"]]), ensure_ascii=False).encode("utf-8"),
+        items,
+    )]
+    if api.orjson is not None:
+        out.append(measure_queries("serialize_orjson", lambda it: api.dumps_json(payloads[it["i"]]), items))
+    return out
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"\n=== scale={report['scale']} rows={report['rows']} ===")
+    print(f"{'build stage':<28}{'seconds':>10}{'peak MB':>10}")
+    for b in report["build"]:
+        print(f"{b['stage']:<28}{b['seconds']:>10.2f}{b['peak_mb']:>10.1f}")
+    print(f"{'query stage':<28}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'qps':>9}{'peak MB':>9}")
+    for q in report["query"]:
+        print(f"{q['stage']:<28}{q['p50_ms']:>9.2f}{q['p95_ms']:>9.2f}{q['p99_ms']:>9.2f}{q['qps']:>9.1f}{q['peak_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid search ở nhiều quy mô")
+    parser.add_argument("--scales", type=str, default="1000,10000,50000", help="Số khách sạn, cách nhau bởi dấu phẩy")
+    parser.add_argument("--csv", type=str, help="Dùng CSV có sẵn thay vì sinh dữ liệu giả lập")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stages", type=str, default=",".join(ALL_STAGES), help=f"Tập con của: {','.join(ALL_STAGES)}")
+    parser.add_argument("--build-mem", action="store_true", help="Đo thêm peak memory của các stage build (chạy build 2 lần)")
+    parser.add_argument("--json", type=str, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    reports: List[Dict[str, Any]] = []
+
+    with tempfile.TemporaryDirectory(prefix="hotel_bench_") as workdir:
+        if args.csv:
+            reports.append(run_scale("csv", args.csv, args.queries, args.seed, stages, workdir, args.build_mem))
+        else:
+            for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+                csv_path = os.path.join(workdir, f"hotels_{scale}.csv")
+                generate_hotels(scale, seed=args.seed).to_csv(csv_path, index=False)
+                reports.append(run_scale(str(scale), csv_path, args.queries, args.seed, stages, workdir, args.build_mem))
+                _print_report(reports[-1])
+
+    if args.csv:
+        _print_report(reports[-1])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"seed": args.seed, "queries": args.queries, "reports": reports}, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi kết quả: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Pipeline build có cache theo nội dung (content-addressed) cho vector DB / embeddings.
+
+- Mỗi stage có key = hash(input của stage): hash file CSV, hash artifact của stage trước,
+  tên model, và fingerprint source code của các hàm tạo ra artifact (đổi template prompt
+  -> đổi fingerprint -> stage chạy lại).
+- Artifact lưu ở <cache_dir>/<stage>/<digest>/, ghi vào thư mục tạm rồi rename (không bao giờ
+  đọc phải artifact ghi dở). Xoá cache_dir lúc nào cũng được.
+- VectorCache: cache embedding theo hash từng đoạn text + model -> chỉ embed text mới / đã đổi.
+- Mỗi stage được đo thời gian, print_report() in bảng built / cached.
+
+Chỉ phụ thuộc numpy (semantic_search.py ở backend import lại module này).
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# =========================
+# DIGEST
+# =========================
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def digest(obj: Any) -> str:
+    """sha256 của JSON chuẩn hoá (sort_keys) -> cùng nội dung = cùng digest."""
+    payload = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def texts_digest(texts: Sequence[str]) -> str:
+    h = hashlib.sha256()
+    for t in texts:
+        h.update(hashlib.sha1(t.encode("utf-8")).digest())
+    return h.hexdigest()
+
+
+def code_fingerprint(*objs: Any) -> str:
+    """Hash source code của các hàm / class: sửa template, cách parse... -> fingerprint đổi."""
+    parts = []
+    for obj in objs:
+        try:
+            parts.append(inspect.getsource(obj))
+        except (OSError, TypeError):
+            parts.append(repr(obj))
+    return digest(parts)
+
+
+def json_artifact(filename: str) -> Tuple[Callable[[Any, str], None], Callable[[str], Any]]:
+    """(save, load) cho artifact là object JSON trong 1 file."""
+
+    def save(value: Any, directory: str) -> None:
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+
+    def load(directory: str) -> Any:
+        with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    return save, load
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", str(text)).strip("_") or "default"
+
+
+# =========================
+# PIPELINE
+# =========================
+
+class BuildPipeline:
+    """cache_dir=None: không cache đĩa, chỉ đo thời gian từng stage."""
+
+    def __init__(self, cache_dir: Optional[str] = None, label: str = "build"):
+        self.cache_dir = cache_dir
+        self.label = label
+        self.stages: List[Dict[str, Any]] = []
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def timed(self, name: str, status: str = "run", **info: Any) -> Iterator[Dict[str, Any]]:
+        row: Dict[str, Any] = {"stage": name, "status": status, **info}
+        t0 = time.perf_counter()
+        try:
+            yield row
+        finally:
+            row["seconds"] = round(time.perf_counter() - t0, 3)
+            self.stages.append(row)
+
+    def artifact_dir(self, name: str, key: Dict[str, Any]) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, name, digest({"stage": name, "key": key})[:24])
+
+    def cached(
+        self,
+        name: str,
+        key: Dict[str, Any],
+        compute: Callable[[], Any],
+        save: Callable[[Any, str], None],
+        load: Callable[[str], Any],
+    ) -> Any:
+        """Trả artifact của stage: load từ cache nếu key đã build, không thì compute + save."""
+        path = self.artifact_dir(name, key)
+        if path is not None and os.path.exists(os.path.join(path, ".done")):
+            with self.timed(name, "cached"):
+                return load(path)
+
+        with self.timed(name, "built"):
+            value = compute()
+            if path is not None:
+                tmp = f"{path}.tmp-{os.getpid()}"
+                shutil.rmtree(tmp, ignore_errors=True)
+                os.makedirs(tmp)
+                save(value, tmp)
+                open(os.path.join(tmp, ".done"), "w").close()
+                shutil.rmtree(path, ignore_errors=True)
+                os.replace(tmp, path)
+        return value
+
+    def up_to_date(self, stamp_path: str, key: Dict[str, Any], outputs: Sequence[str]) -> bool:
+        """Output ở vị trí cố định (VD: hotel_embeddings.npy): so digest key với file stamp cạnh output."""
+        if not all(os.path.exists(p) for p in outputs) or not os.path.exists(stamp_path):
+            return False
+        try:
+            with open(stamp_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("digest") == digest(key)
+        except (OSError, ValueError):
+            return False
+
+    def write_stamp(self, stamp_path: str, key: Dict[str, Any]) -> None:
+        with open(stamp_path, "w", encoding="utf-8") as f:
+            json.dump({"digest": digest(key), "key": key}, f, ensure_ascii=False, indent=2)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "total_seconds": round(time.perf_counter() - self._t0, 3),
+            "stages": list(self.stages),
+        }
+
+    def print_report(self, file=None) -> None:
+        rep = self.report()
+        print(f"Thời gian build ({rep['label']}):", file=file)
+        for row in rep["stages"]:
+            extra = ", ".join(f"{k}={v}" for k, v in row.items() if k not in ("stage", "status", "seconds"))
+            print(f"  {row['stage']:<22}{row['status']:<8}{row['seconds']:>9.3f}s  {extra}".rstrip(), file=file)
+        print(f"  {'total':<30}{rep['total_seconds']:>9.3f}s", file=file)
+
+
+# =========================
+# EMBEDDING CACHE
+# =========================
+
+class VectorCache:
+    """Cache embedding theo sha1(text) cho 1 model: <cache_dir>/embeddings/<model>/cache.npz (hashes + vectors).
+
+    Sau mỗi lần build, cache = đúng tập text của lần build đó (không phình vô hạn). hashes và vectors nằm
+    chung 1 file ghi ra file tạm rồi os.replace -> build bị ngắt giữa chừng không để lại hash mới ghép với
+    vector cũ; file hỏng / lệch số dòng thì coi như cache trống.
+    """
+
+    def __init__(self, cache_dir: Optional[str], model_id: str):
+        self.path = os.path.join(cache_dir, "embeddings", _slug(model_id)) if cache_dir else None
+
+    @staticmethod
+    def _hashes(texts: Sequence[str]) -> np.ndarray:
+        return np.array([hashlib.sha1(t.encode("utf-8")).digest() for t in texts], dtype="S20")
+
+    def _load(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        empty = np.zeros(0, dtype="S20"), None
+        if self.path is None or not os.path.exists(os.path.join(self.path, "cache.npz")):
+            return empty
+        try:
+            with np.load(os.path.join(self.path, "cache.npz")) as data:
+                hashes, vectors = data["hashes"], data["vectors"]
+        except (OSError, ValueError, KeyError):
+            return empty
+        if hashes.ndim != 1 or vectors.ndim != 2 or len(hashes) != len(vectors):
+            return empty
+        return hashes, vectors
+
+    def _save(self, hashes: np.ndarray, vectors: np.ndarray) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        final = os.path.join(self.path, "cache.npz")
+        tmp = f"{final}.tmp-{os.getpid()}"
+        with open(tmp, "wb") as f:
+            np.savez(f, hashes=hashes, vectors=vectors)
+        os.replace(tmp, final)
+
+    def embed(self, texts: Sequence[str], embed_fn: Callable[[List[str]], Any]) -> Tuple[np.ndarray, int]:
+        """Trả (vectors float32 theo thứ tự texts, số text phải embed mới)."""
+        if not len(texts):
+            return np.zeros((0, 0), dtype=np.float32), 0
+        hashes = self._hashes(texts)
+        old_hashes, old_vectors = self._load()
+        pos = {h: i for i, h in enumerate(old_hashes.tolist())}
+        hit = np.array([pos.get(h, -1) for h in hashes.tolist()], dtype=np.int64)
+        missing = np.flatnonzero(hit < 0)
+
+        fresh = None
+        if len(missing):
+            fresh = np.asarray(embed_fn([texts[i] for i in missing]), dtype=np.float32)
+        dim = fresh.shape[1] if fresh is not None else old_vectors.shape[1]
+        vectors = np.empty((len(texts), dim), dtype=np.float32)
+        if len(missing) < len(texts):
+            vectors[hit >= 0] = old_vectors[hit[hit >= 0]]
+        if fresh is not None:
+            vectors[missing] = fresh
+
+        if self.path is not None and len(missing):
+            self._save(hashes, vectors)
+        return vectors, int(len(missing))
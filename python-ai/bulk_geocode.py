@@ -0,0 +1,228 @@
+"""Geocode hàng loạt lúc ingest cho khách sạn thiếu toạ độ (lat / lng trống hoặc 0, 0).
+
+Geocode lúc query (1 request/giây theo usage policy Nominatim) quá chậm, nên toạ độ thiếu được
+geocode 1 lần ở đây rồi ghi vào file phủ <csv>.coords.csv (hotel_data.coords_overlay_path);
+load_hotels / prepare_vector_db / web.py điền toạ độ từ file đó, CSV gốc không bị sửa.
+
+- Mỗi khách sạn thử lần lượt: địa chỉ đầy đủ -> đường + quận -> tên + quận -> tâm quận
+  (hotel_data.geocode_candidates); cột precision ghi lại mức đã trúng.
+- Kết quả ngoài GEOCODE_BBOX (geocoder trả nhầm tỉnh / nước khác) bị bỏ qua, thử query kế tiếp.
+- BULK_GEOCODE_WORKERS luồng, số job đang chạy bị chặn (không submit cả catalog 1 lần). Rate limit
+  + cache sqlite dùng chung GeoClient (geo_client.py): chạy lại không gọi lại query đã có.
+- Chạy tiếp được: mỗi kết quả append + flush ngay vào file phủ, lần chạy sau bỏ qua key đã có
+  (kể cả "không tìm thấy", trừ khi --retry-not-found). Lỗi mạng không ghi -> lần sau thử lại.
+  Hết lượt chạy file được gom lại (bỏ dòng trùng, sắp theo key).
+
+    python bulk_geocode.py --csv ../backend/src/data/hotels.csv
+    # offline: server stub (python geo_client.py --serve-stub --places-csv ...) hoặc GEO_BACKEND=stub
+    NOMINATIM_URL=http://127.0.0.1:8765 python bulk_geocode.py --csv hotels.csv --workers 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from geo_client import GeoClient, get_client
+from hotel_data import (
+    COORDS_OVERLAY_COLUMNS,
+    coords_key,
+    coords_overlay_path,
+    geocode_candidates,
+    missing_coords_mask,
+    read_coords_overlay,
+    read_hotels_csv,
+)
+
+
+# =========================
+# CONFIG
+# =========================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATH = os.getenv("HOTEL_CSV_PATH") or os.path.join(BASE_DIR, "..", "backend", "src", "data", "hotels.csv")
+
+BULK_GEOCODE_WORKERS = int(os.getenv("BULK_GEOCODE_WORKERS", "4"))
+# south,west,north,east — mặc định phủ TP.HCM
+GEOCODE_BBOX: Tuple[float, float, float, float] = tuple(  # type: ignore[assignment]
+    float(x) for x in os.getenv("GEOCODE_BBOX", "10.3,106.3,11.2,107.1").split(",")
+)
+# in tiến độ mỗi n khách sạn
+BULK_GEOCODE_LOG_EVERY = int(os.getenv("BULK_GEOCODE_LOG_EVERY", "100"))
+
+_USECOLS = ["hotelname", "address", "street", "district", "lat", "lng"]
+
+Job = Tuple[str, List[Tuple[str, str]]]
+
+
+# =========================
+# PLAN
+# =========================
+
+def plan_jobs(csv_path: str, overlay_path: str, retry_not_found: bool = False) -> Tuple[List[Job], int]:
+    """([(key, [(precision, query)])] cần geocode, số khách sạn thiếu toạ độ).
+
+    Khách sạn trùng key (cùng tên + địa chỉ) chỉ geocode 1 lần; key đã có trong file phủ bị bỏ qua.
+    """
+    df = read_hotels_csv(csv_path, usecols=lambda c: c in _USECOLS)
+    df = df[df["hotelname"].notna()]
+    missing = df[missing_coords_mask(df)]
+
+    overlay = read_coords_overlay(overlay_path)
+    done = overlay if not retry_not_found else overlay.dropna(subset=["lat", "lng"])
+    done_keys = set(done["key"])
+
+    jobs: List[Job] = []
+    seen = set()
+    for row in missing.to_dict("records"):
+        key = coords_key(row.get("hotelname"), row.get("address"))
+        if key in done_keys or key in seen:
+            continue
+        seen.add(key)
+        candidates = geocode_candidates(row)
+        if candidates:
+            jobs.append((key, candidates))
+    return jobs, len(missing)
+
+
+# =========================
+# GEOCODE
+# =========================
+
+def _in_bbox(lat: float, lon: float, bbox: Optional[Tuple[float, float, float, float]]) -> bool:
+    if bbox is None:
+        return True
+    south, west, north, east = bbox
+    return south <= lat <= north and west <= lon <= east
+
+
+def geocode_hotel(
+    client: GeoClient, candidates: List[Tuple[str, str]], bbox: Optional[Tuple[float, float, float, float]] = GEOCODE_BBOX,
+) -> Optional[Dict[str, Any]]:
+    """Query đầu tiên trúng (trong bbox) -> {lat, lng, precision, query}; không query nào trúng -> None.
+    Lỗi mạng -> raise (khách sạn không được ghi, lần chạy sau thử lại)."""
+    for precision, q in candidates:
+        hit = client.geocode(q)
+        if hit is not None and _in_bbox(hit[0], hit[1], bbox):
+            return {"lat": float(hit[0]), "lng": float(hit[1]), "precision": precision, "query": q}
+    return None
+
+
+class OverlayWriter:
+    """Append từng kết quả vào file phủ (thread-safe, flush ngay để dừng giữa chừng không mất)."""
+
+    def __init__(self, path: str):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._f, fieldnames=COORDS_OVERLAY_COLUMNS)
+        self._lock = threading.Lock()
+        if new:
+            self._writer.writeheader()
+            self._f.flush()
+
+    def write(self, key: str, result: Optional[Dict[str, Any]]) -> None:
+        row = {"key": key, **(result or {"lat": "", "lng": "", "precision": "", "query": ""})}
+        with self._lock:
+            self._writer.writerow(row)
+            self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+def compact_overlay(path: str) -> int:
+    """Gom file phủ: bỏ dòng trùng key (giữ dòng cuối), sắp theo key, ghi atomic. Trả số dòng."""
+    overlay = read_coords_overlay(path).sort_values("key", kind="stable")
+    tmp = path + ".tmp"
+    overlay.to_csv(tmp, index=False, columns=COORDS_OVERLAY_COLUMNS, float_format="%.7f")
+    os.replace(tmp, path)
+    return len(overlay)
+
+
+def bulk_geocode(
+    csv_path: str,
+    overlay_path: Optional[str] = None,
+    client: Optional[GeoClient] = None,
+    workers: int = BULK_GEOCODE_WORKERS,
+    limit: Optional[int] = None,
+    retry_not_found: bool = False,
+    bbox: Optional[Tuple[float, float, float, float]] = GEOCODE_BBOX,
+    log_every: int = BULK_GEOCODE_LOG_EVERY,
+) -> Dict[str, Any]:
+    """Geocode khách sạn thiếu toạ độ trong csv_path, ghi vào overlay_path (mặc định <csv>.coords.csv)."""
+    t0 = time.perf_counter()
+    overlay_path = overlay_path or coords_overlay_path(csv_path)
+    client = client or get_client()
+    workers = max(1, int(workers))
+
+    jobs, n_missing = plan_jobs(csv_path, overlay_path, retry_not_found)
+    if limit is not None:
+        jobs = jobs[: max(0, int(limit))]
+    stats: Dict[str, Any] = {
+        "missing": n_missing, "todo": len(jobs), "resolved": 0, "not_found": 0, "errors": 0,
+        "precision": {},
+    }
+
+    writer = OverlayWriter(overlay_path)
+    pending: Dict[Future, str] = {}
+    it = iter(jobs)
+    done_count = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # chỉ giữ tối đa 2 x workers job đang chờ
+                while len(pending) < 2 * workers:
+                    job = next(it, None)
+                    if job is None:
+                        break
+                    key, candidates = job
+                    pending[pool.submit(geocode_hotel, client, candidates, bbox)] = key
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    key = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        stats["errors"] += 1
+                        print(f"Lỗi geocode {key!r}: {e}")
+                        continue
+                    writer.write(key, result)
+                    if result is None:
+                        stats["not_found"] += 1
+                    else:
+                        stats["resolved"] += 1
+                        stats["precision"][result["precision"]] = stats["precision"].get(result["precision"], 0) + 1
+                    done_count += 1
+                    if log_every and done_count % log_every == 0:
+                        print(f"Geocode {done_count}/{len(jobs)} ({time.perf_counter() - t0:.1f}s)")
+    finally:
+        # dừng giữa chừng (Ctrl+C) -> kết quả đã ghi vẫn còn, chạy lại sẽ tiếp tục
+        for fut in pending:
+            fut.cancel()
+        writer.close()
+
+    stats["overlay_rows"] = compact_overlay(overlay_path)
+    stats["overlay"] = overlay_path
+    stats["client"] = dict(client.stats)
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geocode khách sạn thiếu toạ độ -> <csv>.coords.csv")
+    parser.add_argument("--csv", type=str, default=CSV_PATH)
+    parser.add_argument("--out", type=str, default=None, help="File phủ toạ độ (mặc định <csv>.coords.csv)")
+    parser.add_argument("--workers", type=int, default=BULK_GEOCODE_WORKERS)
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ geocode tối đa n khách sạn lần này")
+    parser.add_argument("--retry-not-found", action="store_true", help="Thử lại khách sạn lần trước không tìm thấy")
+    args = parser.parse_args()
+
+    result = bulk_geocode(args.csv, args.out, workers=args.workers, limit=args.limit, retry_not_found=args.retry_not_found)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
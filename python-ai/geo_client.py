@@ -0,0 +1,425 @@
+"""Client geocode (Nominatim) + chỉ đường (OSRM) dùng chung cho web.py / map.py.
+
+- Cache bền trên đĩa (sqlite, GEO_CACHE_PATH) + cache trong RAM: cùng địa điểm / cùng tuyến
+  chỉ gọi mạng 1 lần, các lần render sau đọc cache. Kết quả "không tìm thấy" cũng được cache.
+- Rate limit bằng token bucket cho từng dịch vụ (Nominatim: 1 request/giây theo usage policy),
+  chỉ chờ khi thật sự gọi mạng, thay cho time.sleep(1.0) cố định trước mỗi lần geocode.
+- routes_from: tuyến từ 1 điểm tới nhiều khách sạn, gọi song song (GEO_ROUTE_WORKERS luồng) trong
+  hạn GEO_ROUTE_DEADLINE_S giây cho cả bản đồ; tuyến chưa về kịp -> đoạn thẳng. Backend có
+  route_many (1 request 1-nhiều) thì dùng thay cho từng cặp.
+- Backend thay được: HttpBackend (NOMINATIM_URL / OSRM_URL) hoặc StubBackend (offline: địa danh
+  trong geo_index.LANDMARKS, tuyến = đường thẳng). Stub cũng chạy được như 1 server HTTP cùng API
+  để test / chạy offline (--places-csv: geocode được cả địa chỉ khách sạn đã có toạ độ trong CSV):
+
+    python geo_client.py --serve-stub --port 8765 [--places-csv hotels.csv]
+    NOMINATIM_URL=http://127.0.0.1:8765 OSRM_URL=http://127.0.0.1:8765 streamlit run web.py
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from geo_index import find_landmark
+from hotel_data import geocode_candidates, missing_coords_mask, normalize_text, read_hotels_csv
+
+
+# =========================
+# CONFIG
+# =========================
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# http (Nominatim / OSRM thật hoặc server stub qua URL) | stub (trong process, không gọi mạng)
+GEO_BACKEND = os.getenv("GEO_BACKEND", "http")
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+OSRM_URL = os.getenv("OSRM_URL", "https://router.project-osrm.org")
+GEO_USER_AGENT = os.getenv("GEO_USER_AGENT", "Hotel-Finder-Streamlit/1.0")
+
+GEO_CACHE_PATH = os.getenv("GEO_CACHE_PATH", os.path.join(BASE_DIR, "geo_cache.sqlite"))
+# 0 = không hết hạn
+GEO_CACHE_TTL_DAYS = float(os.getenv("GEO_CACHE_TTL_DAYS", "30"))
+
+# request/giây cho từng dịch vụ
+NOMINATIM_RPS = float(os.getenv("NOMINATIM_RPS", "1.0"))
+OSRM_RPS = float(os.getenv("OSRM_RPS", "5.0"))
+
+# chỉ đường cho 1 bản đồ: số request song song tối đa, hạn chót cho cả bản đồ (giây)
+GEO_ROUTE_WORKERS = int(os.getenv("GEO_ROUTE_WORKERS", "8"))
+GEO_ROUTE_DEADLINE_S = float(os.getenv("GEO_ROUTE_DEADLINE_S", "8"))
+
+LatLonName = Tuple[float, float, str]
+LonLat = Tuple[float, float]
+
+
+# =========================
+# RATE LIMIT
+# =========================
+
+class TokenBucket:
+    """Tối đa `rate` lần/giây, cho phép dồn `burst` lần. Thread-safe."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Lấy 1 token, chờ nếu hết. Trả số giây đã chờ."""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# =========================
+# CACHE
+# =========================
+
+class GeoCache:
+    """sqlite key -> JSON (geocode / route), có lớp dict trong RAM phía trước. path=None: chỉ RAM."""
+
+    def __init__(self, path: Optional[str] = GEO_CACHE_PATH, ttl_days: float = GEO_CACHE_TTL_DAYS):
+        self.ttl_seconds = ttl_days * 86400.0 if ttl_days and ttl_days > 0 else None
+        self._mem: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS geo_cache ("
+                "kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (kind, key))"
+            )
+            self._conn.commit()
+
+    def get(self, kind: str, key: str) -> Tuple[bool, Any]:
+        """(có trong cache?, giá trị). Giá trị None hợp lệ (VD: geocode không tìm thấy)."""
+        with self._lock:
+            if (kind, key) in self._mem:
+                return True, self._mem[(kind, key)]
+            if self._conn is None:
+                return False, None
+            row = self._conn.execute(
+                "SELECT value, created FROM geo_cache WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            if row is None or (self.ttl_seconds and time.time() - row[1] > self.ttl_seconds):
+                return False, None
+            value = json.loads(row[0])
+            self._mem[(kind, key)] = value
+            return True, value
+
+    def put(self, kind: str, key: str, value: Any) -> None:
+        with self._lock:
+            self._mem[(kind, key)] = value
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO geo_cache (kind, key, value, created) VALUES (?, ?, ?, ?)",
+                    (kind, key, json.dumps(value, ensure_ascii=False), time.time()),
+                )
+                self._conn.commit()
+
+
+# =========================
+# BACKENDS
+# =========================
+
+class HttpBackend:
+    """Nominatim / OSRM qua HTTP (server thật hoặc server stub ở cuối file)."""
+
+    def __init__(
+        self,
+        nominatim_url: str = NOMINATIM_URL,
+        osrm_url: str = OSRM_URL,
+        user_agent: str = GEO_USER_AGENT,
+        timeout: float = 30.0,
+    ):
+        import requests
+
+        self.nominatim_url = nominatim_url.rstrip("/")
+        self.osrm_url = osrm_url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers.update({"User-Agent": user_agent})
+
+    def geocode(self, q: str) -> Optional[LatLonName]:
+        r = self._session.get(
+            f"{self.nominatim_url}/search",
+            params={"q": q, "format": "jsonv2", "limit": 1},
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        j = r.json()
+        if not j:
+            return None
+        return float(j[0]["lat"]), float(j[0]["lon"]), j[0].get("display_name", q)
+
+    def route(self, lon1: float, lat1: float, lon2: float, lat2: float) -> Dict[str, Any]:
+        r = self._session.get(
+            f"{self.osrm_url}/route/v1/driving/{lon1},{lat1};{lon2},{lat2}",
+            params={"overview": "full", "geometries": "geojson"},
+            timeout=self.timeout,
+        )
+        r.raise_for_status()
+        return r.json()["routes"][0]["geometry"]
+
+
+def straight_line(lon1: float, lat1: float, lon2: float, lat2: float) -> Dict[str, Any]:
+    return {"type": "LineString", "coordinates": [[lon1, lat1], [lon2, lat2]]}
+
+
+class StubBackend:
+    """Không gọi mạng: geocode theo places (địa chỉ -> toạ độ) rồi LANDMARKS, tuyến đường = đoạn thẳng."""
+
+    def __init__(self, places: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.places = {normalize_text(k): v for k, v in (places or {}).items()}
+
+    @classmethod
+    def from_csv(cls, path: str) -> "StubBackend":
+        """places = địa chỉ / đường + quận / tên + quận của các khách sạn đã có toạ độ trong CSV."""
+        df = read_hotels_csv(path, usecols=["hotelname", "address", "street", "district", "lat", "lng"])
+        df = df[~missing_coords_mask(df)]
+        places: Dict[str, Tuple[float, float]] = {}
+        for row in df.to_dict("records"):
+            for precision, q in geocode_candidates(row):
+                if precision != "district":
+                    places.setdefault(q, (float(row["lat"]), float(row["lng"])))
+        return cls(places)
+
+    def geocode(self, q: str) -> Optional[LatLonName]:
+        q_norm = normalize_text(q)
+        if q_norm in self.places:
+            lat, lon = self.places[q_norm]
+            return lat, lon, q
+        hit = find_landmark(normalize_text(q))
+        if hit is None:
+            return None
+        name, lat, lon = hit
+        return lat, lon, name
+
+    def route(self, lon1: float, lat1: float, lon2: float, lat2: float) -> Dict[str, Any]:
+        return straight_line(lon1, lat1, lon2, lat2)
+
+    def route_many(self, lon: float, lat: float, dests: Sequence[LonLat]) -> List[Dict[str, Any]]:
+        return [straight_line(lon, lat, lon2, lat2) for lon2, lat2 in dests]
+
+
+# =========================
+# CLIENT
+# =========================
+
+class GeoClient:
+    def __init__(
+        self,
+        backend: Any,
+        cache: Optional[GeoCache] = None,
+        geocode_limiter: Optional[TokenBucket] = None,
+        route_limiter: Optional[TokenBucket] = None,
+    ):
+        self.backend = backend
+        self.cache = cache if cache is not None else GeoCache(path=None)
+        self.geocode_limiter = geocode_limiter
+        self.route_limiter = route_limiter
+        self.stats = {"geocode_hit": 0, "geocode_miss": 0, "route_hit": 0, "route_miss": 0, "route_fallback": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def geocode(self, q: str) -> Optional[LatLonName]:
+        """(lat, lon, display_name) hoặc None nếu không tìm thấy. Lỗi mạng -> raise (không cache)."""
+        key = " ".join(str(q).lower().split())
+        found, value = self.cache.get("geocode", key)
+        if found:
+            self._count("geocode_hit")
+            return tuple(value) if value is not None else None
+        self._count("geocode_miss")
+
+        if self.geocode_limiter is not None:
+            self.geocode_limiter.acquire()
+        value = self.backend.geocode(q)
+        self.cache.put("geocode", key, list(value) if value is not None else None)
+        return value
+
+    def route(self, lon1: float, lat1: float, lon2: float, lat2: float) -> Dict[str, Any]:
+        """GeoJSON LineString của tuyến lái xe. Lỗi mạng -> raise (không cache)."""
+        key = _route_key(lon1, lat1, lon2, lat2)
+        found, value = self.cache.get("route", key)
+        if found:
+            self._count("route_hit")
+            return value
+        self._count("route_miss")
+
+        if self.route_limiter is not None:
+            self.route_limiter.acquire()
+        value = self.backend.route(lon1, lat1, lon2, lat2)
+        self.cache.put("route", key, value)
+        return value
+
+    def _route_many(self, lon: float, lat: float, dests: Sequence[LonLat]) -> List[Dict[str, Any]]:
+        self._count("route_miss", len(dests))
+        if self.route_limiter is not None:
+            self.route_limiter.acquire()
+        values = self.backend.route_many(lon, lat, dests)
+        for (lon2, lat2), value in zip(dests, values):
+            self.cache.put("route", _route_key(lon, lat, lon2, lat2), value)
+        return values
+
+    def routes_from(
+        self,
+        lon: float,
+        lat: float,
+        dests: Sequence[LonLat],
+        max_workers: int = GEO_ROUTE_WORKERS,
+        deadline_s: float = GEO_ROUTE_DEADLINE_S,
+    ) -> List[Dict[str, Any]]:
+        """Tuyến từ (lon, lat) tới từng điểm trong dests (cùng thứ tự). Không raise.
+
+        Tuyến đã cache trả ngay; phần còn lại gọi song song tối đa max_workers request, chờ tổng cộng
+        deadline_s giây. Tuyến lỗi / chưa về kịp -> đoạn thẳng có "fallback": True (không cache);
+        request chạy dở vẫn tiếp tục ở nền và ghi cache khi xong -> lần render sau có tuyến thật.
+        """
+        out: List[Optional[Dict[str, Any]]] = [None] * len(dests)
+        todo: List[int] = []
+        for i, (lon2, lat2) in enumerate(dests):
+            found, value = self.cache.get("route", _route_key(lon, lat, lon2, lat2))
+            if found:
+                out[i] = value
+            else:
+                todo.append(i)
+        self._count("route_hit", len(dests) - len(todo))
+
+        if todo:
+            one_to_many = callable(getattr(self.backend, "route_many", None))
+            pool = ThreadPoolExecutor(max_workers=1 if one_to_many else max(1, min(max_workers, len(todo))))
+            try:
+                if one_to_many:
+                    futures = {pool.submit(self._route_many, lon, lat, [dests[i] for i in todo]): todo}
+                else:
+                    futures = {pool.submit(lambda d: [self.route(lon, lat, *d)], dests[i]): [i] for i in todo}
+                done, _ = wait(futures, timeout=deadline_s)
+                for fut in done:
+                    if fut.exception() is None:
+                        for i, value in zip(futures[fut], fut.result()):
+                            out[i] = value
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        missing = [i for i, v in enumerate(out) if v is None]
+        self._count("route_fallback", len(missing))
+        for i in missing:
+            out[i] = {**straight_line(lon, lat, *dests[i]), "fallback": True}
+        return out
+
+
+def _route_key(lon1: float, lat1: float, lon2: float, lat2: float) -> str:
+    # làm tròn ~1 m: cùng cặp điểm giữa các lần render -> cùng key
+    return ",".join(f"{float(x):.5f}" for x in (lon1, lat1, lon2, lat2))
+
+
+_CLIENT: Optional[GeoClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> GeoClient:
+    """Client dùng chung trong process (theo GEO_BACKEND / GEO_CACHE_PATH)."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            if GEO_BACKEND == "stub":
+                _CLIENT = GeoClient(StubBackend(), GeoCache(path=None))
+            else:
+                _CLIENT = GeoClient(
+                    HttpBackend(),
+                    GeoCache(GEO_CACHE_PATH),
+                    geocode_limiter=TokenBucket(NOMINATIM_RPS),
+                    route_limiter=TokenBucket(OSRM_RPS, burst=max(1, int(OSRM_RPS))),
+                )
+        return _CLIENT
+
+
+# =========================
+# STUB SERVER
+# =========================
+
+def make_stub_handler(backend: Optional[StubBackend] = None):
+    """Handler HTTP trả JSON giống Nominatim /search và OSRM /route/v1/driving/..."""
+    backend = backend or StubBackend()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: Any) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            url = urlsplit(self.path)
+            if url.path == "/search":
+                q = (parse_qs(url.query).get("q") or [""])[0]
+                hit = backend.geocode(q)
+                if hit is None:
+                    return self._send(200, [])
+                lat, lon, name = hit
+                return self._send(200, [{"lat": str(lat), "lon": str(lon), "display_name": name}])
+            if url.path.startswith("/route/v1/driving/"):
+                try:
+                    a, b = url.path.rsplit("/", 1)[-1].split(";")
+                    lon1, lat1 = (float(x) for x in a.split(","))
+                    lon2, lat2 = (float(x) for x in b.split(","))
+                except ValueError:
+                    return self._send(400, {"code": "InvalidUrl"})
+                geometry = backend.route(lon1, lat1, lon2, lat2)
+                return self._send(200, {"code": "Ok", "routes": [{"geometry": geometry}]})
+            return self._send(404, {"error": "not found"})
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return StubHandler
+
+
+def serve_stub(host: str = "127.0.0.1", port: int = 8765, backend: Optional[StubBackend] = None) -> ThreadingHTTPServer:
+    """Tạo server stub (chưa chạy); gọi .serve_forever() hoặc chạy trong thread riêng."""
+    return ThreadingHTTPServer((host, port), make_stub_handler(backend))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Geocode / route client")
+    parser.add_argument("--serve-stub", action="store_true", help="Chạy server stub Nominatim/OSRM offline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--places-csv", default=None, help="Stub geocode thêm địa chỉ khách sạn có toạ độ trong CSV này")
+    args = parser.parse_args()
+
+    if args.serve_stub:
+        server = serve_stub(args.host, args.port, StubBackend.from_csv(args.places_csv) if args.places_csv else None)
+        print(f"Geo stub server: http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        parser.print_help()
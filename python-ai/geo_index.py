@@ -0,0 +1,237 @@
+"""Index không gian cho toạ độ khách sạn (lat / lng): lọc theo bán kính / bbox, sắp theo khoảng cách.
+
+Grid đều cell_deg x cell_deg độ (mặc định 0.01° ~ 1.1 km), build 1 lần lúc load: điểm được sắp theo
+mã ô (hàng, cột) nên các ô liền nhau trên cùng 1 hàng grid là 1 dải liên tục -> mỗi hàng của bbox
+chỉ cần 2 lần searchsorted. Query bán kính chỉ đọc các ô phủ bbox của vòng tròn rồi tính haversine
+chính xác trên số ít ứng viên đó, không quét toàn bộ catalog.
+
+LANDMARKS: địa danh / điểm tham quan TP.HCM ("gần chợ Bến Thành") -> toạ độ, dùng cho parse câu hỏi.
+PoiTable: spatial join khách sạn x LANDMARKS tính 1 lần lúc load (qua GeoIndex): mỗi khách sạn có sẵn
+vài điểm tham quan gần nhất + khoảng cách, mỗi địa danh có sẵn danh sách khách sạn sắp theo khoảng cách.
+"""
+
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hotel_data import coarse_coords_mask, normalize_text
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+
+# kích thước ô grid (độ)
+GEO_CELL_DEG = float(os.getenv("GEO_CELL_DEG", "0.01"))
+# bán kính mặc định khi câu hỏi nhắc địa danh mà không nói "trong vòng x km"
+GEO_DEFAULT_RADIUS_KM = float(os.getenv("GEO_DEFAULT_RADIUS_KM", "2.0"))
+# PoiTable: bán kính join (km) và số điểm tham quan gần nhất giữ cho mỗi khách sạn
+POI_TABLE_RADIUS_KM = float(os.getenv("POI_TABLE_RADIUS_KM", "5.0"))
+POI_NEARBY_K = int(os.getenv("POI_NEARBY_K", "4"))
+
+# (tên hiển thị, alias đã chuẩn hoá (normalize_text), lat, lng)
+# alias luôn kèm loại địa danh (công viên / chợ / bến...) khi phần tên trùng tên đường / phường
+LANDMARKS: List[Tuple[str, Tuple[str, ...], float, float]] = [
+    ("Chợ Bến Thành", ("cho ben thanh", "ben thanh"), 10.7721, 106.6983),
+    ("Nhà thờ Đức Bà", ("nha tho duc ba",), 10.7798, 106.6990),
+    ("Bưu điện Thành phố", ("buu dien thanh pho", "buu dien trung tam", "buu dien"), 10.7799, 106.7000),
+    ("Phố đi bộ Nguyễn Huệ", ("pho di bo nguyen hue", "pho di bo", "nguyen hue"), 10.7740, 106.7036),
+    ("Nhà hát Thành phố", ("nha hat thanh pho", "nha hat lon"), 10.7766, 106.7031),
+    ("Dinh Độc Lập", ("dinh doc lap", "hoi truong thong nhat"), 10.7770, 106.6954),
+    ("Phố Tây Bùi Viện", ("pho tay bui vien", "bui vien", "pho tay"), 10.7675, 106.6935),
+    ("Bitexco", ("bitexco",), 10.7716, 106.7044),
+    ("Bến Nhà Rồng", ("ben nha rong",), 10.7681, 106.7068),
+    ("Bảo tàng Chứng tích Chiến tranh", ("bao tang chung tich chien tranh", "bao tang chung tich"), 10.7795, 106.6921),
+    ("Hồ Con Rùa", ("ho con rua",), 10.7826, 106.6958),
+    ("Ga Sài Gòn", ("ga sai gon",), 10.7823, 106.6772),
+    ("Chợ Lớn", ("cho lon", "cho binh tay", "pho nguoi hoa"), 10.7499, 106.6508),
+    ("Chùa Bà Thiên Hậu", ("chua ba thien hau",), 10.7531, 106.6616),
+    ("Công viên Đầm Sen", ("cong vien dam sen", "dam sen"), 10.7687, 106.6370),
+    ("ĐH Khoa học Tự nhiên", ("dai hoc khoa hoc tu nhien", "khoa hoc tu nhien"), 10.7626, 106.6822),
+    ("Crescent Mall", ("crescent mall",), 10.7286, 106.7186),
+    ("Landmark 81", ("landmark 81", "landmark81"), 10.7949, 106.7219),
+    ("Thảo Điền", ("thao dien",), 10.8030, 106.7340),
+    ("Sân bay Tân Sơn Nhất", ("san bay tan son nhat", "tan son nhat", "san bay"), 10.8136, 106.6640),
+    ("Công viên Tao Đàn", ("cong vien tao dan", "vuon tao dan"), 10.7745, 106.6925),
+    ("Bến Bạch Đằng", ("ben bach dang", "cong vien bach dang"), 10.7745, 106.7065),
+    ("Thảo Cầm Viên", ("thao cam vien", "so thu"), 10.7877, 106.7053),
+    ("Chùa Ngọc Hoàng", ("chua ngoc hoang", "chua phuoc hai"), 10.7920, 106.6980),
+    ("Nhà thờ Tân Định", ("nha tho tan dinh", "nha tho mau hong"), 10.7887, 106.6907),
+    ("Chợ Tân Định", ("cho tan dinh",), 10.7896, 106.6905),
+    ("Công viên Lê Văn Tám", ("cong vien le van tam",), 10.7876, 106.6960),
+    ("Chùa Vĩnh Nghiêm", ("chua vinh nghiem",), 10.7905, 106.6830),
+    ("An Đông Plaza", ("an dong plaza", "cho an dong"), 10.7571, 106.6711),
+    ("Công viên Kỳ Hòa", ("cong vien ky hoa", "ho ky hoa"), 10.7713, 106.6680),
+    ("Việt Nam Quốc Tự", ("viet nam quoc tu",), 10.7720, 106.6735),
+    ("Vạn Hạnh Mall", ("van hanh mall",), 10.7706, 106.6693),
+    ("SC VivoCity", ("sc vivocity", "vivocity"), 10.7303, 106.7034),
+    ("Cầu Ánh Sao", ("cau anh sao",), 10.7247, 106.7185),
+    ("Hồ Bán Nguyệt", ("ho ban nguyet",), 10.7249, 106.7190),
+    ("Chợ Bà Chiểu", ("cho ba chieu",), 10.8015, 106.6985),
+    ("Lăng Ông Bà Chiểu", ("lang ong ba chieu", "lang ta quan le van duyet"), 10.8028, 106.6990),
+    ("Công viên Gia Định", ("cong vien gia dinh",), 10.8125, 106.6785),
+    ("Công viên Hoàng Văn Thụ", ("cong vien hoang van thu",), 10.8010, 106.6660),
+    ("Vincom Mega Mall Thảo Điền", ("vincom mega mall thao dien", "vincom thao dien"), 10.8025, 106.7425),
+    ("Aeon Mall Tân Phú", ("aeon mall tan phu", "aeon tan phu"), 10.8015, 106.6175),
+    ("Aeon Mall Bình Tân", ("aeon mall binh tan", "aeon binh tan"), 10.7433, 106.6125),
+    ("Khu du lịch Suối Tiên", ("khu du lich suoi tien", "suoi tien"), 10.8655, 106.8020),
+]
+
+
+def haversine_km(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> np.ndarray:
+    """Khoảng cách đường tròn lớn (km), broadcast theo numpy."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def find_landmark(q_norm: str) -> Optional[Tuple[str, float, float]]:
+    """Địa danh có alias dài nhất xuất hiện trong câu hỏi đã chuẩn hoá. Trả (tên, lat, lng)."""
+    best: Optional[Tuple[int, str, float, float]] = None
+    padded = f" {q_norm} "
+    for name, aliases, lat, lon in LANDMARKS:
+        for alias in aliases:
+            if f" {alias} " in padded and (best is None or len(alias) > best[0]):
+                best = (len(alias), name, lat, lon)
+    return (best[1], best[2], best[3]) if best else None
+
+
+def landmark_by_name(name: str) -> Optional[Tuple[str, float, float]]:
+    return find_landmark(normalize_text(name))
+
+
+class GeoIndex:
+    """Grid index trên toạ độ khách sạn. row_ids = index của DataFrame (dòng thiếu toạ độ bị bỏ qua)."""
+
+    def __init__(self, lat: Sequence[float], lon: Sequence[float], row_ids: Sequence[int], cell_deg: float = GEO_CELL_DEG):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        ok = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+
+        self.cell_deg = float(cell_deg)
+        iy = np.floor(lat[ok] / self.cell_deg).astype(np.int64)
+        ix = np.floor(lon[ok] / self.cell_deg).astype(np.int64)
+        keys = self._key(iy, ix)
+        order = np.argsort(keys, kind="stable")
+
+        self.lat = lat[ok][order]
+        self.lon = lon[ok][order]
+        self.row_ids = row_ids[ok][order]
+        self._keys = keys[order]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, lat_col: str = "lat", lon_col: str = "lng", cell_deg: float = GEO_CELL_DEG) -> "GeoIndex":
+        # toạ độ geocode chỉ ra tâm quận không đưa vào index: lọc bán kính / khoảng cách sẽ sai
+        coarse = coarse_coords_mask(df).to_numpy()
+        lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy(dtype=np.float64)
+        lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy(dtype=np.float64)
+        return cls(np.where(coarse, np.nan, lat), np.where(coarse, np.nan, lon), df.index.to_numpy(), cell_deg)
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    @staticmethod
+    def _key(iy: Any, ix: Any) -> Any:
+        # iy, ix trong khoảng +-18000 với ô 0.01° -> ghép thành 1 số int64, sắp theo (hàng, cột)
+        return (np.asarray(iy, dtype=np.int64) + (1 << 30)) * (1 << 31) + (np.asarray(ix, dtype=np.int64) + (1 << 30))
+
+    def _candidates(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """Vị trí (trong mảng đã sắp) của các điểm thuộc những ô phủ bbox."""
+        c = self.cell_deg
+        rows = np.arange(math.floor(south / c), math.floor(north / c) + 1, dtype=np.int64)
+        lo = np.searchsorted(self._keys, self._key(rows, math.floor(west / c)), "left")
+        hi = np.searchsorted(self._keys, self._key(rows, math.floor(east / c)), "right")
+        lengths = hi - lo
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64)
+        # ghép các dải [lo, hi) thành 1 mảng vị trí
+        offsets = np.repeat(lo - (np.cumsum(lengths) - lengths), lengths)
+        return np.arange(total, dtype=np.int64) + offsets
+
+    def within_radius(self, lat: float, lon: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(row_ids, khoảng cách km) của khách sạn trong bán kính, sắp gần -> xa."""
+        dlat = radius_km / KM_PER_DEG_LAT
+        dlon = radius_km / (KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        pos = self._candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        dist = haversine_km(lat, lon, self.lat[pos], self.lon[pos])
+        keep = dist <= radius_km
+        pos, dist = pos[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return self.row_ids[pos[order]], dist[order]
+
+    def within_bbox(self, south: float, west: float, north: float, east: float) -> np.ndarray:
+        """row_ids của khách sạn nằm trong bbox (south, west, north, east)."""
+        pos = self._candidates(south, west, north, east)
+        lat, lon = self.lat[pos], self.lon[pos]
+        keep = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return self.row_ids[pos[keep]]
+
+    def nearest(self, lat: float, lon: float, k: int, max_radius_km: float = 50.0) -> Tuple[np.ndarray, np.ndarray]:
+        """k khách sạn gần nhất: nới bán kính gấp đôi đến khi đủ k điểm (hoặc chạm max_radius_km)."""
+        radius = self.cell_deg * KM_PER_DEG_LAT
+        while True:
+            ids, dist = self.within_radius(lat, lon, radius)
+            if len(ids) >= k or radius >= max_radius_km:
+                return ids[:k], dist[:k]
+            radius = min(radius * 2.0, max_radius_km)
+
+    def distances(self, lat: float, lon: float) -> pd.Series:
+        """Khoảng cách (km) từ 1 điểm tới mọi khách sạn có toạ độ, index = row_ids."""
+        return pd.Series(haversine_km(lat, lon, self.lat, self.lon), index=self.row_ids)
+
+
+class PoiTable:
+    """Spatial join khách sạn x địa danh, tính 1 lần từ GeoIndex.
+
+    by_poi[tên] = (row_ids, km) sắp gần -> xa, trong radius_km;
+    nearby(row_id) = [(tên, km)] k địa danh gần nhất của khách sạn (trong radius_km).
+    """
+
+    def __init__(
+        self,
+        geo: GeoIndex,
+        landmarks: Sequence[Tuple[str, Tuple[str, ...], float, float]] = LANDMARKS,
+        radius_km: float = POI_TABLE_RADIUS_KM,
+        k: int = POI_NEARBY_K,
+    ):
+        self.radius_km = float(radius_km)
+        self.by_poi: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        ids_parts, dist_parts, poi_parts = [], [], []
+        for i, (name, _aliases, lat, lon) in enumerate(landmarks):
+            ids, dist = geo.within_radius(lat, lon, self.radius_km)
+            self.by_poi[name] = (ids, dist)
+            ids_parts.append(ids)
+            dist_parts.append(dist)
+            poi_parts.append(np.full(len(ids), i, dtype=np.int64))
+
+        # đảo chiều: sắp theo (khách sạn, khoảng cách), giữ k cặp đầu của mỗi khách sạn
+        self._nearby: Dict[int, List[Tuple[str, float]]] = {}
+        if ids_parts:
+            ids, dist, poi = np.concatenate(ids_parts), np.concatenate(dist_parts), np.concatenate(poi_parts)
+            order = np.lexsort((dist, ids))
+            ids, dist, poi = ids[order], dist[order], poi[order]
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.zeros(0, dtype=np.int64)
+            ends = np.r_[starts[1:], len(ids)]
+            for s, e in zip(starts, np.minimum(ends, starts + k)):
+                self._nearby[int(ids[s])] = [(landmarks[p][0], float(d)) for p, d in zip(poi[s:e], dist[s:e])]
+
+    def nearby(self, row_id: int) -> List[Tuple[str, float]]:
+        return self._nearby.get(int(row_id), [])
+
+    def nearby_text(self, row_id: int) -> str:
+        """"Chợ Bến Thành (0.3 km), ..." hoặc "" nếu không có địa danh nào trong radius_km."""
+        return ", ".join(f"{name} ({km:.1f} km)" for name, km in self.nearby(row_id))
+
+    def hotels_near(self, name: str, radius_km: float) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(row_ids, km) trong radius_km quanh địa danh, sắp gần -> xa. None nếu không tra được bảng
+        (địa danh lạ / bán kính lớn hơn bán kính join) -> dùng GeoIndex.within_radius."""
+        hit = self.by_poi.get(name)
+        if hit is None or radius_km > self.radius_km:
+            return None
+        ids, dist = hit
+        n = int(np.searchsorted(dist, radius_km, side="right"))
+        return ids[:n], dist[:n]
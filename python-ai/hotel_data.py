@@ -0,0 +1,396 @@
+"""Loader hotels.csv dùng chung cho qabot, prepare_vector_db và semantic_search (backend).
+
+- Đọc CSV với dtype khai báo sẵn (không để pandas đoán từng cột), engine pyarrow (đa luồng) nếu có.
+- Cột list lưu dạng literal Python ("['Wi-Fi', 'Hồ bơi']") được parse 1 lần lúc load thành list thật:
+  _amenities_list, _reviews_list, _categories_list.
+- Giá / hạng sao / quận parse theo cột (regex vectorized), chỉ các giá trị lạ mới parse từng dòng.
+
+Cột dẫn xuất (prefix "_"):
+    _price_min_vnd, _price_max_vnd, _price_mid_vnd, _star, _district_short, _district_num, _district_norm,
+    _amenities_list, _reviews_list, _categories_list
+
+Toạ độ thiếu (lat / lng trống hoặc 0, 0) được geocode lúc ingest bằng bulk_geocode.py và ghi ra file
+phủ <csv>.coords.csv cạnh CSV gốc; load_hotels tự điền từ file đó (CSV gốc không bị sửa).
+"""
+
+import ast
+import math
+import os
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# CONFIG
+# =========================
+
+# auto (pyarrow nếu cài, không thì C) | pyarrow | c
+# (chunksize / usecols dạng hàm / file pyarrow không parse được -> luôn dùng C)
+CSV_ENGINE = os.getenv("HOTEL_CSV_ENGINE", "auto")
+
+TEXT_COLUMNS = [
+    "hotelname", "address", "street", "district", "city", "searchString", "categoryName", "categories",
+    "description1", "description2", "url_google", "website", "phone", "price", "imageUrl", "star",
+    "amenities", "reviews",
+]
+NUMERIC_COLUMNS = [
+    "lat", "lng", "rank", "totalScore", "oneStar", "twoStar", "threeStar", "fourStar", "fiveStar", "reviewsCount",
+]
+CSV_DTYPES: Dict[str, Any] = {**{c: str for c in TEXT_COLUMNS}, **{c: "float64" for c in NUMERIC_COLUMNS}}
+
+LIST_COLUMNS = {"amenities": "_amenities_list", "reviews": "_reviews_list", "categories": "_categories_list"}
+
+
+# =========================
+# TEXT HELPERS
+# =========================
+
+def strip_accents(text: str) -> str:
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFD", str(text))
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return unicodedata.normalize("NFC", text)
+
+
+def normalize_text(text: str) -> str:
+    """lowercase + bỏ dấu + bỏ ký tự lạ (dùng cho matching)."""
+    s = strip_accents(str(text).lower())
+    s = re.sub(r"[^a-z0-9\s]", " ", s)
+    return " ".join(s.split())
+
+
+# =========================
+# LIST COLUMNS
+# =========================
+
+def parse_list_value(value: Any) -> List[str]:
+    """"['A', None, 'B']" -> ['A', 'B']. Không phải literal list -> [chuỗi gốc] (giữ nguyên nội dung)."""
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return []
+    s = str(value)
+    try:
+        parsed = ast.literal_eval(s)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        parsed = None
+    if isinstance(parsed, list):
+        return [str(x) for x in parsed if x and str(x).strip()]
+    s = s.strip()
+    return [s] if s else []
+
+
+def parse_list_column(values: pd.Series) -> pd.Series:
+    """parse_list_value theo cột; giá trị trùng nhau (VD: categories) chỉ parse 1 lần."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    parsed = [parse_list_value(u) for u in uniques]
+    empty: List[str] = []
+    return pd.Series([parsed[c] if c >= 0 else empty for c in codes], index=values.index, dtype=object)
+
+
+# =========================
+# PRICE / STAR / DISTRICT
+# =========================
+
+def parse_price_number(piece: str) -> Optional[int]:
+    """Parse 1 phần giá sang VND: "490000", "1,150,000", "1.2 triệu", "1tr", "800k"."""
+    if piece is None:
+        return None
+    s = str(piece).strip().lower()
+    if not s or s in {"nan", "none"}:
+        return None
+
+    s = s.replace("₫", "").replace("vnd", "").strip()
+
+    m = re.search(r"(\d+(?:[\.,]\d+)?)\s*(trieu|triệu|million|m|tr)\b", s)
+    if m:
+        return int(float(m.group(1).replace(",", ".")) * 1_000_000)
+
+    m = re.search(r"(\d+(?:[\.,]\d+)?)\s*(k|nghin|nghìn)\b", s)
+    if m:
+        return int(float(m.group(1).replace(",", ".")) * 1_000)
+
+    digits = re.sub(r"[^0-9]", "", s)
+    return int(digits) if digits else None
+
+
+def parse_price_range(value: Any) -> Tuple[Optional[int], Optional[int], Optional[float]]:
+    """Parse cột price: "min - max" / 1 số. Returns: (min_vnd, max_vnd, mid_vnd)"""
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return None, None, None
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        # inf / NaN dạng numpy (np.float32...) -> int() raise OverflowError / ValueError
+        if not math.isfinite(value):
+            return None, None, None
+        iv = int(value)
+        return iv, iv, float(iv)
+
+    s = str(value).strip().replace("–", "-").replace("—", "-")
+    if not s:
+        return None, None, None
+
+    if "-" in s:
+        parts = [p.strip() for p in s.split("-") if p.strip()]
+        if len(parts) >= 2:
+            a = parse_price_number(parts[0])
+            b = parse_price_number(parts[1])
+            if a is None and b is None:
+                return None, None, None
+            if a is None:
+                return b, b, float(b)
+            if b is None:
+                return a, a, float(a)
+            lo, hi = (a, b) if a <= b else (b, a)
+            return lo, hi, (lo + hi) / 2.0
+
+    n = parse_price_number(s)
+    if n is None:
+        return None, None, None
+    return n, n, float(n)
+
+
+_PRICE_RANGE_RE = r"^\s*(\d+)\s*-\s*(\d+)\s*$"
+_PRICE_SINGLE_RE = r"^\s*(\d+)\s*$"
+
+
+def derive_price_columns(price: pd.Series) -> pd.DataFrame:
+    """Vectorized parse_price_range.
+
+    Fast path bằng regex theo cột cho dạng phổ biến "490000 - 1150000" / "490000";
+    các giá trị còn lại (có "triệu", "k", dấu phân cách...) mới parse từng dòng.
+    """
+    s = price.astype("string").str.replace("–", "-", regex=False).str.replace("—", "-", regex=False)
+    rng = s.str.extract(_PRICE_RANGE_RE)
+    single = s.str.extract(_PRICE_SINGLE_RE)[0]
+
+    a = pd.to_numeric(rng[0], errors="coerce")
+    b = pd.to_numeric(rng[1], errors="coerce")
+    one = pd.to_numeric(single, errors="coerce")
+    lo = a.where(a <= b, b).fillna(one)
+    hi = b.where(a <= b, a).fillna(one)
+
+    rest = lo.isna() & price.notna()
+    if rest.any():
+        parsed = [parse_price_range(v) for v in price[rest]]
+        lo.loc[rest] = [t[0] for t in parsed]
+        hi.loc[rest] = [t[1] for t in parsed]
+
+    out = pd.DataFrame(index=price.index)
+    out["_price_min_vnd"] = lo.astype("float64")
+    out["_price_max_vnd"] = hi.astype("float64")
+    out["_price_mid_vnd"] = (out["_price_min_vnd"] + out["_price_max_vnd"]) / 2.0
+    return out
+
+
+def derive_star(star: pd.Series) -> pd.Series:
+    """'Khách sạn 4 sao' -> 4 (ngoài 1..5 -> NaN)."""
+    s = star.astype("string").str.lower()
+    val = pd.to_numeric(s.str.extract(r"(\d+)\s*(?:sao|star)")[0], errors="coerce")
+    digit = pd.to_numeric(s.str.extract(r"\b(\d)\b")[0], errors="coerce")
+    val = val.where(val.notna(), digit)
+    return val.where((val >= 1) & (val <= 5)).astype("float64")
+
+
+def extract_district_num(district_raw: Any) -> Optional[int]:
+    """VD: 'Quận 5, ...' -> 5; 'District 1' -> 1; 'Bình Tân' -> None"""
+    s = normalize_text(district_raw)
+    m = re.search(r"(quan|district)\s*0?(\d+)", s)
+    if m:
+        return int(m.group(2))
+    m2 = re.match(r"^\s*(\d+)\s*(?:,|$)", strip_accents(str(district_raw).lower()))
+    if m2:
+        return int(m2.group(1))
+    return None
+
+
+def derive_district_columns(district: pd.Series) -> pd.DataFrame:
+    """District có rất ít giá trị khác nhau -> tính 1 lần cho mỗi giá trị unique rồi map lại theo cột."""
+    raw = district.fillna("").astype(str)
+    codes, uniques = pd.factorize(raw)
+    shorts = [u.split(",")[0].strip() if u else "" for u in uniques]
+    nums = [extract_district_num(u) if u else None for u in uniques]
+    norms = [normalize_text(sh) for sh in shorts]
+
+    out = pd.DataFrame(index=district.index)
+    out["_district_short"] = np.asarray(shorts, dtype=object)[codes] if len(uniques) else ""
+    out["_district_num"] = pd.array(np.asarray(nums, dtype=object)[codes] if len(uniques) else [], dtype="Int64")
+    out["_district_norm"] = np.asarray(norms, dtype=object)[codes] if len(uniques) else ""
+    return out
+
+
+# =========================
+# COORDINATES OVERLAY
+# =========================
+
+COORDS_OVERLAY_SUFFIX = ".coords.csv"
+COORDS_OVERLAY_COLUMNS = ["key", "lat", "lng", "precision", "query"]
+
+# thứ tự thử geocode cho 1 khách sạn: địa chỉ đầy đủ -> số nhà + đường -> tên -> tâm quận
+GEOCODE_PRECISIONS = ("address", "street", "name", "district")
+# chỉ trúng tâm quận: đủ để vẽ lên bản đồ, không đủ chính xác cho lọc bán kính / khoảng cách
+COARSE_GEOCODE_PRECISIONS = ("district",)
+# cột ghi precision của toạ độ lấy từ file phủ (dòng có toạ độ sẵn trong CSV để trống)
+COORDS_PRECISION_COL = "_coords_precision"
+
+
+def coords_overlay_path(csv_path: str) -> str:
+    """hotels.csv -> hotels.coords.csv"""
+    return os.path.splitext(csv_path)[0] + COORDS_OVERLAY_SUFFIX
+
+
+def _clean(value: Any) -> str:
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return ""
+    return " ".join(str(value).split())
+
+
+def coords_key(hotelname: Any, address: Any) -> str:
+    """Khoá ổn định của 1 khách sạn trong file phủ (không phụ thuộc thứ tự dòng CSV)."""
+    return f"{normalize_text(_clean(hotelname))}|{normalize_text(_clean(address))}"
+
+
+def missing_coords_mask(df: pd.DataFrame, lat_col: str = "lat", lon_col: str = "lng") -> pd.Series:
+    """True nếu thiếu toạ độ: NaN, ngoài khoảng hợp lệ hoặc (0, 0) (giá trị mặc định của vài nguồn crawl)."""
+    if lat_col not in df.columns or lon_col not in df.columns:
+        return pd.Series(True, index=df.index)
+    lat = pd.to_numeric(df[lat_col], errors="coerce")
+    lon = pd.to_numeric(df[lon_col], errors="coerce")
+    bad = lat.isna() | lon.isna() | (lat.abs() > 90) | (lon.abs() > 180)
+    return bad | ((lat == 0) & (lon == 0))
+
+
+def geocode_candidates(row: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """[(precision, query)] theo GEOCODE_PRECISIONS, bỏ query rỗng / trùng."""
+    address, street, district = _clean(row.get("address")), _clean(row.get("street")), _clean(row.get("district"))
+    name = _clean(row.get("hotelname"))
+    raw = {
+        "address": address,
+        "street": ", ".join(x for x in (street, district) if x) if street else "",
+        "name": ", ".join(x for x in (name, district) if x) if name else "",
+        "district": district,
+    }
+    out: List[Tuple[str, str]] = []
+    seen = set()
+    for precision in GEOCODE_PRECISIONS:
+        q = raw[precision]
+        if q and q.lower() not in seen:
+            seen.add(q.lower())
+            out.append((precision, q))
+    return out
+
+
+def read_coords_overlay(path: str) -> pd.DataFrame:
+    """File phủ -> DataFrame (key, lat, lng, precision, query); chưa có file -> bảng rỗng.
+
+    Dòng có lat trống = đã thử mà không tìm thấy (giữ lại để chạy tiếp không gọi lại).
+    Key trùng (file được append khi chạy dở) -> lấy dòng cuối.
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=COORDS_OVERLAY_COLUMNS)
+    overlay = pd.read_csv(
+        path, dtype={"key": str, "lat": "float64", "lng": "float64", "precision": str, "query": str},
+        keep_default_na=False, na_values={"lat": [""], "lng": [""]},
+    )
+    return overlay.drop_duplicates("key", keep="last").reset_index(drop=True)
+
+
+def apply_coords_overlay(
+    df: pd.DataFrame, overlay_path: str, lat_col: str = "lat", lon_col: str = "lng",
+) -> pd.DataFrame:
+    """Điền lat / lng còn thiếu từ file phủ (không ghi đè toạ độ đã có trong CSV), precision của toạ độ
+    điền vào ghi ở cột COORDS_PRECISION_COL."""
+    if not os.path.exists(overlay_path) or "hotelname" not in df.columns:
+        return df
+    missing = missing_coords_mask(df, lat_col, lon_col)
+    if not missing.any():
+        return df
+    overlay = read_coords_overlay(overlay_path).dropna(subset=["lat", "lng"])
+    if overlay.empty:
+        return df
+
+    sub = df.loc[missing]
+    address = sub["address"] if "address" in sub.columns else pd.Series("", index=sub.index)
+    keys = [coords_key(n, a) for n, a in zip(sub["hotelname"], address)]
+    found = overlay.set_index("key").reindex(keys)
+    hit = found["lat"].notna().to_numpy()
+    if not hit.any():
+        return df
+
+    df = df.copy()
+    for col in (lat_col, lon_col):
+        if col not in df.columns:
+            df[col] = np.nan
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    rows = sub.index[hit]
+    df.loc[rows, lat_col] = found["lat"].to_numpy()[hit]
+    df.loc[rows, lon_col] = found["lng"].to_numpy()[hit]
+    if COORDS_PRECISION_COL not in df.columns:
+        df[COORDS_PRECISION_COL] = pd.Series(None, index=df.index, dtype="object")
+    df.loc[rows, COORDS_PRECISION_COL] = found["precision"].to_numpy()[hit]
+    return df
+
+
+def coarse_coords_mask(df: pd.DataFrame) -> pd.Series:
+    """True nếu toạ độ chỉ là tâm quận (geocode không trúng địa chỉ / đường / tên)."""
+    if COORDS_PRECISION_COL not in df.columns:
+        return pd.Series(False, index=df.index)
+    return df[COORDS_PRECISION_COL].isin(COARSE_GEOCODE_PRECISIONS)
+
+
+# =========================
+# LOADER
+# =========================
+
+def _resolve_engine(engine: Optional[str], chunksize: Optional[int], usecols) -> str:
+    engine = (engine or CSV_ENGINE).lower()
+    if chunksize or callable(usecols):
+        return "c"  # pyarrow engine không hỗ trợ chunksize / usecols dạng hàm
+    if engine == "auto":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return "c"
+        return "pyarrow"
+    return engine
+
+
+def read_hotels_csv(path: str, usecols=None, chunksize: Optional[int] = None, engine: Optional[str] = None):
+    """pd.read_csv với dtype khai báo sẵn. chunksize -> trả iterator như pandas."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Không tìm thấy file CSV: {path}")
+    kwargs: Dict[str, Any] = {"dtype": CSV_DTYPES, "usecols": usecols, "chunksize": chunksize}
+    if _resolve_engine(engine, chunksize, usecols) == "pyarrow":
+        try:
+            return pd.read_csv(path, engine="pyarrow", **kwargs)
+        except pd.errors.ParserError:
+            pass  # pyarrow không đọc được ô có xuống dòng trong ngoặc kép -> engine C
+    # round_trip: float parse giống hệt pyarrow (mặc định của engine C có thể lệch 1 ulp),
+    # để build đầy đủ / streaming / update ra cùng metadata (lat, lng...)
+    return pd.read_csv(path, engine="c", float_precision="round_trip", **kwargs)
+
+
+def add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Thêm các cột dẫn xuất (xem docstring module); cột nguồn không có thì bỏ qua."""
+    parts = [df]
+    if "price" in df.columns:
+        parts.append(derive_price_columns(df["price"]))
+    if "district" in df.columns:
+        parts.append(derive_district_columns(df["district"]))
+    out = pd.concat(parts, axis=1) if len(parts) > 1 else df
+    if "star" in df.columns:
+        out["_star"] = derive_star(df["star"])
+    for src, dst in LIST_COLUMNS.items():
+        if src in df.columns:
+            out[dst] = parse_list_column(df[src])
+    return out
+
+
+def load_hotels(path: str, engine: Optional[str] = None, usecols=None, coords: bool = True) -> pd.DataFrame:
+    """read_hotels_csv + cột dẫn xuất. coords=True: điền toạ độ thiếu từ <csv>.coords.csv nếu có."""
+    df = read_hotels_csv(path, usecols=usecols, engine=engine)
+    if coords and "lat" in df.columns and "lng" in df.columns:
+        df = apply_coords_overlay(df, coords_overlay_path(path))
+    return add_derived_columns(df)
@@ -1,45 +1,38 @@
 import folium
-import requests
-import time
 
-NOMINATIM = "https://nominatim.openstreetmap.org"
-OSRM = "https://router.project-osrm.org"
-UA = {"User-Agent": "OSM-Demo-Folium/1.0 (contact: bsssdd24@gmail.com)"}
+from geo_client import get_client
+from hotel_data import missing_coords_mask
+from map_layers import MAP_MAX_ROUTES, add_hotel_markers, simplify_route
 
-# địa danh => tọa độ
+# địa danh => tọa độ (cache + rate limit trong geo_client)
 def geocode(q):
-    time.sleep(1.0)
-    r = requests.get(f"{NOMINATIM}/search", params={"q": q, "format": "jsonv2", "limit": 1}, headers=UA)
-    r.raise_for_status()
-    j = r.json()
-    if not j: raise ValueError("Không tìm thấy")
-    return float(j[0]["lat"]), float(j[0]["lon"]), j[0].get("display_name", q)
-
-
-# vẽ tuyến đồ lên bản đồ
-def osrm_geom(lon1, lat1, lon2, lat2):
-    r = requests.get(f"{OSRM}/route/v1/driving/{lon1},{lat1};{lon2},{lat2}",
-                     params={"overview":"full","geometries":"geojson"}, headers=UA, timeout=120)
-    r.raise_for_status()
-    data = r.json()
-    route = data["routes"][0]
-    return route["geometry"]
+    hit = get_client().geocode(q)
+    if hit is None: raise ValueError("Không tìm thấy")
+    return hit
 
 
 def create_map(recommendations):
+    # khách sạn chưa có toạ độ (chưa chạy bulk_geocode.py) không đưa lên bản đồ
+    recommendations = recommendations[~missing_coords_mask(recommendations, "lat", "lon")]
     user_lat, user_lon, _ = geocode("Trường Đại học Khoa học Tự nhiên, Việt Nam")
     center_lat = recommendations["lat"].mean()
     center_lon = recommendations["lon"].mean()
     m = folium.Map(location=[center_lat, center_lon], zoom_start=12)
     folium.Marker([user_lat, user_lon], popup="User location", icon=folium.Icon(color='red')).add_to(m)
 
-    for idx, row in recommendations.iterrows(): # duyện từng khách sạn trong recommendations để vẽ đường đi từ vị trí hiện tại đến hotel đó
-        folium.Marker(
-            [row["lat"], row["lon"]],
-            popup=f"{row['hotelname']}<br>Địa chỉ: {row['address']}<br>Score: {row['score']:.4f}"
-        ).add_to(m)
-        geom = osrm_geom(user_lon, user_lat, row["lon"], row["lat"])
-        latlon = [(lat, lon) for lon, lat in geom["coordinates"]]
+    # marker cluster + popup lazy (map_layers.py)
+    add_hotel_markers(
+        m, recommendations,
+        fields=[("Địa chỉ", "address"), ("Score", "score")],
+        formatters={"score": lambda v: f"{v:.4f}"},
+    )
+
+    # tuyến tới các khách sạn đầu danh sách lấy song song, có deadline chung (quá hạn -> đường thẳng)
+    routed = recommendations.head(MAP_MAX_ROUTES)
+    geoms = get_client().routes_from(user_lon, user_lat, list(zip(routed["lon"], routed["lat"])))
+
+    for geom in geoms: # vẽ đường đi từ vị trí hiện tại đến từng hotel, đã rút gọn điểm theo sai số pixel
+        latlon = [(lat, lon) for lon, lat in simplify_route(geom)["coordinates"]]
         folium.PolyLine(latlon, color='blue', weight=2, opacity=0.7).add_to(m)
 
     m.save("hotels_map.html")
@@ -0,0 +1,288 @@
+"""Lớp bản đồ gọn cho folium (web.py / map.py): cluster marker theo grid + rút gọn tuyến đường.
+
+- HotelMarkerLayer: toàn bộ khách sạn nhúng 1 lần dưới dạng mảng JSON gọn (toạ độ + vài chuỗi hiển
+  thị), không sinh 1 Marker + 1 Popup HTML riêng cho mỗi khách sạn. Popup chỉ được dựng khi click.
+- Nhiều hơn MAP_CLUSTER_MIN khách sạn: cluster theo grid tính sẵn ở server cho từng mức zoom
+  (MAP_CLUSTER_ZOOMS, ô ~ MAP_CLUSTER_CELL_PX pixel); trình duyệt chỉ đổi mức khi zoom, mỗi lúc chỉ
+  vẽ số cluster đang thấy thay vì hàng nghìn marker.
+- simplify_route: Douglas–Peucker trên geometry OSRM overview=full, sai số tính theo pixel ở mức
+  zoom MAP_ROUTE_ZOOM -> tuyến nhìn như cũ nhưng ít điểm hơn nhiều.
+"""
+
+import json
+import math
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from branca.element import MacroElement
+from jinja2 import Template
+
+from hotel_data import missing_coords_mask
+
+
+# =========================
+# CONFIG
+# =========================
+
+# ít khách sạn hơn ngưỡng này -> không cluster (vẫn popup lazy)
+MAP_CLUSTER_MIN = int(os.getenv("MAP_CLUSTER_MIN", "50"))
+MAP_CLUSTER_CELL_PX = float(os.getenv("MAP_CLUSTER_CELL_PX", "64"))
+# cluster tính sẵn cho các mức zoom này; zoom lớn nhất hiển thị từng khách sạn
+MAP_CLUSTER_ZOOMS = tuple(range(10, 17))
+
+MAP_ROUTE_TOLERANCE_PX = float(os.getenv("MAP_ROUTE_TOLERANCE_PX", "1.5"))
+MAP_ROUTE_ZOOM = int(os.getenv("MAP_ROUTE_ZOOM", "15"))
+# số tuyến tối đa vẽ trên 1 bản đồ
+MAP_MAX_ROUTES = int(os.getenv("MAP_MAX_ROUTES", "20"))
+
+_EARTH_CIRCUMFERENCE_M = 40075016.686
+_M_PER_DEG_LAT = 111320.0
+
+
+def meters_per_pixel(zoom: float, lat: float) -> float:
+    """Độ phân giải của tile Web Mercator 256px tại vĩ độ lat."""
+    return _EARTH_CIRCUMFERENCE_M * math.cos(math.radians(lat)) / (256.0 * 2.0 ** zoom)
+
+
+def pixels_to_deg(px: float, zoom: float, lat: float) -> float:
+    """px pixel ở mức zoom -> độ vĩ (theo trục bắc-nam)."""
+    return px * meters_per_pixel(zoom, lat) / _M_PER_DEG_LAT
+
+
+# =========================
+# ROUTE SIMPLIFICATION
+# =========================
+
+def simplify_line(coords: Sequence[Sequence[float]], tolerance_deg: float) -> List[List[float]]:
+    """Douglas–Peucker (không đệ quy) cho [[lon, lat], ...]; kinh độ nhân cos(lat) để sai số đẳng hướng."""
+    pts = np.asarray(coords, dtype=np.float64)
+    n = len(pts)
+    if n <= 2 or tolerance_deg <= 0:
+        return pts.tolist()
+
+    xy = pts * np.array([math.cos(math.radians(float(pts[:, 1].mean()))), 1.0])
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b <= a + 1:
+            continue
+        seg = xy[b] - xy[a]
+        rel = xy[a + 1:b] - xy[a]
+        seg_len = math.hypot(seg[0], seg[1])
+        if seg_len == 0.0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / seg_len
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance_deg:
+            k = a + 1 + i
+            keep[k] = True
+            stack.append((a, k))
+            stack.append((k, b))
+    return pts[keep].tolist()
+
+
+def simplify_route(
+    geom: Dict[str, Any], zoom: float = MAP_ROUTE_ZOOM, tolerance_px: float = MAP_ROUTE_TOLERANCE_PX
+) -> Dict[str, Any]:
+    """Bản sao geometry (GeoJSON LineString) đã rút gọn tới sai số tolerance_px pixel ở mức zoom."""
+    coords = geom.get("coordinates") or []
+    if len(coords) <= 2:
+        return geom
+    lat = float(np.mean([c[1] for c in coords]))
+    return {**geom, "coordinates": simplify_line(coords, pixels_to_deg(tolerance_px, zoom, lat))}
+
+
+# =========================
+# GRID CLUSTERING
+# =========================
+
+def grid_clusters(lat: np.ndarray, lon: np.ndarray, cell_deg: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Gom điểm theo ô cell_deg (kinh độ giãn theo cos(lat) cho ô vuông trên bản đồ).
+
+    Returns: (lat tâm, lon tâm, số điểm, id cluster của từng điểm)
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    if not len(lat):
+        empty = np.zeros(0)
+        return empty, empty, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    cell_lon = cell_deg / max(math.cos(math.radians(float(lat.mean()))), 1e-6)
+    keys = np.stack([np.floor(lat / cell_deg), np.floor(lon / cell_lon)], axis=1).astype(np.int64)
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    c_lat = np.bincount(inverse, weights=lat) / counts
+    c_lon = np.bincount(inverse, weights=lon) / counts
+    return c_lat, c_lon, counts, inverse
+
+
+def cluster_levels(
+    lat: np.ndarray, lon: np.ndarray, zooms: Sequence[int] = MAP_CLUSTER_ZOOMS, cell_px: float = MAP_CLUSTER_CELL_PX
+) -> Dict[int, List[List[float]]]:
+    """{zoom: [[lat, lon, số điểm, vị trí điểm (chỉ khi cluster 1 điểm, còn lại -1)], ...]}.
+
+    Mức zoom lớn nhất không cluster (hiện từng điểm).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    singles = [[round(float(a), 6), round(float(b), 6), 1, i] for i, (a, b) in enumerate(zip(lat, lon))]
+    if not len(lat):
+        return {int(z): [] for z in zooms}
+    lat0 = float(lat.mean())
+
+    levels: Dict[int, List[List[float]]] = {}
+    for z in zooms[:-1]:
+        c_lat, c_lon, counts, inverse = grid_clusters(lat, lon, pixels_to_deg(cell_px, z, lat0))
+        # cluster 1 điểm -> giữ đúng toạ độ + vị trí của điểm đó
+        first = np.full(len(counts), -1, dtype=np.int64)
+        first[inverse] = np.arange(len(inverse))
+        levels[int(z)] = [
+            singles[int(first[c])] if counts[c] == 1 else [round(float(c_lat[c]), 6), round(float(c_lon[c]), 6), int(counts[c]), -1]
+            for c in range(len(counts))
+        ]
+    levels[int(zooms[-1])] = singles
+    return levels
+
+
+# =========================
+# FOLIUM LAYER
+# =========================
+
+class HotelMarkerLayer(MacroElement):
+    """Marker khách sạn (có cluster tính sẵn) + popup dựng lúc click, dữ liệu nhúng 1 lần dạng JSON."""
+
+    _template = Template(
+        """
+        {% macro header(this, kwargs) %}
+            <style>
+                .hotel-cluster div {
+                    width: 34px; height: 34px; line-height: 34px; border-radius: 17px;
+                    background: rgba(38, 110, 206, 0.85); color: #fff; font-weight: bold;
+                    text-align: center; border: 2px solid #fff; box-shadow: 0 0 4px rgba(0, 0, 0, 0.4);
+                }
+            </style>
+        {% endmacro %}
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var hotels = {{ this.hotels_json }};
+            var labels = {{ this.labels_json }};
+            var levels = {{ this.levels_json }};
+            var zooms = Object.keys(levels).map(Number).sort(function(a, b) { return a - b; });
+            var group = L.layerGroup().addTo(map);
+            var current = null;
+
+            function esc(s) {
+                return String(s).replace(/[&<>"']/g, function(c) {
+                    return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c];
+                });
+            }
+            function popupHtml(h) {
+                var html = '<div style="width: 200px;"><h4>' + esc(h[0]) + '</h4>';
+                for (var k = 0; k < labels.length; k++) {
+                    html += '<p><b>' + esc(labels[k]) + ':</b> ' + esc(h[k + 1]) + '</p>';
+                }
+                return html + '</div>';
+            }
+            function hotelIcon() {
+                if (L.AwesomeMarkers) {
+                    return L.AwesomeMarkers.icon({icon: "hotel", prefix: "fa", markerColor: "blue"});
+                }
+                return new L.Icon.Default();
+            }
+            function levelFor(z) {
+                var best = zooms[0];
+                for (var k = 0; k < zooms.length; k++) { if (zooms[k] <= z) { best = zooms[k]; } }
+                return best;
+            }
+            function render() {
+                var z = levelFor(map.getZoom());
+                if (z === current) { return; }
+                current = z;
+                group.clearLayers();
+                levels[z].forEach(function(p) {
+                    if (p[2] === 1) {
+                        var h = hotels[p[3]];
+                        L.marker([p[0], p[1]], {icon: hotelIcon()})
+                            .bindPopup(function() { return popupHtml(h); }, {maxWidth: 250})
+                            .bindTooltip(esc(h[0]))
+                            .addTo(group);
+                    } else {
+                        L.marker([p[0], p[1]], {
+                            icon: L.divIcon({html: "<div>" + p[2] + "</div>", className: "hotel-cluster", iconSize: [38, 38]})
+                        }).bindTooltip(p[2] + " khách sạn").on("click", function() {
+                            map.setView([p[0], p[1]], Math.min(map.getZoom() + 2, zooms[zooms.length - 1]));
+                        }).addTo(group);
+                    }
+                });
+            }
+            map.on("zoomend", render);
+            render();
+        })();
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        lat: Sequence[float],
+        lon: Sequence[float],
+        rows: List[List[str]],
+        labels: List[str],
+        cluster_min: int = MAP_CLUSTER_MIN,
+    ):
+        super().__init__()
+        self._name = "HotelMarkerLayer"
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if len(lat) > cluster_min:
+            levels = cluster_levels(lat, lon)
+        else:
+            levels = {0: cluster_levels(lat, lon, zooms=(0,))[0]}
+        self.hotels_json = _js_json(rows)
+        self.labels_json = _js_json(labels)
+        self.levels_json = _js_json(levels)
+
+
+def _cell_text(v: Any) -> str:
+    return "" if v is None or (np.isscalar(v) and pd.isna(v)) else str(v)
+
+
+def _js_json(value: Any) -> str:
+    # nhúng vào <script>: không để chuỗi dữ liệu đóng thẻ script
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+
+
+def add_hotel_markers(
+    m: Any,
+    df: pd.DataFrame,
+    fields: Sequence[Tuple[str, str]],
+    formatters: Optional[Dict[str, Callable[[Any], str]]] = None,
+    title_col: str = "hotelname",
+    lat_col: str = "lat",
+    lon_col: str = "lon",
+    cluster_min: int = MAP_CLUSTER_MIN,
+) -> HotelMarkerLayer:
+    """Thêm marker khách sạn vào map. fields: [(nhãn popup, cột)], formatters: {cột: hàm -> chuỗi}."""
+    formatters = formatters or {}
+    # thiếu toạ độ / (0, 0) -> bỏ, không vẽ ngoài biển
+    df = df[~missing_coords_mask(df, lat_col, lon_col)]
+
+    columns = [title_col] + [col for _label, col in fields]
+    cells: List[List[str]] = []
+    for col in columns:
+        values = df[col].tolist() if col in df.columns else [None] * len(df)
+        fmt = formatters.get(col)
+        cells.append([fmt(v) if fmt else _cell_text(v) for v in values])
+    rows = [list(r) for r in zip(*cells)] if len(df) else []
+
+    layer = HotelMarkerLayer(
+        df[lat_col].astype(float).to_numpy(), df[lon_col].astype(float).to_numpy(),
+        rows, [label for label, _col in fields], cluster_min=cluster_min,
+    )
+    layer.add_to(m)
+    return layer
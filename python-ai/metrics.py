@@ -0,0 +1,155 @@
+"""Đo latency từng stage của pipeline chat (rẻ, để bật luôn trên production).
+
+- stage("vec_topk"): context manager đo thời gian 1 stage -> histogram qabot_stage_seconds{stage=...}
+- observe_size("candidates", n): histogram kích thước tập ứng viên
+- inc_cache("district_names", hit=True): đếm cache hit/miss
+- render_prometheus(): xuất text format cho endpoint /metrics
+- begin_request() / server_timing_header(): gom thời gian các stage của 1 request -> header Server-Timing
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# =========================
+# CONFIG
+# =========================
+
+STAGE_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+SIZE_BUCKETS: Tuple[float, ...] = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+
+# =========================
+# PRIMITIVES
+# =========================
+
+class Histogram:
+    """Histogram bucket cố định (cumulative khi xuất, lưu non-cumulative cho rẻ)."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # phần tử cuối = +Inf
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.n += 1
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds: Dict[str, Histogram] = {}
+        self.sizes: Dict[str, Histogram] = {}
+        self.cache: Dict[Tuple[str, str], int] = {}
+
+    def observe_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            h = self.stage_seconds.get(name)
+            if h is None:
+                h = self.stage_seconds[name] = Histogram(STAGE_BUCKETS)
+            h.observe(seconds)
+
+    def observe_size(self, name: str, n: int) -> None:
+        with self._lock:
+            h = self.sizes.get(name)
+            if h is None:
+                h = self.sizes[name] = Histogram(SIZE_BUCKETS)
+            h.observe(float(n))
+
+    def inc_cache(self, name: str, result: str) -> None:
+        with self._lock:
+            key = (name, result)
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stage_seconds.clear()
+            self.sizes.clear()
+            self.cache.clear()
+
+
+REGISTRY = _Registry()
+
+# Thời gian các stage của request hiện tại (None = không nằm trong request HTTP)
+_REQUEST_TIMINGS: ContextVar[Optional[Dict[str, float]]] = ContextVar("qabot_request_timings", default=None)
+
+
+# =========================
+# PUBLIC API
+# =========================
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        REGISTRY.observe_stage(name, dt)
+        timings = _REQUEST_TIMINGS.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + dt
+
+
+def observe_size(name: str, n: int) -> None:
+    REGISTRY.observe_size(name, int(n))
+
+
+def inc_cache(name: str, hit: bool) -> None:
+    REGISTRY.inc_cache(name, "hit" if hit else "miss")
+
+
+def begin_request() -> Dict[str, float]:
+    """Gọi ở đầu mỗi request; các stage sau đó sẽ cộng dồn vào dict trả về."""
+    timings: Dict[str, float] = {}
+    _REQUEST_TIMINGS.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """VD: 'vec_topk;dur=12.31, lexical_topk;dur=0.84' (ms, theo chuẩn Server-Timing)."""
+    return ", ".join(f"{name};dur={sec * 1000.0:.2f}" for name, sec in timings.items())
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+def _render_histograms(lines: List[str], metric: str, label: str, hists: Dict[str, Histogram], help_text: str) -> None:
+    lines.append(f"# HELP {metric} {help_text}")
+    lines.append(f"# TYPE {metric} histogram")
+    for name, h in sorted(hists.items()):
+        cum = 0
+        for le, c in zip(h.buckets + (float("inf"),), h.counts):
+            cum += c
+            lines.append(f'{metric}_bucket{{{label}="{name}",le="{_fmt(le)}"}} {cum}')
+        lines.append(f'{metric}_sum{{{label}="{name}"}} {h.total}')
+        lines.append(f'{metric}_count{{{label}="{name}"}} {h.n}')
+
+
+def render_prometheus() -> str:
+    """Xuất toàn bộ metrics theo Prometheus text exposition format 0.0.4."""
+    reg = REGISTRY
+    with reg._lock:
+        stage_seconds = dict(reg.stage_seconds)
+        sizes = dict(reg.sizes)
+        cache = dict(reg.cache)
+        lines: List[str] = []
+        _render_histograms(lines, "qabot_stage_seconds", "stage", stage_seconds, "Latency từng stage của pipeline chat.")
+        _render_histograms(lines, "qabot_candidate_set_size", "set", sizes, "Kích thước tập ứng viên từng bước.")
+        lines.append("# HELP qabot_cache_requests_total Số lần tra cache theo kết quả hit/miss.")
+        lines.append("# TYPE qabot_cache_requests_total counter")
+        for (name, result), n in sorted(cache.items()):
+            lines.append(f'qabot_cache_requests_total{{cache="{name}",result="{result}"}} {n}')
+    return "\n".join(lines) + "\n"
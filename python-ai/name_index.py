@@ -0,0 +1,372 @@
+"""Index tên khách sạn cho đường tắt "hỏi đúng tên" (không cần encoder / FAISS / TF-IDF).
+
+NameIndex.match: trie theo token của tên đã chuẩn hoá (normalize_text: bỏ dấu, lowercase, bỏ ký tự
+lạ). Quét câu hỏi 1 lượt từ trái sang phải, ở mỗi vị trí đi xuống trie để lấy tên dài nhất khớp trọn
+vẹn -> chi phí tỉ lệ với độ dài câu hỏi, không phụ thuộc số khách sạn.
+
+NameIndex.search: khớp gần đúng (gõ sai chính tả, thiếu "khách sạn" / "hotel"; thiếu dấu đã được
+normalize_text xử lý). Symmetric delete trên từ điển token của tên: mỗi token câu hỏi chỉ sinh các
+biến thể xoá 1-2 ký tự rồi tra dict, không so với từng tên. Mỗi tên chỉ được đăng ký dưới token
+hiếm nhất của nó (tên khớp thì chắc chắn khớp token đó) nên danh sách ứng viên phải kiểm tra ngắn
+và gần như không đổi khi catalog lớn lên.
+
+Tên chỉ gồm từ chung chung ("Khách sạn 2", "Hotel Saigon", "Nhà nghỉ Quận 1", "Đại học") không được index:
+khớp những tên này không đủ tin cậy để bỏ qua retrieval. Khớp đúng còn phải phủ đủ phần riêng của câu hỏi
+và không đứng sau "gần" / "near" (lookup), nếu không chỉ tính là khớp gần đúng.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+from hotel_data import normalize_text
+
+
+# số ký tự tối thiểu của phần "riêng" trong tên (sau khi bỏ từ chung chung)
+NAME_MIN_DISTINCT_CHARS = int(os.getenv("NAME_MIN_DISTINCT_CHARS", "3"))
+# khớp gần đúng: tổng số lỗi (chèn / xoá / thay / đảo 2 ký tự) tối đa cho cả tên
+NAME_FUZZY_MAX_EDITS = int(os.getenv("NAME_FUZZY_MAX_EDITS", "2"))
+# được bỏ qua từ chung chung của tên ("khách sạn", "hotel") khi phần riêng dài ít nhất ngần này ký tự
+NAME_FUZZY_MIN_DISTINCT_CHARS = int(os.getenv("NAME_FUZZY_MIN_DISTINCT_CHARS", "6"))
+# khớp đúng chỉ tin cậy khi tên khớp chiếm ít nhất tỉ lệ này phần riêng của câu hỏi (theo số ký tự)
+NAME_MIN_QUERY_COVERAGE = float(os.getenv("NAME_MIN_QUERY_COVERAGE", "0.5"))
+
+# từ loại hình / hành chính / từ mô tả nhu cầu hay gặp trong câu hỏi -> không đủ để nhận ra 1 khách sạn
+# ("Khách sạn Sạch", "Giá Rẻ." trùng với cách hỏi "khách sạn sạch sẽ giá rẻ")
+GENERIC_NAME_TOKENS = frozenset(
+    """
+    khach san hotel hotels homestay home stay nha nghi motel resort apartment apartments can ho
+    dich vu villa hostel inn house guesthouse guest room rooms phong tro cho thue the and a an
+    boutique luxury saigon sai gon hcm hcmc city thanh pho tp quan district phuong ward q
+    chi minh vietnam viet nam near gan
+    gia re sach se dep dat tot cao cap binh dan yen tinh view trung tam ho boi wifi bua sang
+    an sang gym dau xe sao moi rong gia dinh cap doi tien nghi danh
+    dai hoc truong benh vien cho cong vien san bay ga ben pho di bo nha tho chua bao tang sieu thi
+    toa landmark tower mall plaza cau song bien nga tu
+    """.split()
+)
+
+# "gần / cạnh / quanh <tên>": tên đó là địa danh để tìm quanh, không phải khách sạn người dùng hỏi
+NEAR_TOKENS = frozenset("gan near canh quanh cach".split())
+
+# từ hỏi / đệm trong câu hỏi, không tính vào phần riêng khi đo độ phủ ("... còn phòng không", "giá bao nhiêu")
+QUERY_FILLER_TOKENS = frozenset(
+    """
+    con khong co bao nhieu o dau minh cho hoi the nao review dia chi lien he so sanh va voi hay hon
+    """.split()
+)
+
+_END = ""  # key đánh dấu cuối tên trong trie (token thật không bao giờ rỗng)
+
+
+def name_tokens(name: Any) -> List[str]:
+    """Token đã chuẩn hoá của tên / câu hỏi. "đ" -> "d" trước khi bỏ dấu (normalize_text bỏ hẳn "đ":
+    "Đình" -> "inh", người gõ không dấu "Dinh" sẽ không khớp)."""
+    if name is None or (isinstance(name, float) and name != name):
+        return []
+    return normalize_text(str(name).replace("đ", "d").replace("Đ", "D")).split()
+
+
+def _distinct_chars(tokens: Sequence[str]) -> int:
+    return sum(len(t) for t in tokens if t not in GENERIC_NAME_TOKENS and not t.isdigit())
+
+
+def is_distinctive(tokens: Sequence[str]) -> bool:
+    """Tên có đủ phần riêng (không phải số / từ chung chung) để khớp chính xác là đáng tin."""
+    return _distinct_chars(tokens) >= NAME_MIN_DISTINCT_CHARS
+
+
+def _is_key_token(t: str) -> bool:
+    """Token bắt buộc phải có trong câu hỏi khi khớp gần đúng (phần riêng của tên, kể cả số)."""
+    return len(t) >= 2 and t not in GENERIC_NAME_TOKENS
+
+
+def token_max_edits(n: int) -> int:
+    """Số lỗi cho phép trên 1 token dài n ký tự: từ ngắn phải đúng hẳn ("không" != "Hồng")."""
+    return 0 if n <= 4 else (1 if n <= 7 else 2)
+
+
+def _fuzzy_keys(name: Any, tokens: Sequence[str], places: Sequence[str] = ()) -> Tuple[str, ...]:
+    """Token riêng bắt buộc khi khớp gần đúng. Phần trong ngoặc và tên quận ("N&H House (Q. Phú Nhuận)",
+    "Thu Duc Hotel") là vị trí, không đủ để nhận ra khách sạn -> không bắt buộc."""
+    core = f" {' '.join(name_tokens(re.sub(r'[(][^)]*[)]?', ' ', str(name))))} "
+    for place in places:
+        if f" {place} " in core:
+            core = core.replace(f" {place} ", " ")
+    core_tokens = set(core.split())
+    return tuple(t for t in tokens if _is_key_token(t) and t in core_tokens)
+
+
+def _deletes(word: str, edits: int) -> Set[str]:
+    out = {word}
+    frontier = {word}
+    for _ in range(edits):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - out
+        out |= frontier
+    return out
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Khoảng cách Damerau–Levenshtein (đảo 2 ký tự kề nhau = 1 lỗi); > limit thì trả limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+def _after_near(q_tokens: Sequence[str], start: int) -> bool:
+    """Token trước vị trí start (bỏ qua từ chung chung: "gần sân bay Tân Sơn Nhất", token 1 ký tự / số đầu tên
+    mà khớp gần đúng không tính vào vị trí: "gần M Village ...") là "gần" / "near"."""
+    for t in reversed(q_tokens[:start]):
+        if t in NEAR_TOKENS:
+            return True
+        if t not in GENERIC_NAME_TOKENS and len(t) >= 2 and not t.isdigit():
+            return False
+    return False
+
+
+def _confident(q_tokens: Sequence[str], spans: Sequence[Tuple[int, int]]) -> bool:
+    """Các tên khớp (vị trí token đầu, cuối) phủ >= NAME_MIN_QUERY_COVERAGE phần riêng của câu hỏi và không
+    đứng sau "gần" / "near". Từ hỏi / đệm chỉ bỏ khi nằm ngoài tên ("Khổng Gia", "Hội An Hotel" vẫn là tên)."""
+    in_name = {p for start, end in spans for p in range(start, end + 1)}
+    covered = _distinct_chars([q_tokens[p] for p in in_name])
+    rest = _distinct_chars([t for p, t in enumerate(q_tokens) if p not in in_name and t not in QUERY_FILLER_TOKENS])
+    # tên chỉ còn từ hỏi / đệm ("House's Co" trong "... house có hồ bơi") -> không đủ tin cậy
+    own = _distinct_chars([q_tokens[p] for p in in_name if q_tokens[p] not in QUERY_FILLER_TOKENS])
+    if own <= 0 or covered < NAME_MIN_QUERY_COVERAGE * (covered + rest):
+        return False
+    return not any(_after_near(q_tokens, start) for start, _end in spans)
+
+
+@dataclass
+class NameHit:
+    row_ids: List[int]
+    tokens: Tuple[str, ...]
+    edits: int  # tổng số lỗi chính tả
+    score: int  # số ký tự của các token khớp - 2 x edits - số token của tên không có trong câu hỏi
+    complete: bool  # mọi token (>= 2 ký tự) của tên đều có trong câu hỏi
+    start: int  # vị trí token đầu / cuối khớp trong câu hỏi
+    end: int
+
+
+class NameIndex:
+    """Trie token -> row_ids (index của DataFrame) + index gần đúng. Nhiều dòng trùng tên -> cùng 1 mục."""
+
+    def __init__(self, names: Sequence[Any], row_ids: Sequence[int], places: Sequence[Any] = ()):
+        self._trie: Dict[str, Any] = {}
+        self.size = 0
+        entries: Dict[Tuple[str, ...], List[int]] = {}
+        keys: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        place_norms = sorted({" ".join(name_tokens(p)) for p in places} - {""}, key=len, reverse=True)
+        for name, rid in zip(names, row_ids):
+            tokens = name_tokens(name)
+            if not tokens or not is_distinctive(tokens):
+                continue
+            node = self._trie
+            for t in tokens:
+                node = node.setdefault(t, {})
+            node.setdefault(_END, []).append(int(rid))
+            entries.setdefault(tuple(tokens), []).append(int(rid))
+            keys.setdefault(tuple(tokens), _fuzzy_keys(name, tokens, place_norms))
+            self.size += 1
+        self._build_fuzzy(entries, keys)
+
+    def _build_fuzzy(
+        self, entries: Dict[Tuple[str, ...], List[int]], keys: Dict[Tuple[str, ...], Tuple[str, ...]],
+    ) -> None:
+        # (token của tên, token bắt buộc, row_ids, chỉ khớp đúng?): tên không có token riêng nào
+        # ngoài tên quận ("Thu Duc Hotel") chỉ khớp khi đủ mọi token, không lỗi
+        self._entries: List[Tuple[Tuple[str, ...], Tuple[str, ...], List[int], bool]] = []
+        for tokens, rows in entries.items():
+            required = keys[tokens] or tuple(t for t in tokens if len(t) >= 2)
+            if required:
+                self._entries.append((tokens, required, rows, not keys[tokens]))
+
+        vocab: Set[str] = set()
+        freq: Dict[str, int] = {}
+        for tokens, required, _rows, _exact in self._entries:
+            vocab.update(t for t in tokens if len(t) >= 2)
+            for t in set(required):
+                freq[t] = freq.get(t, 0) + 1
+
+        # mỗi tên đăng ký dưới token bắt buộc hiếm nhất (bằng nhau -> token dài hơn)
+        self._postings: Dict[str, List[int]] = {}
+        for e, (_tokens, required, _rows, _exact) in enumerate(self._entries):
+            rarest = min(required, key=lambda t: (freq[t], -len(t)))
+            self._postings.setdefault(rarest, []).append(e)
+
+        # symmetric delete: biến thể xoá ký tự -> token gốc (token số chỉ khớp đúng)
+        self._deletes: Dict[str, List[str]] = {}
+        for t in vocab:
+            for v in (_deletes(t, token_max_edits(len(t))) if not t.isdigit() else {t}):
+                self._deletes.setdefault(v, []).append(t)
+
+    @classmethod
+    def from_frame(cls, df: Any, col: str = "hotelname", district_col: str = "district") -> "NameIndex":
+        places: List[str] = []
+        if district_col in df.columns:
+            # "Thủ Đức, Thành phố Hồ Chí Minh" -> "Thủ Đức"
+            places = df[district_col].dropna().astype(str).str.split(",").str[0].unique().tolist()
+        return cls(df[col].tolist(), df.index.tolist(), places)
+
+    def match(self, query: str) -> List[int]:
+        """row_ids của các tên xuất hiện trọn vẹn trong câu hỏi (tên dài nhất ở mỗi vị trí, theo thứ tự xuất hiện)."""
+        out: List[int] = []
+        for _start, _end, rows in self._match_spans(name_tokens(query)):
+            out.extend(rid for rid in rows if rid not in out)
+        return out
+
+    def _match_spans(self, tokens: Sequence[str]) -> List[Tuple[int, int, List[int]]]:
+        """[(vị trí token đầu, token cuối, row_ids)] của các tên khớp trọn vẹn, theo thứ tự xuất hiện."""
+        out: List[Tuple[int, int, List[int]]] = []
+        i = 0
+        while i < len(tokens):
+            node, j, best = self._trie, i, None
+            while j < len(tokens) and tokens[j] in node:
+                node = node[tokens[j]]
+                j += 1
+                if _END in node:
+                    best = (j, node[_END])
+            if best is None:
+                i += 1
+                continue
+            out.append((i, best[0] - 1, best[1]))
+            i = best[0]
+        return out
+
+    def _lookup_token(self, t: str) -> List[Tuple[str, int]]:
+        """[(token trong từ điển, số lỗi)] cách t trong giới hạn token_max_edits."""
+        if t.isdigit():
+            return [(t, 0)] if t in self._deletes else []
+        found: Dict[str, int] = {}
+        # giới hạn lỗi tính theo token của tên (t có thể đã bị gõ thiếu / thừa ký tự)
+        for v in _deletes(t, token_max_edits(len(t) + 1)):
+            for w in self._deletes.get(v, ()):
+                if w in found or w.isdigit():
+                    continue
+                limit = token_max_edits(len(w))
+                d = edit_distance(t, w, limit)
+                if d <= limit:
+                    found[w] = d
+        return list(found.items())
+
+    def search(self, query: str, max_edits: int = NAME_FUZZY_MAX_EDITS) -> List[NameHit]:
+        """Tên khớp gần đúng trong câu hỏi, tốt nhất trước (NameHit.score).
+
+        Điều kiện: mọi token riêng của tên có trong câu hỏi, đúng thứ tự, liền nhau (mỗi token
+        <= token_max_edits lỗi, cả tên <= max_edits). Từ chung chung của tên ("khách sạn", "hotel")
+        được thiếu khi phần riêng dài >= NAME_FUZZY_MIN_DISTINCT_CHARS ký tự và câu hỏi có ít nhất
+        nửa số token của tên.
+        """
+        # token từ điển -> [(vị trí trong câu hỏi, số lỗi)]; từ chung chung của câu hỏi chỉ khớp đúng
+        q_tokens = name_tokens(query)
+        near: Dict[str, List[Tuple[int, int]]] = {}
+        for pos, t in enumerate(q_tokens):
+            if len(t) < 2:
+                continue
+            matches = [(t, 0)] if t in GENERIC_NAME_TOKENS else self._lookup_token(t)
+            for w, d in matches:
+                near.setdefault(w, []).append((pos, d))
+
+        seen: Set[int] = set()
+        hits: List[NameHit] = []
+        for w in near:
+            for e in self._postings.get(w, ()):
+                if e in seen:
+                    continue
+                seen.add(e)
+                hit = self._verify(e, near, q_tokens, max_edits)
+                if hit is not None:
+                    hits.append(hit)
+        hits.sort(key=lambda h: (-h.score, h.edits, h.start))
+        return hits
+
+    def _verify(
+        self, e: int, near: Dict[str, List[Tuple[int, int]]], q_tokens: Sequence[str], max_edits: int,
+    ) -> "NameHit | None":
+        tokens, required, rows, exact_only = self._entries[e]
+        if exact_only:
+            near = {t: [c for c in near.get(t, ()) if c[1] == 0] for t in tokens}
+        n_tokens = sum(1 for t in tokens if len(t) >= 2)
+        starts = sorted({pos for t in tokens for pos, _d in near.get(t, ())})
+        best = None
+        # thử lần lượt từng vị trí bắt đầu ("cho mình hỏi Minh Ngọc Hotel": "minh" xuất hiện 2 lần)
+        for start in starts:
+            # mỗi token khớp 1 vị trí riêng, đúng thứ tự trong tên ("bảo bảo" != "bao nhiêu")
+            edits, chars, matched, shorts, last, first = 0, 0, 0, 0, start - 1, None
+            for t in tokens:
+                if len(t) < 2:
+                    # token 1 ký tự của tên ("Pham's" -> "pham s", "Đông Á") chỉ tính khi câu hỏi có đúng
+                    # token đó ngay sau token vừa khớp; thiếu thì bỏ qua, không được chiếm chỗ của từ khác
+                    if first is not None and last + 1 < len(q_tokens) and q_tokens[last + 1] == t:
+                        shorts += 1
+                        chars += len(t)
+                        last += 1
+                    continue
+                cands = [c for c in near.get(t, ()) if c[0] > last]
+                if not cands:
+                    if t in required:
+                        break
+                    continue
+                pos, d = min(cands)
+                edits += d
+                chars += len(t)
+                matched += 1
+                first = pos if first is None else first
+                last = pos
+            else:
+                if first is None or edits > max_edits:
+                    continue
+                complete = matched == n_tokens
+                if not complete and (
+                    _distinct_chars(required) < NAME_FUZZY_MIN_DISTINCT_CHARS or 2 * matched < n_tokens
+                ):
+                    continue
+                # các token khớp phải liền nhau trong câu hỏi ("khách sạn phương đông" != "Khách Sạn Đông Á")
+                if last - first + 1 != matched + shorts:
+                    continue
+                score = chars - 2 * edits - (n_tokens - matched)
+                hit = NameHit(list(rows), tokens, edits, score, complete, first, last)
+                if best is None or (hit.score, -hit.edits) > (best.score, -best.edits):
+                    best = hit
+        return best
+
+    def lookup(self, query: str, max_edits: int = NAME_FUZZY_MAX_EDITS) -> Tuple[List[int], bool]:
+        """(row_ids, khớp đúng?) của các tên nhắc tới trong câu hỏi (nhiều tên khi so sánh).
+
+        Lấy tên điểm cao nhất trước, bỏ tên chồng vị trí lên tên đã lấy ("Hồng" trong "RedDoorz @ Le
+        Hong Phong Street"); tên cùng vị trí cùng điểm (gõ sai ra 2 tên) được giữ cả. Khớp đúng = mọi
+        tên đã lấy không lỗi, đủ token và phủ >= NAME_MIN_QUERY_COVERAGE phần riêng của câu hỏi ("khách sạn
+        gần chợ Bà Chiểu có hồ bơi rẻ" khớp tên "Bà Chiểu" vẫn là câu hỏi mô tả, không phải hỏi đúng tên).
+        max_edits <= 0 -> chỉ khớp đúng (match), vẫn xét độ phủ / "gần <tên>" như trên.
+        """
+        q_tokens = name_tokens(query)
+        if max_edits <= 0:
+            spans = self._match_spans(q_tokens)
+            out: List[int] = []
+            for _start, _end, rows in spans:
+                out.extend(r for r in rows if r not in out)
+            return out, bool(spans) and _confident(q_tokens, [(a, b) for a, b, _rows in spans])
+        taken: List[NameHit] = []
+        for h in self.search(query, max_edits):
+            clash = [t for t in taken if h.start <= t.end and t.start <= h.end]
+            if clash and not all((t.start, t.end, t.score) == (h.start, h.end, h.score) for t in clash):
+                continue
+            taken.append(h)
+        out = []
+        for h in sorted(taken, key=lambda h: h.start):
+            out.extend(r for r in h.row_ids if r not in out)
+        exact = bool(taken) and all(h.edits == 0 and h.complete for h in taken)
+        return out, exact and _confident(q_tokens, [(h.start, h.end) for h in taken])
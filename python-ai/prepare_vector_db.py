@@ -1,15 +1,42 @@
 import os
-import re
-import ast
 import json
-import unicodedata
-from typing import List, Optional, Dict, Any, Tuple
+import time
+import hashlib
+import argparse
+from typing import List, Optional, Dict, Any, Set, Tuple
 
+import numpy as np
 import pandas as pd
 
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.docstore.document import Document
-from langchain_community.vectorstores import FAISS
+
+from vector_index import (
+    INDEX_TYPES,
+    ExactTopK,
+    build_index,
+    choose_index_type,
+    new_index,
+    recall_report,
+    sample_queries,
+    training_rows,
+)
+from vector_store import CompactVectorStore
+from hotel_data import (
+    add_derived_columns,
+    apply_coords_overlay,
+    coarse_coords_mask,
+    coords_overlay_path,
+    derive_district_columns,
+    derive_price_columns,
+    derive_star,
+    missing_coords_mask,
+    normalize_text,
+    parse_list_value,
+    parse_price_range,
+    read_hotels_csv,
+)
+from build_pipeline import BuildPipeline, VectorCache, code_fingerprint, file_digest, json_artifact, texts_digest
 
 
 # =========================
@@ -22,6 +49,12 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 CSV_PATH = os.getenv("HOTEL_CSV_PATH") or os.path.join(CURRENT_DIR, "..", "backend", "src", "data", "hotels.csv")
 VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH") or os.path.join(CURRENT_DIR, "vectorstores", "db_faiss")
 
+# flat | ivf_flat | ivf_pq | hnsw | auto (chọn theo số khách sạn)
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "auto")
+
+# Cache artifact từng stage build (build_pipeline.py), xoá lúc nào cũng được
+BUILD_CACHE_DIR = os.getenv("BUILD_CACHE_DIR") or os.path.join(CURRENT_DIR, "vectorstores", "build_cache")
+
 
 def _detect_device() -> str:
     """Tự chọn device nếu có GPU, không có thì dùng CPU."""
@@ -51,116 +84,10 @@ def _to_int(value) -> Optional[int]:
         return None
 
 
-def _strip_accents(text: str) -> str:
-    if text is None:
-        return ""
-    text = str(text)
-    text = unicodedata.normalize("NFD", text)
-    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
-    return unicodedata.normalize("NFC", text)
-
-
-def _normalize_spaces(text: str) -> str:
-    return " ".join(str(text).split())
-
-
-def _normalize_text(text: str) -> str:
-    """Chuẩn hoá để phục vụ matching: lowercase + bỏ dấu + bỏ ký tự lạ."""
-    s = _strip_accents(str(text).lower())
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    return _normalize_spaces(s)
-
-
 # =========================
-# PRICE PARSING (NEW: support range like "490000 - 1150000")
+# PRICE FORMATTING (parse giá: hotel_data.derive_price_columns)
 # =========================
 
-def _parse_price_number(piece: str) -> Optional[int]:
-    """Parse 1 phần giá sang VND integer.
-
-    Hỗ trợ:
-    - "490000" / "1,150,000" / "1.150.000"
-    - "1.2 triệu", "800k" (phòng trường hợp data khác)
-    """
-    if piece is None:
-        return None
-    s = str(piece).strip().lower()
-    if not s or s in {"nan", "none"}:
-        return None
-
-    # normalize decimal separators
-    s = s.replace("₫", "").replace("vnd", "").strip()
-
-    # triệu / million
-    m = re.search(r"(\d+(?:[\.,]\d+)?)\s*(trieu|triệu|million|m)\b", s)
-    if m:
-        num = float(m.group(1).replace(",", "."))
-        return int(num * 1_000_000)
-
-    # nghìn / k
-    m = re.search(r"(\d+(?:[\.,]\d+)?)\s*(k|nghin|nghìn)\b", s)
-    if m:
-        num = float(m.group(1).replace(",", "."))
-        return int(num * 1_000)
-
-    # plain digits (remove separators)
-    digits = re.sub(r"[^0-9]", "", s)
-    if not digits:
-        return None
-    try:
-        return int(digits)
-    except Exception:
-        return None
-
-
-def _parse_price_range(value) -> Tuple[Optional[int], Optional[int], Optional[float]]:
-    """Parse cột price mới: "min - max".
-
-    Returns: (min_vnd, max_vnd, mid_vnd)
-    """
-    if value is None or (isinstance(value, float) and value != value) or pd.isna(value):
-        return None, None, None
-
-    # numeric already
-    if isinstance(value, (int, float)):
-        try:
-            v = float(value)
-            if v != v:
-                return None, None, None
-            iv = int(v)
-            return iv, iv, float(iv)
-        except Exception:
-            return None, None, None
-
-    s = str(value).strip()
-    if not s:
-        return None, None, None
-
-    # unify dash types
-    s = s.replace("–", "-").replace("—", "-")
-
-    # split on dash if looks like range
-    if "-" in s:
-        parts = [p.strip() for p in s.split("-") if p.strip()]
-        if len(parts) >= 2:
-            a = _parse_price_number(parts[0])
-            b = _parse_price_number(parts[1])
-            if a is None and b is None:
-                return None, None, None
-            if a is None:
-                return b, b, float(b)
-            if b is None:
-                return a, a, float(a)
-            lo, hi = (a, b) if a <= b else (b, a)
-            return lo, hi, (lo + hi) / 2.0
-
-    # fallback: single number
-    n = _parse_price_number(s)
-    if n is None:
-        return None, None, None
-    return n, n, float(n)
-
-
 def _format_price_range(min_vnd: Optional[int], max_vnd: Optional[int]) -> str:
     if min_vnd is None and max_vnd is None:
         return "Giá: chưa cập nhật."
@@ -173,46 +100,6 @@ def _format_price_range(min_vnd: Optional[int], max_vnd: Optional[int]) -> str:
     return f"Khoảng giá tham khảo: {min_vnd/1_000_000:.2f} – {max_vnd/1_000_000:.2f} triệu VND/đêm."
 
 
-def _extract_star(star_str) -> Optional[int]:
-    """VD: 'Khách sạn 4 sao' -> 4"""
-    if pd.isna(star_str):
-        return None
-    s = str(star_str).lower()
-    m = re.search(r"(\d+)\s*(sao|star)", s)
-    if m:
-        val = int(m.group(1))
-        return val if 1 <= val <= 5 else None
-    m2 = re.search(r"\b(\d)\b", s)
-    if m2:
-        val = int(m2.group(1))
-        return val if 1 <= val <= 5 else None
-    return None
-
-
-def _extract_district_num(district_raw: str) -> Optional[int]:
-    s = _normalize_text(district_raw)
-    m = re.search(r"(quan|district)\s*0?(\d+)", s)
-    if m:
-        return int(m.group(2))
-    m2 = re.match(r"^\s*(\d+)\s*(?:,|$)", _strip_accents(str(district_raw).lower()))
-    if m2:
-        return int(m2.group(1))
-    return None
-
-
-def _clean_list_str(list_str) -> str:
-    """Làm sạch chuỗi dạng list ['A', 'B'] thành 'A, B'"""
-    if pd.isna(list_str):
-        return ""
-    try:
-        actual_list = ast.literal_eval(list_str)
-        if isinstance(actual_list, list):
-            return ", ".join([str(x) for x in actual_list if x and str(x).strip()])
-    except Exception:
-        pass
-    return str(list_str).strip()
-
-
 def _calc_price_thresholds(prices_vnd: pd.Series) -> Dict[str, float]:
     """Tính ngưỡng giá theo phân phối dữ liệu (robust).
 
@@ -257,30 +144,77 @@ def _price_segment(price_mid_vnd: Optional[float], th: Dict[str, float]) -> Tupl
     return label, f"Giá giữa (ước tính): {m:.2f} triệu VND/đêm ({seg})."
 
 
-def _build_hotel_document(row: pd.Series, th: Dict[str, float]) -> Document:
-    hotel_name = str(row.get("hotelname", "")).strip()
-    address = str(row.get("address", "")).strip()
-    district_raw = str(row.get("district", "") or "")
-    district_short = district_raw.split(",")[0].strip() if district_raw else ""
-    district_num = _extract_district_num(district_raw)
-    district_norm = _normalize_text(district_short)
+# =========================
+# DERIVED COLUMNS (vectorized, theo cột)
+# =========================
+
+def _derive_price_label(mid: pd.Series, th: Dict[str, float]) -> pd.Series:
+    """Vectorized _price_segment (phần label)."""
+    conds = [mid.isna(), mid <= th["q25"], mid <= th["q75"], mid <= th["q90"]]
+    return pd.Series(np.select(conds, ["unknown", "cheap", "mid", "high"], default="lux"), index=mid.index)
+
+
+def _derive_hotel_columns(df: pd.DataFrame, th: Dict[str, float]) -> pd.DataFrame:
+    """Field dẫn xuất còn lại (giá / sao / quận / list đã có từ hotel_data.add_derived_columns),
+    trả DataFrame cùng index với df."""
+    out = pd.DataFrame(index=df.index)
+    out["_rating"] = pd.to_numeric(df.get("totalScore"), errors="coerce")
+    out["_reviews_count"] = pd.to_numeric(df.get("reviewsCount"), errors="coerce")
+    out["_price_label"] = _derive_price_label(df.get("_price_mid_vnd", pd.Series(np.nan, index=df.index)), th)
+    return out
+
+
+# =========================
+# DOCUMENT FORMATTING (per-row, chạy song song bằng process pool)
+# =========================
+
+# số process format document; 0/1 = chạy tuần tự
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(os.cpu_count() or 1)))
+# dưới ngưỡng này chi phí khởi động pool lớn hơn lợi ích
+PARALLEL_MIN_ROWS = int(os.getenv("INGEST_PARALLEL_MIN_ROWS", "5000"))
 
-    rating = _to_float(row.get("totalScore"))
-    reviews_count = _to_int(row.get("reviewsCount"))
-    star = _extract_star(row.get("star"))
+_RECORD_COLUMNS = [
+    "hotelname", "address", "_amenities_list", "_reviews_list", "description1", "lat", "lng", "url_google", "imageUrl",
+    "_district_short", "_district_num", "_district_norm", "_star", "_rating", "_reviews_count",
+    "_price_min_vnd", "_price_max_vnd", "_price_mid_vnd", "_price_label",
+]
 
-    price_min, price_max, price_mid = _parse_price_range(row.get("price"))
-    price_label, price_mid_text = _price_segment(price_mid, th)
+
+def _nan_to_none(v):
+    if v is None or v is pd.NA:
+        return None
+    if isinstance(v, float) and v != v:
+        return None
+    return v
+
+
+def _format_hotel_record(rec: Dict[str, Any], th: Dict[str, float]) -> Tuple[str, Dict[str, Any]]:
+    """Phần còn lại phải làm từng dòng: ghép text. Trả (page_content, metadata)."""
+    hotel_name = str(rec.get("hotelname") or "").strip()
+    address = str(rec.get("address") if rec.get("address") is not None else "").strip()
+    district_short = rec.get("_district_short") or ""
+    district_num = _to_int(rec.get("_district_num"))
+    district_norm = rec.get("_district_norm") or ""
+
+    rating = _to_float(rec.get("_rating"))
+    reviews_count = _to_int(rec.get("_reviews_count"))
+    star = _to_int(rec.get("_star"))
+
+    price_min = _to_int(rec.get("_price_min_vnd"))
+    price_max = _to_int(rec.get("_price_max_vnd"))
+    price_mid = _to_float(rec.get("_price_mid_vnd"))
+    price_label = rec.get("_price_label") or "unknown"
+    _label, price_mid_text = _price_segment(price_mid, th)
     price_range_text = _format_price_range(price_min, price_max)
 
-    amenities = _clean_list_str(row.get("amenities"))
-    reviews_list = _clean_list_str(row.get("reviews"))
-    description = str(row.get("description1", "") or "").replace("nan", "").strip()
+    amenities = ", ".join(rec.get("_amenities_list") or [])
+    reviews_list = ", ".join(rec.get("_reviews_list") or [])
+    description = str(rec.get("description1") or "").replace("nan", "").strip()
 
-    lat = _to_float(row.get("lat"))
-    lon = _to_float(row.get("lng"))
-    url = str(row.get("url_google", "") or "").strip()
-    image_url = str(row.get("imageUrl", "") or "").strip()
+    lat = _to_float(rec.get("lat"))
+    lon = _to_float(rec.get("lng"))
+    url = str(rec.get("url_google") or "").strip()
+    image_url = str(rec.get("imageUrl") or "").strip()
 
     # ====== PAGE CONTENT: ưu tiên cấu trúc rõ ràng + có "từ khoá" giúp truy hồi ======
     lines: List[str] = []
@@ -320,8 +254,9 @@ def _build_hotel_document(row: pd.Series, th: Dict[str, float]) -> Document:
         lines.append(f"Nhận xét khách: {short_reviews}")
 
     # Token hỗ trợ keyword search (accentless)
+    hotelname_norm = normalize_text(hotel_name)
     tokens: List[str] = []
-    tokens.append(f"hotelname_norm: {_normalize_text(hotel_name)}")
+    tokens.append(f"hotelname_norm: {hotelname_norm}")
     if district_norm:
         tokens.append(f"district_norm: {district_norm}")
     if district_num is not None:
@@ -337,7 +272,7 @@ def _build_hotel_document(row: pd.Series, th: Dict[str, float]) -> Document:
 
     metadata: Dict[str, Any] = {
         "hotelname": hotel_name,
-        "hotelname_norm": _normalize_text(hotel_name),
+        "hotelname_norm": hotelname_norm,
         "address": address,
         "district": district_short,
         "district_norm": district_norm,
@@ -360,68 +295,530 @@ def _build_hotel_document(row: pd.Series, th: Dict[str, float]) -> Document:
     if description and len(description) > 10:
         metadata["description"] = description
 
-    return Document(page_content="\n".join(lines), metadata=metadata)
+    return "\n".join(lines), metadata
+
+
+def _format_records_chunk(args: Tuple[List[Dict[str, Any]], Dict[str, float]]) -> List[Tuple[str, Dict[str, Any]]]:
+    records, th = args
+    return [_format_hotel_record(r, th) for r in records]
+
 
+def _hotel_records(df: pd.DataFrame, derived: pd.DataFrame) -> List[Dict[str, Any]]:
+    full = pd.concat([df.drop(columns=[c for c in derived.columns if c in df.columns]), derived], axis=1)
+    cols = [c for c in _RECORD_COLUMNS if c in full.columns]
+    sub = full[cols].astype(object)
+    sub = sub.where(sub.notna(), None)
+    return sub.to_dict("records")
 
-def create_db_from_csv(csv_path: str = CSV_PATH, vector_db_path: str = VECTOR_DB_PATH):
+
+def build_hotel_documents(df: pd.DataFrame, th: Dict[str, float], workers: Optional[int] = None) -> List[Document]:
+    """Field dẫn xuất tính theo cột, phần format text chia chunk cho process pool.
+
+    Thứ tự document giữ nguyên theo df (row i -> document i).
+    """
+    derived = _derive_hotel_columns(df, th)
+    records = _hotel_records(df, derived)
+
+    workers = INGEST_WORKERS if workers is None else workers
+    if workers <= 1 or len(records) < PARALLEL_MIN_ROWS:
+        formatted = _format_records_chunk((records, th))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunk = max(500, len(records) // (workers * 4))
+        chunks = [(records[i:i + chunk], th) for i in range(0, len(records), chunk)]
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            formatted = [item for part in ex.map(_format_records_chunk, chunks) for item in part]
+
+    return [Document(page_content=content, metadata=meta) for content, meta in formatted]
+
+
+def _load_embedding_model() -> HuggingFaceEmbeddings:
+    device = _detect_device()
+    print(f"Khởi tạo embedding model trên device: {device}")
+
+    return HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        model_kwargs={"device": device},
+        encode_kwargs={"normalize_embeddings": True},
+    )
+
+
+# =========================
+# MANIFEST (incremental update)
+# =========================
+
+# Key ổn định của khách sạn = query_place_id trong url_google (cột "key" của CompactVectorStore).
+# Vị trí vector trong FAISS không ổn định (IndexFlat.remove_ids dồn vị trí), nên manifest
+# lưu key -> hash nội dung + vector id tại thời điểm lưu, còn tra cứu luôn đi qua key.
+_PLACE_ID_RE = r"query_place_id=([^&#\s]+)"
+_IVF_TYPES = ("ivf_flat", "ivf_pq")
+
+
+def _base_hotel_keys(df: pd.DataFrame) -> pd.Series:
+    """Place id của Google Maps, thiếu thì hotelname|address đã chuẩn hoá (chưa xử lý trùng)."""
+    if "url_google" in df.columns:
+        keys = df["url_google"].astype("string").str.extract(_PLACE_ID_RE, expand=False)
+    else:
+        keys = pd.Series(pd.NA, index=df.index, dtype="string")
+
+    missing = keys.isna()
+    if missing.any():
+        sub = df.loc[missing]
+        address = sub["address"] if "address" in sub.columns else pd.Series("", index=sub.index)
+        # gán qua Series: gán list vào Series "string" toàn NA (chunk không có place id nào) lỗi ở pandas
+        keys[missing] = pd.Series([
+            f"name:{normalize_text(n)}|{normalize_text(a) if a is not None and not pd.isna(a) else ''}"
+            for n, a in zip(sub["hotelname"], address)
+        ], index=sub.index, dtype="string")
+    return keys
+
+
+def _hotel_keys(
+    df: pd.DataFrame,
+    duplicated: Optional[Set[str]] = None,
+    seen: Optional[Dict[str, int]] = None,
+) -> List[str]:
+    """Key ổn định mỗi dòng, không phụ thuộc thứ tự dòng trong CSV.
+
+    Key gốc (_base_hotel_keys) trùng nhau (VD: cùng tên + địa chỉ) -> mọi dòng trùng thêm hậu tố
+    @lat,lng (toạ độ thật, không lấy toạ độ tâm quận), thiếu toạ độ thì @digest nội dung dòng.
+    Chỉ các dòng giống nhau cả tên, địa chỉ lẫn toạ độ / nội dung mới còn đánh #n theo thứ tự.
+
+    duplicated: key gốc trùng trong toàn CSV (ingest streaming đếm ở pass 1); None -> tính trên df.
+    seen: số lần đã gặp mỗi key ở các chunk trước (ingest streaming), cập nhật tại chỗ.
+    """
+    base = _base_hotel_keys(df)
+    if duplicated is None:
+        duplicated = set(base[base.duplicated(keep=False)].tolist())
+    keys = base.tolist()
+
+    dup = base.isin(duplicated).to_numpy()
+    if dup.any():
+        sub = df.loc[dup]
+        has_xy = ~(missing_coords_mask(sub) | coarse_coords_mask(sub))
+        raw = sub[[c for c in sub.columns if not str(c).startswith("_")]].astype("string").fillna("")
+        for pos, (rid, row) in zip(np.flatnonzero(dup), raw.iterrows()):
+            if has_xy[rid]:
+                suffix = f"{float(sub.at[rid, 'lat']):.5f},{float(sub.at[rid, 'lng']):.5f}"
+            else:
+                suffix = hashlib.sha1("\x1f".join(row.tolist()).encode("utf-8")).hexdigest()[:12]
+            keys[pos] = f"{keys[pos]}@{suffix}"
+
+    seen = {} if seen is None else seen
+    out: List[str] = []
+    for key in keys:
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        out.append(key if n == 0 else f"{key}#{n}")
+    return out
+
+
+def _document_hash(doc: Document) -> str:
+    payload = doc.page_content + "\n" + json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1((MODEL_NAME + "\n" + payload).encode("utf-8")).hexdigest()
+
+
+def _build_manifest(store: CompactVectorStore, hashes: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    label_of = store.key_to_label()
+    return {key: {"hash": h, "vector_id": label_of[key]} for key, h in hashes.items()}
+
+
+def _read_hotels_csv(csv_path: str) -> pd.DataFrame:
+    # dtype khai báo sẵn + giá / sao / quận / list parse 1 lần theo cột (hotel_data.py)
+    # toạ độ thiếu lấy từ file phủ của bulk_geocode.py (<csv>.coords.csv) nếu có
+    df = apply_coords_overlay(read_hotels_csv(csv_path), coords_overlay_path(csv_path))
+    return add_derived_columns(df[df["hotelname"].notna()].reset_index(drop=True))
+
+
+def _embedding_model_id(embedding_model) -> str:
+    return str(getattr(embedding_model, "model_name", None) or type(embedding_model).__name__)
+
+
+def _index_artifact() -> Tuple[Any, Any]:
+    import faiss
+
+    save_meta, load_meta = json_artifact("index_meta.json")
+
+    def save(value, directory: str) -> None:
+        index, params, report = value
+        faiss.write_index(index, os.path.join(directory, "index.faiss"))
+        save_meta({"params": params, "report": report}, directory)
+
+    def load(directory: str):
+        meta = load_meta(directory)
+        return faiss.read_index(os.path.join(directory, "index.faiss")), meta["params"], meta["report"]
+
+    return save, load
+
+
+def create_db_from_csv(
+    csv_path: str = CSV_PATH,
+    vector_db_path: str = VECTOR_DB_PATH,
+    embedding_model=None,
+    index_type: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+):
     """Build FAISS vector DB + lưu metadata ngưỡng giá để chatbot hiểu "giá rẻ" theo dữ liệu.
 
     NEW: hỗ trợ cột price dạng range "min - max".
     Ngưỡng giá được tính trên "giá giữa" (mid) để ổn định.
+    embedding_model: truyền Embeddings khác (VD: benchmark offline), mặc định HuggingFaceEmbeddings(MODEL_NAME).
+    index_type: flat | ivf_flat | ivf_pq | hnsw | auto (mặc định VECTOR_INDEX_TYPE).
+    Tham số train + knob query được ghi vào db_meta.json, báo cáo recall so với index chính xác
+    được ghi vào recall_report.json. db_meta.json còn có "manifest" (key -> hash, vector id)
+    để update_db_from_csv chỉ embed phần thay đổi.
+    cache_dir: cache artifact từng stage theo nội dung (build_pipeline.py). Chạy lại khi chỉ đổi
+    ngưỡng giá thì chỉ embed lại document có text thay đổi; đổi template thì embed lại toàn bộ.
     """
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"Không tìm thấy file CSV: {csv_path}")
 
-    df = pd.read_csv(csv_path)
-    df = df[df["hotelname"].notna()].reset_index(drop=True)
+    pipe = BuildPipeline(cache_dir, label="prepare_vector_db")
+    overlay = coords_overlay_path(csv_path)
+    with pipe.timed("hash_csv"):
+        csv_key = {
+            "csv": file_digest(csv_path),
+            "coords": file_digest(overlay) if os.path.exists(overlay) else None,
+            "parse": code_fingerprint(
+                _read_hotels_csv, read_hotels_csv, add_derived_columns, derive_price_columns, parse_price_range,
+                apply_coords_overlay,
+            ),
+        }
+
+    # chỉ parse CSV khi có stage phía sau cần build lại
+    parsed: Dict[str, pd.DataFrame] = {}
+
+    def _df() -> pd.DataFrame:
+        if "df" not in parsed:
+            with pipe.timed("parse_csv"):
+                parsed["df"] = _read_hotels_csv(csv_path)
+        return parsed["df"]
 
-    # Parse range price into dedicated columns
-    mins, maxs, mids = [], [], []
-    for v in df.get("price", pd.Series([None] * len(df))):
-        lo, hi, mid = _parse_price_range(v)
-        mins.append(lo)
-        maxs.append(hi)
-        mids.append(mid)
-    df["_price_min_vnd"] = mins
-    df["_price_max_vnd"] = maxs
-    df["_price_mid_vnd"] = mids
+    thresholds = pipe.cached(
+        "price_thresholds",
+        {**csv_key, "fn": code_fingerprint(_calc_price_thresholds)},
+        lambda: _calc_price_thresholds(_df().get("_price_mid_vnd")),
+        *json_artifact("thresholds.json"),
+    )
+
+    def _build_documents() -> Dict[str, List[str]]:
+        df = _df()
+        documents = build_hotel_documents(df, thresholds)
+        return {
+            "keys": _hotel_keys(df),
+            "hotelnames": [d.metadata["hotelname"] for d in documents],
+            "texts": [d.page_content for d in documents],
+            "hashes": [_document_hash(d) for d in documents],
+        }
+
+    # mọi hàm góp vào page_content / metadata: sửa bất kỳ hàm nào -> documents + embedding build lại
+    template = code_fingerprint(
+        _derive_hotel_columns, derive_star, derive_district_columns, parse_list_value, _derive_price_label,
+        _hotel_records, _format_hotel_record, _base_hotel_keys, _hotel_keys, _document_hash,
+        build_hotel_documents, _format_records_chunk, _to_float, _to_int, _format_price_range, _price_segment,
+        normalize_text,
+    )
+    docs = pipe.cached(
+        "documents",
+        {**csv_key, "thresholds": thresholds, "template": template, "model": MODEL_NAME},
+        _build_documents,
+        *json_artifact("documents.json"),
+    )
+
+    # Mỗi khách sạn = 1 document (tránh split để mapping hotelname ổn định)
+    model_id = _embedding_model_id(embedding_model) if embedding_model is not None else MODEL_NAME
+
+    def _embed(texts: List[str]):
+        nonlocal embedding_model
+        if embedding_model is None:
+            embedding_model = _load_embedding_model()
+        return embedding_model.embed_documents(texts)
+
+    with pipe.timed("embeddings") as row:
+        vectors, n_new = VectorCache(cache_dir, model_id).embed(docs["texts"], _embed)
+        row.update(status="built" if n_new else "cached", embedded=n_new, reused=len(vectors) - n_new)
+
+    if embedding_model is None:
+        # mọi embedding lấy từ cache -> chưa load model, store trả về vẫn cần model để embed query
+        embedding_model = _load_embedding_model()
+
+    chosen = choose_index_type(len(vectors), index_type or VECTOR_INDEX_TYPE)
+
+    def _build_index():
+        index, params = build_index(vectors, chosen)
+        print(f"Đã build FAISS index: {params['type']} ({len(vectors)} vectors, {params['build_seconds']}s)")
+        return index, params, recall_report(index, vectors, params)
+
+    index, index_params, report = pipe.cached(
+        "index",
+        {
+            "vectors": texts_digest(docs["texts"]),
+            "model": model_id,
+            "type": chosen,
+            "code": code_fingerprint(new_index, build_index, training_rows, recall_report, sample_queries),
+        },
+        _build_index,
+        *_index_artifact(),
+    )
 
-    thresholds = _calc_price_thresholds(df.get("_price_mid_vnd"))
+    store = CompactVectorStore.from_rows(index, docs["keys"], docs["hotelnames"], embedding_model)
+    with pipe.timed("write_db"):
+        _save_vector_db(
+            store, vector_db_path, report, index_params, thresholds, len(docs["keys"]),
+            dict(zip(docs["keys"], docs["hashes"])),
+        )
+    pipe.print_report()
+    return store
+
+
+def _save_vector_db(
+    store: CompactVectorStore,
+    vector_db_path: str,
+    report: Dict[str, Any],
+    index_params: Dict[str, Any],
+    thresholds: Dict[str, float],
+    rows: int,
+    hashes: Dict[str, str],
+) -> None:
+    # recall report cũng chọn nprobe / efSearch mặc định (nhỏ nhất đạt TARGET_RECALL) trước khi lưu
+    for knob in ("nprobe", "ef_search"):
+        if knob in report["recommended"]:
+            index_params[knob] = report["recommended"][knob]
+            index_params["recall_at_k"] = report["recommended"]["recall_at_k"]
+            index_params["target_recall"] = report["target_recall"]
+    store.save(vector_db_path)
+
+    with open(os.path.join(vector_db_path, "recall_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    _print_recall_report(report)
 
-    os.makedirs(os.path.dirname(vector_db_path), exist_ok=True)
     meta_path = os.path.join(vector_db_path, "db_meta.json")
-    os.makedirs(vector_db_path, exist_ok=True)
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump(
             {
                 "embedding_model": MODEL_NAME,
                 "price_thresholds": thresholds,
                 "price_representation": "mid_of_range",
-                "rows": int(len(df)),
+                "rows": int(rows),
+                "index": index_params,
+                "manifest": _build_manifest(store, hashes),
             },
             f,
             ensure_ascii=False,
             indent=2,
         )
 
-    device = _detect_device()
-    print(f"Khởi tạo embedding model trên device: {device}")
+    print(f"Đã build và lưu vector DB tại: {vector_db_path}")
+    print(f"Đã lưu metadata tại: {meta_path}")
 
-    embedding_model = HuggingFaceEmbeddings(
-        model_name=MODEL_NAME,
-        model_kwargs={"device": device},
-        encode_kwargs={"normalize_embeddings": True},
+
+# =========================
+# STREAMING INGEST
+# =========================
+
+# Số dòng CSV mỗi chunk khi ingest streaming (raw rows + text + embedding chỉ giữ trong 1 chunk)
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "20000"))
+
+
+def _iter_hotel_chunks(csv_path: str, chunksize: int, usecols=None):
+    overlay = coords_overlay_path(csv_path)
+    for chunk in read_hotels_csv(csv_path, usecols=usecols, chunksize=chunksize):
+        if "lat" in chunk.columns and "lng" in chunk.columns:
+            chunk = apply_coords_overlay(chunk, overlay)
+        chunk = chunk[chunk["hotelname"].notna()].reset_index(drop=True)
+        if len(chunk):
+            yield add_derived_columns(chunk)
+
+
+def _scan_price_thresholds(csv_path: str, chunksize: int) -> Tuple[Dict[str, float], int, Set[str]]:
+    """Pass 1 (rẻ): chỉ đọc hotelname + price + cột key để đếm dòng, tính ngưỡng giá và tìm key gốc trùng."""
+    mids: List[np.ndarray] = []
+    rows = 0
+    seen: Set[str] = set()
+    duplicated: Set[str] = set()
+    for chunk in _iter_hotel_chunks(csv_path, chunksize, usecols=lambda c: c in ("hotelname", "price", "address", "url_google")):
+        rows += len(chunk)
+        mids.append(chunk["_price_mid_vnd"].to_numpy(dtype=np.float64))
+        for key in _base_hotel_keys(chunk).tolist():
+            if key in seen:
+                duplicated.add(key)
+            seen.add(key)
+    mid = pd.Series(np.concatenate(mids) if mids else np.empty(0))
+    return _calc_price_thresholds(mid), rows, duplicated
+
+
+def create_db_streaming(
+    csv_path: str = CSV_PATH,
+    vector_db_path: str = VECTOR_DB_PATH,
+    embedding_model=None,
+    index_type: Optional[str] = None,
+    chunksize: Optional[int] = None,
+):
+    """Như create_db_from_csv nhưng đọc CSV theo chunk: build document + embed + add vào index
+    từng chunk, không giữ toàn bộ raw rows / embeddings trong RAM.
+
+    - Pass 1 chỉ đọc cột price để tính ngưỡng giá + đếm dòng (chọn loại index, nlist).
+    - IVF: gom vector các chunk đầu đến khi đủ training_rows thì train rồi add dần.
+    - Recall report dùng ground truth tính dần theo chunk (ExactTopK), query lấy từ chunk đầu.
+    Sau mỗi chunk chỉ còn giữ key + hotelname (bảng phụ của CompactVectorStore) và hash cho manifest.
+    """
+    chunksize = int(chunksize or INGEST_CHUNK_ROWS)
+    t0 = time.perf_counter()
+    thresholds, n_rows, duplicated = _scan_price_thresholds(csv_path, chunksize)
+    if n_rows == 0:
+        raise ValueError(f"CSV không có khách sạn nào: {csv_path}")
+    print(f"Pass 1: {n_rows} khách sạn, ngưỡng giá {thresholds} ({time.perf_counter() - t0:.2f}s)")
+
+    if embedding_model is None:
+        embedding_model = _load_embedding_model()
+    chosen = choose_index_type(n_rows, index_type or VECTOR_INDEX_TYPE)
+
+    index = index_params = exact = None
+    all_keys: List[str] = []
+    all_names: List[str] = []
+    hashes: Dict[str, str] = {}
+    seen: Dict[str, int] = {}
+    pending: List[np.ndarray] = []
+    added = 0
+
+    for chunk in _iter_hotel_chunks(csv_path, chunksize):
+        documents = build_hotel_documents(chunk, thresholds)
+        keys = _hotel_keys(chunk, duplicated, seen)
+        vectors = np.asarray(embedding_model.embed_documents([d.page_content for d in documents]), dtype=np.float32)
+
+        if index is None:
+            index, index_params = new_index(chosen, vectors.shape[1], n_rows)
+            exact = ExactTopK(sample_queries(vectors), k=min(10, n_rows))
+        exact.add(vectors, added)
+
+        all_keys.extend(keys)
+        all_names.extend(d.metadata["hotelname"] for d in documents)
+        hashes.update((k, _document_hash(d)) for k, d in zip(keys, documents))
+        added += len(keys)
+
+        if not index.is_trained:
+            pending.append(vectors)
+            if sum(len(v) for v in pending) < training_rows(index_params):
+                continue
+            vectors = np.concatenate(pending)
+            pending = []
+            index.train(vectors)
+            index_params["trained_on"] = int(len(vectors))
+        index.add(vectors)
+        print(f"  đã ingest {added}/{n_rows} khách sạn ({time.perf_counter() - t0:.1f}s)")
+
+    if pending:
+        # CSV hết trước khi đủ training_rows -> train trên toàn bộ phần đã gom
+        vectors = np.concatenate(pending)
+        index.train(vectors)
+        index_params["trained_on"] = int(len(vectors))
+        index.add(vectors)
+
+    index_params["build_seconds"] = round(time.perf_counter() - t0, 3)
+    index_params["chunk_rows"] = chunksize
+    print(f"Đã build FAISS index: {index_params['type']} ({added} vectors, {index_params['build_seconds']}s)")
+
+    store = CompactVectorStore.from_rows(index, all_keys, all_names, embedding_model)
+    report = recall_report(index, None, index_params, exact=exact)
+    _save_vector_db(store, vector_db_path, report, index_params, thresholds, added, hashes)
+    return store
+
+
+def update_db_from_csv(
+    csv_path: str = CSV_PATH,
+    vector_db_path: str = VECTOR_DB_PATH,
+    embedding_model=None,
+) -> Dict[str, Any]:
+    """Cập nhật vector DB đã build theo hotels.csv mới: chỉ embed khách sạn thêm mới / thay đổi,
+    xoá khách sạn không còn trong CSV, giữ nguyên phần còn lại.
+
+    Ngưỡng giá lấy lại từ db_meta.json (không tính lại) để nhãn giá của khách sạn cũ không
+    đổi theo; cần tính lại ngưỡng / đổi model / đổi loại index thì chạy build đầy đủ.
+    Index IVF giữ centroid đã train; HNSW phải build lại đồ thị khi có xoá / sửa (xem CompactVectorStore.remove).
+    """
+    t0 = time.perf_counter()
+    meta_path = os.path.join(vector_db_path, "db_meta.json")
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(f"Chưa có vector DB tại {vector_db_path}, hãy build đầy đủ trước")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    manifest: Dict[str, Dict[str, Any]] = meta.get("manifest") or {}
+    if not manifest or not CompactVectorStore.exists(vector_db_path):
+        raise ValueError("DB build bằng bản cũ (thiếu manifest / bảng phụ rows/), hãy build đầy đủ lại")
+    if meta.get("embedding_model") != MODEL_NAME:
+        raise ValueError(f"DB dùng model {meta.get('embedding_model')} khác {MODEL_NAME}, hãy build đầy đủ lại")
+
+    df = _read_hotels_csv(csv_path)
+    thresholds = meta.get("price_thresholds") or _calc_price_thresholds(df.get("_price_mid_vnd"))
+    documents = build_hotel_documents(df, thresholds)
+    keys = _hotel_keys(df)
+    hashes = {k: _document_hash(d) for k, d in zip(keys, documents)}
+
+    upsert = [i for i, k in enumerate(keys) if manifest.get(k, {}).get("hash") != hashes[k]]
+    changed = [keys[i] for i in upsert if keys[i] in manifest]
+    removed = [k for k in manifest if k not in hashes]
+    stats = {"added": len(upsert) - len(changed), "changed": len(changed), "removed": len(removed), "unchanged": len(keys) - len(upsert)}
+
+    if upsert or removed:
+        if embedding_model is None:
+            embedding_model = _load_embedding_model()
+        index_params = meta.get("index") or {"type": "flat"}
+        store = CompactVectorStore.load(vector_db_path, embedding_model, mmap=False)
+
+        new_docs = [documents[i] for i in upsert]
+        vectors = np.asarray(embedding_model.embed_documents([d.page_content for d in new_docs]), dtype=np.float32)
+        store.remove(changed + removed, index_params)
+        store.add(vectors, [keys[i] for i in upsert], [d.metadata["hotelname"] for d in new_docs], index_params)
+        store.save(vector_db_path)
+
+        meta["rows"] = int(len(df))
+        meta["manifest"] = _build_manifest(store, hashes)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    stats["seconds"] = round(time.perf_counter() - t0, 3)
+    print(
+        f"Update vector DB: +{stats['added']} thêm, ~{stats['changed']} sửa, -{stats['removed']} xoá, "
+        f"{stats['unchanged']} giữ nguyên ({stats['seconds']}s)"
     )
+    return stats
 
-    documents: List[Document] = [_build_hotel_document(row, thresholds) for _, row in df.iterrows()]
 
-    # Mỗi khách sạn = 1 document (tránh split để mapping hotelname ổn định)
-    db = FAISS.from_documents(documents, embedding_model)
-    db.save_local(vector_db_path)
-    print(f"Đã build và lưu vector DB tại: {vector_db_path}")
-    print(f"Đã lưu metadata tại: {meta_path}")
-    return db
+def _print_recall_report(report: Dict[str, Any]) -> None:
+    print(f"Recall@{report['k']} so với IndexFlatL2 ({report['queries']} query, exact {report['exact_ms_per_query']} ms/query):")
+    for row in report["settings"]:
+        knob = ", ".join(f"{k}={v}" for k, v in row.items() if k not in ("recall_at_k", "ms_per_query"))
+        print(f"  {knob or report['index']}: recall={row['recall_at_k']:.3f}  {row['ms_per_query']} ms/query")
+    if report.get("recommended"):
+        print(f"  -> mặc định: {report['recommended']}")
 
 
 if __name__ == "__main__":
-    create_db_from_csv()
+    parser = argparse.ArgumentParser(description="Build FAISS vector DB từ hotels.csv")
+    parser.add_argument("--csv", type=str, default=CSV_PATH)
+    parser.add_argument("--out", type=str, default=VECTOR_DB_PATH)
+    parser.add_argument("--index-type", type=str, default=VECTOR_INDEX_TYPE, choices=INDEX_TYPES)
+    parser.add_argument("--update", action="store_true", help="Chỉ embed khách sạn thêm mới / thay đổi, xoá khách sạn đã bỏ")
+    parser.add_argument("--stream", action="store_true", help="Đọc CSV theo chunk, RAM không tăng theo kích thước catalog")
+    parser.add_argument("--chunk-rows", type=int, default=INGEST_CHUNK_ROWS)
+    parser.add_argument("--cache-dir", type=str, default=BUILD_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="Build lại mọi stage, không đọc / ghi cache")
+    parser.add_argument("--geocode", action="store_true", help="Geocode khách sạn thiếu toạ độ trước khi build (bulk_geocode.py)")
+    args = parser.parse_args()
+
+    if args.geocode:
+        from bulk_geocode import bulk_geocode
+
+        geo_stats = bulk_geocode(args.csv)
+        print(
+            f"Geocode: {geo_stats['resolved']} tìm thấy, {geo_stats['not_found']} không tìm thấy, "
+            f"{geo_stats['errors']} lỗi / {geo_stats['todo']} cần geocode ({geo_stats['seconds']}s)"
+        )
+
+    if args.update:
+        update_db_from_csv(args.csv, args.out)
+    elif args.stream:
+        create_db_streaming(args.csv, args.out, index_type=args.index_type, chunksize=args.chunk_rows)
+    else:
+        create_db_from_csv(args.csv, args.out, index_type=args.index_type, cache_dir=None if args.no_cache else args.cache_dir)
@@ -3,7 +3,7 @@ import re
 import json
 import unicodedata
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 
 from dotenv import load_dotenv
 
@@ -14,7 +14,6 @@ import numpy as np
 import pandas as pd
 
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
@@ -22,6 +21,16 @@ from langchain_core.output_parsers import StrOutputParser
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 
+from metrics import stage, observe_size, inc_cache
+from vector_index import apply_query_params
+from vector_store import CompactVectorStore
+from hotel_data import load_hotels, parse_list_value
+from geo_index import GEO_DEFAULT_RADIUS_KM, GeoIndex, PoiTable, find_landmark
+from name_index import NameIndex
+from suggest_index import SuggestIndex
+from retrieval_plan import ColumnStats, RetrievalPlan, log_plan, plan_retrieval
+from result_cursor import CursorCache
+
 
 # =========================
 # CONFIG
@@ -39,10 +48,22 @@ GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash-lite")
 W_VEC = float(os.getenv("W_VEC", "0.50"))
 W_LEX = float(os.getenv("W_LEX", "0.35"))
 W_QUAL = float(os.getenv("W_QUAL", "0.15"))
+# cộng thêm cho khách sạn khớp gần đúng tên trong câu hỏi (NameIndex.lookup, exact=False)
+W_NAME = float(os.getenv("W_NAME", "0.25"))
 
 # ✅ mặc định 10
 DEFAULT_TOP_K = int(os.getenv("DEFAULT_TOP_K", "10"))
 
+# phân trang chat: số kết quả tối đa giữ sau cursor cho 1 lần tìm (0 = tắt "xem thêm")
+RESULT_CURSOR_DEPTH = int(os.getenv("RESULT_CURSOR_DEPTH", "100"))
+
+# câu hỏi chứa trọn tên khách sạn -> trả luôn, không chạy encoder / FAISS / TF-IDF (0 = tắt)
+NAME_FAST_PATH = os.getenv("NAME_FAST_PATH", "1") != "0"
+
+
+# danh sách kết quả đầy đủ của các lần tìm gần đây, trang sau đọc qua cursor (result_cursor.py)
+RESULT_CURSORS = CursorCache()
+
 
 # =========================
 # TEXT NORMALIZATION
@@ -64,14 +85,6 @@ def _norm_text(text: str) -> str:
     return s
 
 
-def _extract_star_from_row(star_val) -> Optional[int]:
-    if pd.isna(star_val):
-        return None
-    s = str(star_val).lower()
-    m = re.search(r"(\d+)", s)
-    return int(m.group(1)) if m else None
-
-
 def _extract_district_num(district_str) -> Optional[int]:
     """VD: 'Quận 5, ...' -> 5; 'District 1' -> 1; 'Bình Tân' -> None"""
     if pd.isna(district_str):
@@ -95,80 +108,6 @@ def _district_norm(district_str) -> str:
     return s
 
 
-# =========================
-# PRICE PARSING (support range: "490000 - 1150000")
-# =========================
-
-def _parse_price_number(piece: str) -> Optional[int]:
-    """Parse 1 phần giá sang VND integer."""
-    if piece is None:
-        return None
-    s = str(piece).strip().lower()
-    if not s or s in {"nan", "none"}:
-        return None
-
-    s = s.replace("₫", "").replace("vnd", "").strip()
-
-    m = re.search(r"(\d+(?:[\.,]\d+)?)\s*(trieu|triệu|million|m|tr)\b", s)
-    if m:
-        num = float(m.group(1).replace(",", "."))
-        return int(num * 1_000_000)
-
-    m = re.search(r"(\d+(?:[\.,]\d+)?)\s*(k|nghin|nghìn)\b", s)
-    if m:
-        num = float(m.group(1).replace(",", "."))
-        return int(num * 1_000)
-
-    digits = re.sub(r"[^0-9]", "", s)
-    if not digits:
-        return None
-    try:
-        return int(digits)
-    except Exception:
-        return None
-
-
-def _parse_price_range(value) -> Tuple[Optional[int], Optional[int], Optional[float]]:
-    """Parse cột price mới: "min - max". Returns: (min_vnd, max_vnd, mid_vnd)"""
-    if value is None or (isinstance(value, float) and value != value) or pd.isna(value):
-        return None, None, None
-
-    if isinstance(value, (int, float)):
-        try:
-            v = float(value)
-            if v != v:
-                return None, None, None
-            iv = int(v)
-            return iv, iv, float(iv)
-        except Exception:
-            return None, None, None
-
-    s = str(value).strip()
-    if not s:
-        return None, None, None
-
-    s = s.replace("–", "-").replace("—", "-")
-
-    if "-" in s:
-        parts = [p.strip() for p in s.split("-") if p.strip()]
-        if len(parts) >= 2:
-            a = _parse_price_number(parts[0])
-            b = _parse_price_number(parts[1])
-            if a is None and b is None:
-                return None, None, None
-            if a is None:
-                return b, b, float(b)
-            if b is None:
-                return a, a, float(a)
-            lo, hi = (a, b) if a <= b else (b, a)
-            return lo, hi, (lo + hi) / 2.0
-
-    n = _parse_price_number(s)
-    if n is None:
-        return None, None, None
-    return n, n, float(n)
-
-
 def _format_vnd_int(v: Optional[int]) -> str:
     if v is None:
         return ""
@@ -260,31 +199,12 @@ def _short_list_text(s: Any, max_items: int = 4) -> str:
     return ", ".join(parts[:max_items]) + ("" if len(parts) <= max_items else ", ...")
 
 
-def _district_num_from_hotel(h: Dict[str, Any]) -> Optional[int]:
-    if h.get("district_num") is not None:
-        try:
-            return int(h["district_num"])
-        except Exception:
-            pass
-    return _extract_district_num(h.get("district", ""))
-
-
 def _nearby_attractions(h: Dict[str, Any]) -> str:
-    # Nếu data có field gần đó thì ưu tiên
+    # "nearby" tra sẵn lúc load (PoiTable, cột _nearby): địa danh gần nhất + khoảng cách thật
     for k in ["nearby", "nearby_attractions", "attractions", "landmarks", "places_nearby"]:
         if h.get(k):
             return _short_list_text(h.get(k), 4)
-
-    d = _district_num_from_hotel(h)
-    fallback = {
-        1: "Chợ Bến Thành, Phố đi bộ Nguyễn Huệ, Nhà thờ Đức Bà, Bưu điện TP",
-        3: "Bảo tàng Chứng tích Chiến tranh, Hồ Con Rùa, Nhà thờ Tân Định, Công viên Lê Văn Tám",
-        5: "Chợ Lớn, Chùa Bà Thiên Hậu, Phố người Hoa, An Đông Plaza",
-        7: "Crescent Mall, Cầu Ánh Sao, Hồ Bán Nguyệt, SC VivoCity",
-        10: "Kỳ Hòa, Việt Nam Quốc Tự, Vạn Hạnh Mall",
-        2: "Thảo Điền, Landmark 81 (gần), Khu bờ sông (tuỳ vị trí)",
-    }
-    return fallback.get(d, "Các điểm tham quan trung tâm (tuỳ vị trí)")
+    return "—"
 
 
 def _hotel_price_mid_for_rank(h: Dict[str, Any]) -> Optional[int]:
@@ -402,6 +322,11 @@ def _merge_constraints_memory(base: Dict[str, Any], new: Dict[str, Any]) -> Dict
         out["district_names"] = new["district_names"]
         out["district_nums"] = None
 
+    # vị trí override nếu message mới nhắc địa điểm
+    if new.get("near_lat") is not None and new.get("near_lon") is not None:
+        for k in ("near_lat", "near_lon", "near_name", "radius_km"):
+            out[k] = new.get(k)
+
     # amenities union
     if new.get("amenities_any"):
         old = out.get("amenities_any") or []
@@ -428,6 +353,11 @@ def _constraints_from_history(history: Optional[List[Dict[str, Any]]], thr: Opti
         "explicit_price": False,
         "require_price": False,
         "amenities_any": [],
+        "near_lat": None,
+        "near_lon": None,
+        "near_name": None,
+        "radius_km": None,
+        "bbox": None,
     }
 
     for t in _history_user_texts(history, limit=6):
@@ -457,24 +387,17 @@ def _summarize_constraints(cons: Dict[str, Any]) -> str:
         else:
             bits.append(f"dưới {mx_txt} VND")
 
+    if cons.get("near_lat") is not None and cons.get("radius_km"):
+        where = cons.get("near_name") or "vị trí đã chọn"
+        bits.append(f"Trong {cons['radius_km']:g} km quanh {where}")
+    elif cons.get("bbox"):
+        bits.append("Trong khung bản đồ")
+
     if cons.get("amenities_any"):
-        # hiển thị đẹp
-        pretty_map = {
-            "ho boi": "Hồ bơi",
-            "pool": "Hồ bơi",
-            "wifi": "Wi-Fi",
-            "an sang": "Bữa sáng",
-            "breakfast": "Bữa sáng",
-            "gym": "Gym",
-            "phong tap": "Gym",
-            "spa": "Spa",
-            "parking": "Đậu xe",
-            "dau xe": "Đậu xe",
-        }
         shown = []
         for a in cons["amenities_any"][:3]:
             key = _norm_text(a)
-            shown.append(pretty_map.get(key, a))
+            shown.append(AMENITY_LABELS.get(key, a))
         bits.append("Tiện ích: " + ", ".join(shown))
 
     if cons.get("min_rating") is not None:
@@ -490,6 +413,30 @@ def _summarize_constraints(cons: Dict[str, Any]) -> str:
 # QUERY -> CONSTRAINTS (price + district + amenities)
 # =========================
 
+# tiện ích -> từ khoá nhận ra trong câu hỏi (cũng dùng làm gợi ý ở /api/suggest)
+AMENITY_KEYWORDS: Dict[str, List[str]] = {
+    "ho boi": ["ho boi", "pool", "bể bơi", "be boi"],
+    "wifi": ["wifi", "wi fi", "internet"],
+    "an sang": ["an sang", "bua sang", "breakfast"],
+    "gym": ["gym", "phong tap", "phong gym", "fitness"],
+    "spa": ["spa", "massage"],
+    "parking": ["dau xe", "parking", "giu xe", "bai do xe"],
+}
+
+# hiển thị đẹp
+AMENITY_LABELS = {
+    "ho boi": "Hồ bơi",
+    "pool": "Hồ bơi",
+    "wifi": "Wi-Fi",
+    "an sang": "Bữa sáng",
+    "breakfast": "Bữa sáng",
+    "gym": "Gym",
+    "phong tap": "Gym",
+    "spa": "Spa",
+    "parking": "Đậu xe",
+    "dau xe": "Đậu xe",
+}
+
 def _parse_price_intent_from_query(q_norm: str, thr: Optional[PriceThresholds]) -> Tuple[Optional[int], Optional[int], bool, bool, Optional[str]]:
     """
     Return: (min_price, max_price, explicit_price, require_price, sort_by)
@@ -544,17 +491,8 @@ def _parse_amenities_from_query(q_norm: str) -> List[str]:
     # nếu phủ định mạnh thì bỏ (đơn giản)
     neg = any(x in q_norm for x in ["khong can", "khong muon", "loai bo", "bo ", "khong thich", "khong co"])
 
-    mapping = {
-        "ho boi": ["ho boi", "pool", "bể bơi", "be boi"],
-        "wifi": ["wifi", "wi fi", "internet"],
-        "an sang": ["an sang", "bua sang", "breakfast"],
-        "gym": ["gym", "phong tap", "phong gym", "fitness"],
-        "spa": ["spa", "massage"],
-        "parking": ["dau xe", "parking", "giu xe", "bai do xe"],
-    }
-
     hits: List[str] = []
-    for key, kws in mapping.items():
+    for key, kws in AMENITY_KEYWORDS.items():
         if any(_norm_text(k) in q_norm for k in kws):
             hits.append(key)
 
@@ -583,6 +521,11 @@ def _parse_constraints(query: str, thr: Optional[PriceThresholds]) -> Dict[str,
         "explicit_price": False,
         "require_price": False,
         "amenities_any": [],
+        "near_lat": None,
+        "near_lon": None,
+        "near_name": None,
+        "radius_km": None,
+        "bbox": None,
     }
 
     # district nums
@@ -621,9 +564,28 @@ def _parse_constraints(query: str, thr: Optional[PriceThresholds]) -> Dict[str,
     # amenities
     cons["amenities_any"] = _parse_amenities_from_query(q_norm)
 
+    # vị trí: "gần chợ Bến Thành", "cách Landmark 81 1.5km"
+    landmark = find_landmark(q_norm)
+    if landmark:
+        cons["near_name"], cons["near_lat"], cons["near_lon"] = landmark
+        cons["radius_km"] = _parse_radius_km(_strip_accents(q_raw.lower())) or GEO_DEFAULT_RADIUS_KM
+        if "gan nhat" in q_norm:
+            cons["sort_by"] = "Khoảng cách tăng dần"
+
     return cons
 
 
+def _parse_radius_km(q_low: str) -> Optional[float]:
+    """Bán kính trong câu hỏi (chưa bỏ dấu chấm thập phân): "1.5 km", "2 cây số", "500m"."""
+    m = re.search(r"(\d+(?:[.,]\d+)?)\s*(?:km|kilomet|kilometer|cay so)\b", q_low)
+    if m:
+        return float(m.group(1).replace(",", "."))
+    m = re.search(r"(\d+)\s*(?:m|met|meter|metre)\b", q_low)
+    if m and 50 <= int(m.group(1)) <= 20_000:
+        return int(m.group(1)) / 1000.0
+    return None
+
+
 def _merge_constraints(base: Dict[str, Any], override: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     if not override:
         return base
@@ -653,56 +615,78 @@ def load_llm() -> ChatGoogleGenerativeAI:
     return ChatGoogleGenerativeAI(model=GEMINI_MODEL_NAME, temperature=0.0)
 
 
-def load_vector_db() -> FAISS:
-    if not os.path.exists(VECTOR_DB_PATH):
+def load_vector_db(
+    vector_db_path: Optional[str] = None,
+    embeddings=None,
+    nprobe: Optional[int] = None,
+    ef_search: Optional[int] = None,
+) -> CompactVectorStore:
+    """Load vector DB (FAISS index + bảng phụ mmap, xem vector_store.py).
+    nprobe (IVF) / ef_search (HNSW) đánh đổi recall <-> latency lúc query.
+
+    Thứ tự ưu tiên: tham số hàm -> env FAISS_NPROBE / FAISS_EF_SEARCH -> giá trị lúc build (db_meta.json).
+    """
+    vector_db_path = vector_db_path or VECTOR_DB_PATH
+    if not os.path.exists(vector_db_path):
         raise FileNotFoundError(
-            f"Không tìm thấy vector DB ở: {VECTOR_DB_PATH}. Hãy chạy prepare_vector_db.py trước."
+            f"Không tìm thấy vector DB ở: {vector_db_path}. Hãy chạy prepare_vector_db.py trước."
+        )
+    if embeddings is None:
+        device = _detect_device()
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME,
+            model_kwargs={"device": device},
+            encode_kwargs={"normalize_embeddings": True},
+        )
+    if CompactVectorStore.exists(vector_db_path):
+        db = CompactVectorStore.load(vector_db_path, embeddings)
+    else:
+        # DB định dạng LangChain cũ (index.pkl): chỉ giữ phần cần dùng, build lại để bỏ bước unpickle
+        print("Vector DB định dạng cũ (index.pkl) - chạy lại prepare_vector_db.py để load nhanh hơn, không cần pickle.")
+        db = CompactVectorStore.from_langchain(
+            FAISS.load_local(vector_db_path, embeddings, allow_dangerous_deserialization=True)
         )
-    device = _detect_device()
-    embeddings = HuggingFaceEmbeddings(
-        model_name=EMBEDDING_MODEL_NAME,
-        model_kwargs={"device": device},
-        encode_kwargs={"normalize_embeddings": True},
-    )
-    return FAISS.load_local(VECTOR_DB_PATH, embeddings, allow_dangerous_deserialization=True)
 
+    index_meta: Dict[str, Any] = {}
+    meta_path = os.path.join(vector_db_path, "db_meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            index_meta = json.load(f).get("index") or {}
 
-def load_hotel_dataframe() -> Tuple[pd.DataFrame, Optional[PriceThresholds]]:
-    if not os.path.exists(CSV_PATH):
-        raise FileNotFoundError(f"Không tìm thấy CSV: {CSV_PATH}")
+    if nprobe is None:
+        nprobe = int(os.getenv("FAISS_NPROBE") or index_meta.get("nprobe") or 0) or None
+    if ef_search is None:
+        ef_search = int(os.getenv("FAISS_EF_SEARCH") or index_meta.get("ef_search") or 0) or None
+    apply_query_params(db.index, nprobe=nprobe, ef_search=ef_search)
+    return db
 
-    df = pd.read_csv(CSV_PATH)
 
-    df["_star_num"] = df["star"].apply(_extract_star_from_row)
-    df["_district_num"] = df["district"].apply(_extract_district_num)
-    df["_district_norm"] = df["district"].apply(_district_norm)
+def load_hotel_dataframe(csv_path: Optional[str] = None) -> Tuple[pd.DataFrame, Optional[PriceThresholds]]:
+    csv_path = csv_path or CSV_PATH
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Không tìm thấy CSV: {csv_path}")
 
-    df["hotelname_norm"] = df["hotelname"].astype(str).str.strip().str.lower()
-    df["hotelname_norm_simple"] = df["hotelname"].apply(
-        lambda x: _norm_text(re.sub(r"\b(khach san|khách sạn|hotel)\b", " ", str(x)))
-    )
+    # dtype khai báo sẵn; giá / sao / quận / cột list parse 1 lần theo cột (hotel_data.py)
+    df = load_hotels(csv_path)
+
+    df["_star_num"] = df["_star"]
+    df["_district_norm"] = df["_district_norm"].str.replace("district", "quan", regex=False)
 
-    parsed = df["price"].apply(_parse_price_range)
-    df["_price_min_vnd"] = parsed.apply(lambda t: t[0])
-    df["_price_max_vnd"] = parsed.apply(lambda t: t[1])
-    df["_price_mid_vnd"] = parsed.apply(lambda t: t[2])
+    df["hotelname_norm"] = df["hotelname"].astype(str).str.strip().str.lower()
 
-    df["_price_vnd"] = pd.to_numeric(df["_price_mid_vnd"], errors="coerce")
+    df["_price_vnd"] = df["_price_mid_vnd"]
     thr = _calc_price_thresholds(df["_price_vnd"])
 
-    # ✅ text để lọc tiện ích (amenities + description + reviews + address/district)
-    def _amen_text(row: pd.Series) -> str:
-        parts = [
-            row.get("amenities", ""),
-            row.get("description1", ""),
-            row.get("reviews", ""),
-            row.get("address", ""),
-            row.get("district", ""),
-        ]
-        return _norm_text(" ".join(str(p) for p in parts if p))
+    # ✅ text để lọc tiện ích (amenities + description + reviews + address/district), ghép theo cột
+    cols = [df[c].fillna("") for c in ("amenities", "description1", "reviews", "address", "district") if c in df.columns]
+    df["_amenities_text_norm"] = [_norm_text(" ".join(p for p in parts if p)) for parts in zip(*cols)]
 
-    df["_amenities_text_norm"] = df.apply(_amen_text, axis=1)
+    # địa danh gần nhất (+ km) join sẵn cho mỗi khách sạn: câu trả lời chỉ đọc cột, không đoán theo quận
+    poi = _poi_table_for(df)
+    df["_nearby"] = [poi.nearby_text(i) for i in df.index]
 
+    # dữ liệu mới -> cursor "xem thêm" của dữ liệu cũ hết hiệu lực
+    RESULT_CURSORS.clear()
     return df, thr
 
 
@@ -717,6 +701,35 @@ class LexicalIndex:
     row_ids: np.ndarray
 
 
+def build_geo_index(df: pd.DataFrame) -> GeoIndex:
+    """Grid index trên lat/lng (xem geo_index.py), build 1 lần lúc startup cạnh lexical index.
+
+    Dùng chung object với _geo_index_for: load_hotel_dataframe đã build để join PoiTable, không build lại.
+    """
+    return _geo_index_for(df)
+
+
+def build_name_index(df: pd.DataFrame) -> NameIndex:
+    """Trie tên khách sạn đã chuẩn hoá (name_index.py) cho đường tắt hỏi đúng tên."""
+    return NameIndex.from_frame(df, "hotelname")
+
+
+def build_suggest_index(df: pd.DataFrame) -> SuggestIndex:
+    """Trie gợi ý cho /api/suggest: tên khách sạn, quận, tiện ích (kể cả từ khoá AMENITY_KEYWORDS)."""
+    text = df["_amenities_text_norm"] if "_amenities_text_norm" in df.columns else pd.Series("", index=df.index)
+    keywords: Dict[str, int] = {}
+    for key, kws in AMENITY_KEYWORDS.items():
+        pattern = "|".join(re.escape(_norm_text(k)) for k in kws)
+        label = AMENITY_LABELS.get(key, key)
+        keywords[label] = max(keywords.get(label, 0), int(text.str.contains(pattern, regex=True).sum()))
+    return SuggestIndex.from_frame(df, keywords)
+
+
+def build_poi_table(df: pd.DataFrame, geo: Optional[GeoIndex] = None) -> PoiTable:
+    """Spatial join khách sạn x địa danh (geo_index.PoiTable) trên GeoIndex của df."""
+    return PoiTable(geo if geo is not None else build_geo_index(df))
+
+
 def build_lexical_index(df: pd.DataFrame, thr: Optional[PriceThresholds]) -> LexicalIndex:
     def row_text(row: pd.Series) -> str:
         price_mid = row.get("_price_vnd")
@@ -728,7 +741,7 @@ def build_lexical_index(df: pd.DataFrame, thr: Optional[PriceThresholds]) -> Lex
             row.get("amenities", ""),
             row.get("description1", ""),
             row.get("reviews", ""),
-            f"star {row.get('_star_num') or ''}",
+            f"star {_native_int(row.get('_star_num')) or ''}",
             f"rating {row.get('totalScore') or ''}",
             f"price_bucket {bucket}",
         ]
@@ -742,73 +755,105 @@ def build_lexical_index(df: pd.DataFrame, thr: Optional[PriceThresholds]) -> Lex
 
 
 def lexical_topk(query: str, lex: LexicalIndex, k: int = 80) -> List[Tuple[int, float]]:
+    return lexical_topk_batch([query], lex, k=k)[0]
+
+
+def lexical_scan(query: str, lex: LexicalIndex, row_ids: Sequence[int]) -> List[Tuple[int, float]]:
+    """TF-IDF của query với đúng các dòng row_ids (tập đã lọc), không cắt top-k. Bỏ dòng điểm 0."""
+    if not len(row_ids):
+        return []
+    pos = pd.Index(lex.row_ids).get_indexer(row_ids)
+    pos = pos[pos >= 0]
     qv = lex.vectorizer.transform([_norm_text(query)])
-    sims = cosine_similarity(qv, lex.matrix).ravel()
-    if k >= len(sims):
-        top_idx = np.argsort(-sims)
-    else:
-        top_idx = np.argpartition(-sims, k)[:k]
-        top_idx = top_idx[np.argsort(-sims[top_idx])]
-    return [(int(lex.row_ids[i]), float(sims[i])) for i in top_idx if sims[i] > 0]
+    sims = (lex.matrix[pos] @ qv.T).toarray().ravel()
+    nz = np.flatnonzero(sims > 0)
+    return [(int(lex.row_ids[pos[i]]), float(sims[i])) for i in nz]
+
+
+def lexical_topk_batch(queries: List[str], lex: LexicalIndex, k: int = 80) -> List[List[Tuple[int, float]]]:
+    """TF-IDF top-k cho nhiều query bằng 1 phép nhân ma trận thưa.
+
+    Các hàng của TfidfVectorizer đã chuẩn hoá L2 nên tích vô hướng = cosine.
+    Chỉ xét các phần tử khác 0 của từng hàng -> không cần ma trận dense (n_query x n_hotel).
+    """
+    if not queries:
+        return []
+    qm = lex.vectorizer.transform([_norm_text(q) for q in queries])
+    sims = (qm @ lex.matrix.T).tocsr()
+
+    out: List[List[Tuple[int, float]]] = []
+    for r in range(sims.shape[0]):
+        start, end = sims.indptr[r], sims.indptr[r + 1]
+        cols = sims.indices[start:end]
+        vals = sims.data[start:end]
+        keep = vals > 0
+        cols, vals = cols[keep], vals[keep]
+        if k < len(vals):
+            top = np.argpartition(-vals, k)[:k]
+            top = top[np.argsort(-vals[top])]
+        else:
+            top = np.argsort(-vals)
+        out.append([(int(lex.row_ids[cols[i]]), float(vals[i])) for i in top])
+    return out
 
 
 # =========================
 # HOTEL FORMAT + FILTER
 # =========================
 
-def _row_to_hotel(row: pd.Series, match_reason: str = "") -> Dict[str, Any]:
-    price_min = row.get("_price_min_vnd")
-    price_max = row.get("_price_max_vnd")
-    price_mid = row.get("_price_vnd")
+def _native_str(v: Any) -> str:
+    """None/NaN -> "" ; còn lại -> str thuần (để response không cần sanitize lại)."""
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    return str(v)
 
-    rating = row.get("totalScore")
-    star = row.get("_star_num")
 
+def _native_float(v: Any) -> Optional[float]:
     try:
-        price_mid = float(price_mid) if price_mid == price_mid else None
+        f = float(v)
     except Exception:
-        price_mid = None
+        return None
+    return f if f == f else None
 
-    try:
-        rating = float(rating) if rating == rating else None
-    except Exception:
-        rating = None
 
-    try:
-        star = int(star) if star == star else None
-    except Exception:
-        star = None
+def _native_int(v: Any) -> Optional[int]:
+    f = _native_float(v)
+    return int(f) if f is not None else None
 
-    hotel_id = None
-    try:
-        raw_id = row.get("id")
-        hotel_id = int(raw_id) if raw_id == raw_id and raw_id is not None else None
-    except Exception:
-        hotel_id = None
 
-    image_url = row.get("imageUrl") or ""
-    detail_path = f"/properties/{hotel_id}" if hotel_id is not None else ""
+# các cột _row_to_hotel đọc
+ROW_TO_HOTEL_COLUMNS = (
+    "_price_vnd", "totalScore", "_star_num", "id", "_price_min_vnd", "_price_max_vnd", "hotelname", "url_google",
+    "imageUrl", "district", "address", "_district_num", "website", "amenities", "_amenities_list", "description1",
+    "reviews", "_nearby", "_distance_km",
+)
 
-    pmin = None
-    pmax = None
-    try:
-        pmin = int(price_min) if price_min == price_min else None
-    except Exception:
-        pmin = None
-    try:
-        pmax = int(price_max) if price_max == price_max else None
-    except Exception:
-        pmax = None
+
+def _row_to_hotel(row: pd.Series, match_reason: str = "") -> Dict[str, Any]:
+    """Build dict kết quả chỉ gồm kiểu Python thuần, không NaN (int/float/str/None)."""
+    price_mid = _native_float(row.get("_price_vnd"))
+    rating = _native_float(row.get("totalScore"))
+    star = _native_int(row.get("_star_num"))
+    hotel_id = _native_int(row.get("id"))
+    pmin = _native_int(row.get("_price_min_vnd"))
+    pmax = _native_int(row.get("_price_max_vnd"))
+
+    name = _native_str(row.get("hotelname"))
+    url_google = _native_str(row.get("url_google"))
+    image_url = _native_str(row.get("imageUrl"))
+    detail_path = f"/properties/{hotel_id}" if hotel_id is not None else ""
 
     price_text = _format_price_range_vnd(pmin, pmax)
+    district = row.get("district")
 
-    return {
+    hotel = {
         "id": hotel_id,
-        "hotelname": row.get("hotelname") or "",
-        "name": row.get("hotelname") or "",
-        "address": row.get("address") or "",
-        "district": row.get("district"),
-        "district_num": row.get("_district_num"),
+        "row_id": _native_int(row.get("_row_id")),
+        "hotelname": name,
+        "name": name,
+        "address": _native_str(row.get("address")),
+        "district": _native_str(district) if district is not None and district == district else None,
+        "district_num": _native_int(row.get("_district_num")),
         "rating": rating,
         "star": star,
 
@@ -819,9 +864,9 @@ def _row_to_hotel(row: pd.Series, match_reason: str = "") -> Dict[str, Any]:
         "price_max_vnd": pmax,
         "price_text": price_text,
 
-        "url_google": row.get("url_google") or "",
-        "url": row.get("url_google") or "",
-        "website": row.get("website") or "",
+        "url_google": url_google,
+        "url": url_google,
+        "website": _native_str(row.get("website")),
 
         "imageUrl": image_url,
         "image_url": image_url,
@@ -829,22 +874,222 @@ def _row_to_hotel(row: pd.Series, match_reason: str = "") -> Dict[str, Any]:
         "detail_path": detail_path,
         "detail_url": detail_path,
 
-        "amenities": row.get("amenities") or "",
-        "description": row.get("description1") or "",
-        "reviews": row.get("reviews") or "",
+        "amenities": _native_str(row.get("amenities")),
+        "amenities_list": list(row.get("_amenities_list") or []),
+        "description": _native_str(row.get("description1")),
+        "reviews": _native_str(row.get("reviews")),
+        "nearby": _native_str(row.get("_nearby")),
         "match_reason": match_reason,
     }
+    distance = _native_float(row.get("_distance_km"))
+    if distance is not None:
+        hotel["distance_km"] = round(distance, 2)
+    return hotel
+
+
+# cache theo đúng object df (df được load 1 lần lúc startup, không đổi giữa các request)
+_DISTRICT_NAME_CACHE: Dict[int, Tuple[pd.DataFrame, Dict[str, str]]] = {}
 
 
 def _district_name_candidates(df: pd.DataFrame) -> Dict[str, str]:
+    cached = _DISTRICT_NAME_CACHE.get(id(df))
+    if cached is not None and cached[0] is df:
+        inc_cache("district_names", hit=True)
+        return cached[1]
+    inc_cache("district_names", hit=False)
+
     out: Dict[str, str] = {}
     for raw in df["district"].dropna().astype(str).unique().tolist():
         pretty = raw.split(",")[0].strip()
         out[_district_norm(raw)] = pretty
+    _DISTRICT_NAME_CACHE.clear()
+    _DISTRICT_NAME_CACHE[id(df)] = (df, out)
     return out
 
 
-def _apply_constraints(df: pd.DataFrame, cons: Dict[str, Any]) -> pd.DataFrame:
+_GEO_INDEX_CACHE: Dict[int, Tuple[pd.DataFrame, GeoIndex]] = {}
+
+
+def _geo_index_for(df: pd.DataFrame) -> GeoIndex:
+    cached = _GEO_INDEX_CACHE.get(id(df))
+    if cached is not None and cached[0] is df:
+        inc_cache("geo_index", hit=True)
+        return cached[1]
+    inc_cache("geo_index", hit=False)
+
+    geo = GeoIndex.from_frame(df, "lat", "lng")
+    _GEO_INDEX_CACHE.clear()
+    _GEO_INDEX_CACHE[id(df)] = (df, geo)
+    return geo
+
+
+_NAME_INDEX_CACHE: Dict[int, Tuple[pd.DataFrame, NameIndex]] = {}
+
+
+def _name_index_for(df: pd.DataFrame) -> NameIndex:
+    cached = _NAME_INDEX_CACHE.get(id(df))
+    if cached is not None and cached[0] is df:
+        inc_cache("name_index", hit=True)
+        return cached[1]
+    inc_cache("name_index", hit=False)
+
+    names = build_name_index(df)
+    _NAME_INDEX_CACHE.clear()
+    _NAME_INDEX_CACHE[id(df)] = (df, names)
+    return names
+
+
+# mảng numpy của ROW_TO_HOTEL_COLUMNS theo đúng object df: lấy vài dòng theo vị trí mà không
+# dựng pd.Series (df.loc[i] trên df ~40 cột mất ~0.3 ms / dòng)
+_HOTEL_COLUMNS_CACHE: Dict[int, Tuple[pd.DataFrame, Dict[str, np.ndarray]]] = {}
+
+
+def _hotel_columns_for(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    cached = _HOTEL_COLUMNS_CACHE.get(id(df))
+    if cached is not None and cached[0] is df:
+        inc_cache("hotel_columns", hit=True)
+        return cached[1]
+    inc_cache("hotel_columns", hit=False)
+
+    cols = {c: df[c].to_numpy() for c in ROW_TO_HOTEL_COLUMNS if c in df.columns}
+    _HOTEL_COLUMNS_CACHE.clear()
+    _HOTEL_COLUMNS_CACHE[id(df)] = (df, cols)
+    return cols
+
+
+def _hotel_rows(df: pd.DataFrame, ids: List[int]) -> List[Dict[str, Any]]:
+    """Dòng df theo index (label) -> dict {cột: giá trị} đủ cho _row_to_hotel."""
+    cols = _hotel_columns_for(df)
+    return [{"_row_id": rid, **{c: a[p] for c, a in cols.items()}} for rid, p in zip(ids, df.index.get_indexer(ids))]
+
+
+def _hotels_for_ids(df: pd.DataFrame, df_cons: pd.DataFrame, ids: List[int], match_reason: str) -> List[Dict[str, Any]]:
+    """Dòng df theo index -> dict kết quả; khoảng cách (cột chỉ có trong df_cons đã lọc) lấy từ df_cons."""
+    rows = _hotel_rows(df, ids)
+    if "_distance_km" in df_cons.columns:
+        for row, dist in zip(rows, df_cons["_distance_km"].reindex(ids).tolist()):
+            row["_distance_km"] = dist
+    return [_row_to_hotel(row, match_reason=match_reason) for row in rows]
+
+
+def _result_ref(hotel: Dict[str, Any]) -> Tuple[int, str, Optional[float]]:
+    """Kết quả -> tuple nhỏ giữ trong RESULT_CURSORS (dựng lại bằng _hotels_for_refs)."""
+    return hotel["row_id"], hotel.get("match_reason", ""), hotel.get("distance_km")
+
+
+def _hotels_for_refs(df: pd.DataFrame, refs: List[Tuple[int, str, Optional[float]]]) -> List[Dict[str, Any]]:
+    rows = _hotel_rows(df, [rid for rid, _reason, _dist in refs])
+    for row, (_rid, _reason, dist) in zip(rows, refs):
+        row["_distance_km"] = dist
+    return [_row_to_hotel(row, match_reason=reason) for row, (_rid, reason, _dist) in zip(rows, refs)]
+
+
+_POI_TABLE_CACHE: Dict[int, Tuple[pd.DataFrame, GeoIndex, PoiTable]] = {}
+
+
+def _poi_table_for(df: pd.DataFrame, geo: Optional[GeoIndex] = None) -> PoiTable:
+    """PoiTable của df, join trên geo của caller nếu có (không build GeoIndex thứ hai)."""
+    geo = geo if geo is not None else _geo_index_for(df)
+    cached = _POI_TABLE_CACHE.get(id(df))
+    if cached is not None and cached[0] is df and cached[1] is geo:
+        inc_cache("poi_table", hit=True)
+        return cached[2]
+    inc_cache("poi_table", hit=False)
+
+    poi = build_poi_table(df, geo)
+    _POI_TABLE_CACHE.clear()
+    _POI_TABLE_CACHE[id(df)] = (df, geo, poi)
+    return poi
+
+
+_PLAN_STATS_CACHE: Dict[int, Tuple[pd.DataFrame, ColumnStats]] = {}
+
+
+def _plan_stats_for(df: pd.DataFrame) -> ColumnStats:
+    cached = _PLAN_STATS_CACHE.get(id(df))
+    if cached is not None and cached[0] is df:
+        inc_cache("plan_stats", hit=True)
+        return cached[1]
+    inc_cache("plan_stats", hit=False)
+
+    stats = ColumnStats.from_frame(df, _norm_text)
+    _PLAN_STATS_CACHE.clear()
+    _PLAN_STATS_CACHE[id(df)] = (df, stats)
+    return stats
+
+
+# sort_by -> vị trí dòng (theo df) đã sắp sẵn, NaN cuối, bằng nhau thì giữ thứ tự df:
+# - Giá tăng dần: giá thấp nhất tăng dần, rồi rating giảm dần
+# - Giá giảm dần: giá cao nhất giảm dần, rồi rating giảm dần
+# - Rating giảm dần: rating giảm dần, rồi số sao giảm dần
+# - "fallback" (không ứng viên nào qua lọc): rating giảm dần, số sao giảm dần, giá thấp nhất tăng dần
+PRESORTED_SORT_KEYS = ("Giá tăng dần", "Giá giảm dần", "Rating giảm dần")
+_SORT_ORDER_CACHE: Dict[int, Tuple[pd.DataFrame, Dict[str, np.ndarray]]] = {}
+
+
+def _sort_orders_for(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    cached = _SORT_ORDER_CACHE.get(id(df))
+    if cached is not None and cached[0] is df:
+        inc_cache("sort_orders", hit=True)
+        return cached[1]
+    inc_cache("sort_orders", hit=False)
+
+    def col(name: str) -> np.ndarray:
+        return pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def asc(a: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(a), np.inf, a)
+
+    def desc(a: np.ndarray) -> np.ndarray:
+        return np.where(np.isnan(a), np.inf, -a)
+
+    rating, star = col("totalScore"), col("_star_num")
+    # np.lexsort: khoá cuối là khoá chính, sắp ổn định
+    orders = {
+        "Giá tăng dần": np.lexsort((desc(rating), asc(col("_price_min_vnd")))),
+        "Giá giảm dần": np.lexsort((desc(rating), desc(col("_price_max_vnd")))),
+        "Rating giảm dần": np.lexsort((desc(star), desc(rating))),
+        "fallback": np.lexsort((asc(col("_price_min_vnd")), desc(star), desc(rating))),
+    }
+    _SORT_ORDER_CACHE.clear()
+    _SORT_ORDER_CACHE[id(df)] = (df, orders)
+    return orders
+
+
+def _geo_filter(df: pd.DataFrame, cons: Dict[str, Any], geo: Optional[GeoIndex]) -> Tuple[Optional[pd.Index], Optional[pd.Series]]:
+    """Điều kiện vị trí -> (index các dòng thoả | None = không lọc, khoảng cách km theo index | None).
+
+    - near_name là địa danh + radius_km trong bán kính join: cắt danh sách PoiTable đã sắp sẵn.
+    - near_lat/near_lon + radius_km: lọc bán kính qua GeoIndex (chỉ đọc các ô grid quanh điểm).
+    - near_lat/near_lon không có radius_km: không lọc, chỉ tính khoảng cách (để sắp / hiển thị).
+    - bbox [south, west, north, east]: lọc theo khung bản đồ.
+    """
+    lat, lon, bbox = cons.get("near_lat"), cons.get("near_lon"), cons.get("bbox")
+    has_point = lat is not None and lon is not None
+    if not has_point and not bbox:
+        return None, None
+    geo = geo if geo is not None else _geo_index_for(df)
+
+    keep: Optional[pd.Index] = None
+    dist: Optional[pd.Series] = None
+    if has_point and cons.get("radius_km"):
+        hit = _poi_table_for(df, geo).hotels_near(cons["near_name"], float(cons["radius_km"])) if cons.get("near_name") else None
+        ids, d = hit if hit is not None else geo.within_radius(float(lat), float(lon), float(cons["radius_km"]))
+        keep, dist = pd.Index(ids), pd.Series(d, index=ids)
+    elif has_point:
+        dist = geo.distances(float(lat), float(lon))
+    if bbox:
+        in_box = pd.Index(geo.within_bbox(*(float(x) for x in bbox)))
+        keep = in_box if keep is None else keep[keep.isin(in_box)]
+    return keep, dist
+
+
+def _apply_constraints(df: pd.DataFrame, cons: Dict[str, Any], geo: Optional[GeoIndex] = None) -> pd.DataFrame:
+    # vị trí lọc trước: các mask bên dưới chỉ chạy trên số ít dòng gần điểm / trong bbox
+    keep, dist = _geo_filter(df, cons, geo)
+    if keep is not None:
+        df = df.loc[keep]
+
     mask = pd.Series(True, index=df.index, dtype=bool)
 
     # district
@@ -890,23 +1135,45 @@ def _apply_constraints(df: pd.DataFrame, cons: Dict[str, Any]) -> pd.DataFrame:
             any_mask |= txt.str.contains(a_norm, regex=False)
         mask &= any_mask
 
-    return df[mask].copy()
+    out = df[mask].copy()
+    if dist is not None:
+        out["_distance_km"] = dist.reindex(out.index)
+    return out
 
 
 # =========================
 # HYBRID RETRIEVAL + RANKING
 # =========================
 
-def _vec_topk(db: FAISS, query: str, k: int = 60) -> List[Tuple[str, float]]:
-    out: List[Tuple[str, float]] = []
-    for doc, dist in db.similarity_search_with_score(query, k=k):
-        meta = getattr(doc, "metadata", {}) or {}
-        name = meta.get("hotelname") or ""
-        if not name:
-            continue
-        sim = 1.0 / (1.0 + float(dist))
-        out.append((str(name), sim))
-    return out
+def _vec_topk(
+    db: CompactVectorStore, query: str, k: int = 60, subset: Optional[np.ndarray] = None,
+) -> List[Tuple[str, float]]:
+    return _vec_topk_batch(db, [query], k=k, subsets=None if subset is None else [subset])[0]
+
+
+def _vec_topk_batch(
+    db: CompactVectorStore,
+    queries: List[str],
+    k: int = 60,
+    subsets: Optional[List[Optional[np.ndarray]]] = None,
+) -> List[List[Tuple[str, float]]]:
+    """Embed tất cả query trong 1 lần + 1 lần index.search, tên khách sạn đọc từ bảng phụ.
+
+    subsets[i]: label FAISS của tập đã lọc (plan "exact") -> query i tìm riêng trong tập đó, lấy hết.
+    """
+    if not queries:
+        return []
+    subsets = subsets or [None] * len(queries)
+    vectors = db.embed_queries(list(queries))
+    hits: List[List[Tuple[str, float]]] = [[] for _ in queries]
+    full = [i for i, sub in enumerate(subsets) if sub is None]
+    if full:
+        for i, row in zip(full, db.search_names(vectors[full], k)):
+            hits[i] = row
+    for i, sub in enumerate(subsets):
+        if sub is not None:
+            hits[i] = db.search_names(vectors[i:i + 1], len(sub), labels=sub)[0]
+    return [[(name, 1.0 / (1.0 + dist)) for name, dist in row if name] for row in hits]
 
 
 def _find_rows_by_names(df: pd.DataFrame, names: List[str]) -> Dict[str, int]:
@@ -959,19 +1226,8 @@ def _price_score(row: pd.Series, cons: Dict[str, Any], thr: Optional[PriceThresh
     return 0.0
 
 
-def hybrid_search_hotels(
-    user_query: str,
-    df: pd.DataFrame,
-    thr: Optional[PriceThresholds],
-    vector_db: FAISS,
-    lex: LexicalIndex,
-    top_k: int = DEFAULT_TOP_K,
-    filters: Optional[Dict[str, Any]] = None,
-    memory_constraints: Optional[Dict[str, Any]] = None,
-) -> List[Dict[str, Any]]:
-
-    # merge: memory -> current query -> UI filters
-    cons = memory_constraints or {
+def _empty_constraints() -> Dict[str, Any]:
+    return {
         "min_price": None,
         "max_price": None,
         "district_nums": None,
@@ -983,20 +1239,54 @@ def hybrid_search_hotels(
         "explicit_price": False,
         "require_price": False,
         "amenities_any": [],
+        "near_lat": None,
+        "near_lon": None,
+        "near_name": None,
+        "radius_km": None,
+        "bbox": None,
     }
+
+
+def _resolve_constraints(
+    user_query: str,
+    df: pd.DataFrame,
+    thr: Optional[PriceThresholds],
+    filters: Optional[Dict[str, Any]] = None,
+    memory_constraints: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    # merge: memory -> current query -> UI filters
+    cons = memory_constraints or _empty_constraints()
     cons = _merge_constraints(cons, _parse_constraints(user_query, thr))
     cons = _merge_constraints(cons, filters)
 
     if not cons.get("district_nums"):
         name_map = _district_name_candidates(df)
-        qn = _norm_text(user_query)
-        hit_names = [norm for norm, _pretty in name_map.items() if norm and norm in qn]
+        # khớp nguyên từ; bỏ tên quận chỉ là số / 1 ký tự ("5", "q") -> không bắt nhầm "500m", "5 sao", "landmark 81"
+        qn = f" {_norm_text(user_query)} "
+        hit_names = [
+            norm for norm in name_map
+            if len(norm) > 1 and not norm.isdigit() and f" {norm} " in qn
+        ]
         if hit_names:
             cons["district_names"] = sorted(set(hit_names))
+    return cons
 
-    vec = _vec_topk(vector_db, user_query, k=70)
-    lex_top = lexical_topk(user_query, lex, k=100)
 
+def _rank_candidates(
+    df: pd.DataFrame,
+    thr: Optional[PriceThresholds],
+    cons: Dict[str, Any],
+    vec: List[Tuple[str, float]],
+    lex_top: List[Tuple[int, float]],
+    top_k: int,
+    filters: Optional[Dict[str, Any]] = None,
+    geo: Optional[GeoIndex] = None,
+    df_cons: Optional[pd.DataFrame] = None,
+    plan: Optional[RetrievalPlan] = None,
+    name_ids: Sequence[int] = (),
+) -> List[Dict[str, Any]]:
+    """df_cons: df đã lọc theo cons nếu đã tính trước (plan "exact"); plan "exact" -> chấm điểm mọi dòng đã lọc.
+    name_ids: dòng khớp gần đúng tên trong câu hỏi -> thành ứng viên, cộng W_NAME."""
     vec_names = [n for n, _ in vec]
     vec_name_to_sim: Dict[str, float] = {}
     for n, s in vec:
@@ -1016,51 +1306,296 @@ def hybrid_search_hotels(
         rec = cand.setdefault(int(idx), {})
         rec["lex"] = max(rec.get("lex", 0.0), float(sim))
 
-    df_cons = _apply_constraints(df, cons)
-    allowed = set(df_cons.index.tolist())
-    cand = {idx: sc for idx, sc in cand.items() if idx in allowed}
-
+    for idx in name_ids:
+        cand.setdefault(int(idx), {})["name"] = 1.0
+
+    observe_size("vec_hits", len(vec))
+    observe_size("lex_hits", len(lex_top))
+    observe_size("candidates", len(cand))
+
+    with stage("apply_constraints"):
+        if df_cons is None:
+            df_cons = _apply_constraints(df, cons, geo=geo)
+        allowed = set(df_cons.index.tolist())
+        cand = {idx: sc for idx, sc in cand.items() if idx in allowed}
+        if cons.get("radius_km") or cons.get("bbox") or (plan is not None and plan.mode == "exact"):
+            # vùng bán kính / bbox nhỏ, tập đã lọc vừa budget: xét mọi dòng, không chỉ các dòng vec/lex trúng
+            for idx in allowed:
+                cand.setdefault(int(idx), {})
+    observe_size("allowed", len(allowed))
+    if plan is not None:
+        log_plan(plan, len(allowed))
+    observe_size("candidates_filtered", len(cand))
+
+    sort_by = _sort_key(cons, filters)
     if not cand:
-        df_fb = df_cons.copy()
-        df_fb["__rating"] = pd.to_numeric(df_fb["totalScore"], errors="coerce")
-        df_fb["__star"] = pd.to_numeric(df_fb["_star_num"], errors="coerce")
-        df_fb["__price_min"] = pd.to_numeric(df_fb["_price_min_vnd"], errors="coerce").fillna(10**12)
-        df_fb = df_fb.sort_values(by=["__rating", "__star", "__price_min"], ascending=[False, False, True])
-        out = []
-        for _, row in df_fb.head(top_k).iterrows():
-            out.append(_row_to_hotel(row, match_reason="Phù hợp tiêu chí lọc"))
-        return out
-
-    scored: List[Tuple[int, float]] = []
-    for idx, sc in cand.items():
-        row = df.loc[idx]
-        vec_sim = float(sc.get("vec", 0.0))
-        lex_sim = float(sc.get("lex", 0.0))
-        qual = _quality_score(row)
-        price_sc = _price_score(row, cons, thr)
-        total = (W_VEC * vec_sim) + (W_LEX * lex_sim) + (W_QUAL * (0.7 * qual + 0.3 * price_sc))
-        scored.append((idx, total))
-
-    scored.sort(key=lambda x: x[1], reverse=True)
-
-    out: List[Dict[str, Any]] = []
-    for idx, _total in scored[: max(top_k * 3, top_k)]:
-        row = df.loc[idx]
-        out.append(_row_to_hotel(row, match_reason="Phù hợp tiêu chí"))
-        if len(out) >= top_k:
-            break
+        if sort_by == "Khoảng cách tăng dần" and "_distance_km" in df_cons.columns:
+            with stage("fallback_rank"):
+                # khoảng cách tăng dần (NaN cuối), rồi rating giảm dần; chỉ sắp 2 cột của tập đã lọc
+                dist = df_cons["_distance_km"].to_numpy(dtype=np.float64, na_value=np.nan)
+                rating = pd.to_numeric(df_cons["totalScore"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+                order = np.lexsort((np.where(np.isnan(rating), np.inf, -rating), np.where(np.isnan(dist), np.inf, dist)))
+            with stage("row_to_hotel"):
+                return _hotels_for_ids(df, df_cons, df_cons.index[order[:top_k]].tolist(), "Phù hợp tiêu chí lọc")
+        return _presorted_hotels(df, df_cons, "fallback", top_k)
+
+    with stage("scoring"):
+        scored: List[Tuple[int, float]] = []
+        for idx, sc in cand.items():
+            row = df_cons.loc[idx]
+            vec_sim = float(sc.get("vec", 0.0))
+            lex_sim = float(sc.get("lex", 0.0))
+            qual = _quality_score(row)
+            price_sc = _price_score(row, cons, thr)
+            total = (W_VEC * vec_sim) + (W_LEX * lex_sim) + (W_QUAL * (0.7 * qual + 0.3 * price_sc))
+            total += W_NAME * float(sc.get("name", 0.0))
+            scored.append((idx, total))
+
+        scored.sort(key=lambda x: x[1], reverse=True)
+
+    with stage("row_to_hotel"):
+        out = _hotels_for_ids(df, df_cons, [idx for idx, _total in scored[:top_k]], "Phù hợp tiêu chí")
+        for h, (idx, _total) in zip(out, scored):
+            if "name" in cand[idx]:
+                h["match_reason"] = "Gần đúng tên khách sạn"
 
-    sort_by = (filters or {}).get("sort_by") or cons.get("sort_by") or "relevance"
     if sort_by == "Giá tăng dần":
         out.sort(key=lambda h: (h.get("price_min_vnd") is None, h.get("price_min_vnd") or 0))
     elif sort_by == "Giá giảm dần":
         out.sort(key=lambda h: (h.get("price_max_vnd") is None, -(h.get("price_max_vnd") or 0)))
     elif sort_by == "Rating giảm dần":
         out.sort(key=lambda h: (h.get("rating") is None, -(h.get("rating") or 0), -(h.get("star") or 0)))
+    elif sort_by == "Khoảng cách tăng dần":
+        out.sort(key=lambda h: (h.get("distance_km") is None, h.get("distance_km") or 0))
 
     return out[:top_k]
 
 
+# điều kiện lọc theo từng dòng (không tính vị trí / sort)
+_ROW_FILTER_KEYS = (
+    "min_price", "max_price", "require_price", "district_nums", "district_names", "min_rating", "min_star", "amenities_any",
+)
+
+
+def _sort_key(cons: Dict[str, Any], filters: Optional[Dict[str, Any]] = None) -> str:
+    return (filters or {}).get("sort_by") or cons.get("sort_by") or "relevance"
+
+
+def _explicit_sort_key(filters: Optional[Dict[str, Any]] = None) -> str:
+    """sort_by người dùng chọn (filters). sort_by suy ra từ câu hỏi ("giá rẻ" -> "Giá tăng dần") không tính:
+    vẫn xếp theo độ liên quan, _rank_candidates chỉ sắp lại top-k ứng viên."""
+    return (filters or {}).get("sort_by") or "relevance"
+
+
+def _sorted_topk(
+    df: pd.DataFrame,
+    cons: Dict[str, Any],
+    sort_by: str,
+    top_k: int,
+    geo: Optional[GeoIndex] = None,
+) -> List[Dict[str, Any]]:
+    """sort_by trong PRESORTED_SORT_KEYS: k dòng đầu tiên thoả bộ lọc theo thứ tự đã sắp sẵn của cả df.
+
+    Đúng "rẻ nhất / rating cao nhất" trong tập đã lọc (không phải sắp lại top-k theo độ liên quan), không
+    chạy encoder / TF-IDF / chấm điểm.
+    """
+    with stage("apply_constraints"):
+        df_cons = _apply_constraints(df, cons, geo=geo)
+    observe_size("allowed", len(df_cons))
+
+    return _presorted_hotels(df, df_cons, sort_by, top_k)
+
+
+def _presorted_hotels(df: pd.DataFrame, df_cons: pd.DataFrame, order_key: str, top_k: int) -> List[Dict[str, Any]]:
+    """k dòng đầu của thứ tự _sort_orders_for(df)[order_key] có trong df_cons (df đã lọc): đi theo từng khúc
+    (khúc sau dài gấp đôi), dừng khi đủ k; không copy / sort df theo request."""
+    with stage("sorted_walk"):
+        order = _sort_orders_for(df)[order_key]
+        mask = np.zeros(len(df), dtype=bool)
+        mask[df.index.get_indexer(df_cons.index)] = True
+        picked: List[int] = []
+        start, step = 0, max(4 * top_k, 256)
+        while start < len(order) and len(picked) < top_k:
+            chunk = order[start:start + step]
+            picked.extend(chunk[mask[chunk]].tolist())
+            start, step = start + step, step * 2
+        ids = df.index[picked[:top_k]].tolist()
+
+    with stage("row_to_hotel"):
+        return _hotels_for_ids(df, df_cons, ids, "Phù hợp tiêu chí lọc")
+
+
+def _name_fast_path(
+    user_query: str,
+    df: pd.DataFrame,
+    cons: Dict[str, Any],
+    top_k: int,
+    names: Optional[NameIndex] = None,
+) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Câu hỏi chứa tên khách sạn ("Pham's Cozy House còn phòng không" -> NameIndex.lookup) -> (các dòng đó, []).
+
+    Khớp gần đúng (gõ sai "pham cozy hous") không đủ tin cậy để bỏ retrieval ("khách sạn hoa hồng" gần đúng
+    "Hoa Phượng Hồng") -> ([], row_ids) để _rank_candidates cộng W_NAME, kết quả vẫn là hybrid retrieval.
+    ([], []) = không khớp tên / có điều kiện vị trí / tên khớp bị bộ lọc loại hết -> hybrid như bình thường.
+    """
+    if not NAME_FAST_PATH or cons.get("bbox"):
+        return [], []
+    names = names if names is not None else _name_index_for(df)
+    ids, exact = names.lookup(user_query)
+    observe_size("name_hits", len(ids))
+    if not ids:
+        return [], []
+    if not exact:
+        return [], ids
+
+    if cons.get("near_lat") is not None:
+        # "Vinpearl Landmark 81 ..." -> địa danh đọc ra từ chính tên khách sạn thì bỏ, còn lại nhường retrieval
+        from_name = {(find_landmark(_norm_text(h["hotelname"])) or (None,))[0] for h in _hotel_rows(df, ids)}
+        if from_name != {cons.get("near_name")}:
+            return [], []
+        cons = {**cons, "near_lat": None, "near_lon": None, "near_name": None, "radius_km": None}
+    if any(cons.get(k) for k in _ROW_FILTER_KEYS):
+        ids = _apply_constraints(df.loc[ids], cons).index.tolist()
+    return [_row_to_hotel(row, match_reason="Khớp tên khách sạn") for row in _hotel_rows(df, ids[:top_k])], []
+
+
+def _plan_search(
+    df: pd.DataFrame, cons: Dict[str, Any], top_k: int, geo: Optional[GeoIndex] = None,
+) -> Tuple[RetrievalPlan, Optional[pd.DataFrame]]:
+    """Plan retrieval cho 1 query (retrieval_plan.py). Plan "exact" lọc df luôn rồi lập lại plan theo
+    số dòng thật (ước lượng lệch quá budget -> về "topk"); trả kèm df đã lọc để _rank_candidates dùng lại."""
+    stats = _plan_stats_for(df)
+    plan = plan_retrieval(stats, cons, top_k)
+    if plan.mode != "exact":
+        return plan, None
+    with stage("apply_constraints"):
+        df_cons = _apply_constraints(df, cons, geo=geo)
+    return plan_retrieval(stats, cons, top_k, allowed=len(df_cons)), df_cons
+
+
+def hybrid_search_hotels(
+    user_query: str,
+    df: pd.DataFrame,
+    thr: Optional[PriceThresholds],
+    vector_db: CompactVectorStore,
+    lex: LexicalIndex,
+    top_k: int = DEFAULT_TOP_K,
+    filters: Optional[Dict[str, Any]] = None,
+    memory_constraints: Optional[Dict[str, Any]] = None,
+    geo: Optional[GeoIndex] = None,
+    names: Optional[NameIndex] = None,
+    depth: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """depth: trả tối đa depth kết quả (>= top_k) để phân trang; plan retrieval vẫn tính theo top_k,
+    phần sau top_k chỉ là phần đuôi của cùng danh sách ứng viên đã chấm điểm."""
+    n_out = max(top_k, depth or 0)
+    with stage("resolve_constraints"):
+        cons = _resolve_constraints(user_query, df, thr, filters, memory_constraints)
+
+    with stage("name_match"):
+        hotels, name_ids = _name_fast_path(user_query, df, cons, n_out, names)
+    if hotels:
+        return hotels
+
+    sort_by = _explicit_sort_key(filters)
+    if sort_by in PRESORTED_SORT_KEYS:
+        return _sorted_topk(df, cons, sort_by, n_out, geo)
+
+    with stage("plan"):
+        plan, df_cons = _plan_search(df, cons, top_k, geo)
+
+    vec: List[Tuple[str, float]] = []
+    lex_top: List[Tuple[int, float]] = []
+    if plan.mode == "exact":
+        # tập đã lọc rỗng -> không cần encoder
+        if len(df_cons):
+            with stage("vec_topk"):
+                vec = _vec_topk(vector_db, user_query, subset=vector_db.labels_for_names(df_cons["hotelname"]))
+            with stage("lexical_topk"):
+                lex_top = lexical_scan(user_query, lex, df_cons.index.to_numpy())
+    else:
+        with stage("vec_topk"):
+            vec = _vec_topk(vector_db, user_query, k=plan.k_vec)
+        with stage("lexical_topk"):
+            lex_top = lexical_topk(user_query, lex, k=plan.k_lex)
+
+    return _rank_candidates(
+        df, thr, cons, vec, lex_top, n_out, filters, geo=geo, df_cons=df_cons, plan=plan, name_ids=name_ids,
+    )
+
+
+def hybrid_search_hotels_batch(
+    items: List[Dict[str, Any]],
+    df: pd.DataFrame,
+    thr: Optional[PriceThresholds],
+    vector_db: CompactVectorStore,
+    lex: LexicalIndex,
+    geo: Optional[GeoIndex] = None,
+    names: Optional[NameIndex] = None,
+) -> List[List[Dict[str, Any]]]:
+    """Hybrid search cho nhiều query cùng lúc (eval / warm-up cache).
+
+    items: [{"query": str, "filters": dict | None, "top_k": int | None}, ...]
+    Embed tất cả query trong 1 lần gọi encoder, TF-IDF tính bằng 1 phép nhân ma trận thưa,
+    phần lọc + xếp hạng dùng chung với hybrid_search_hotels nên kết quả giống hệt gọi từng query.
+    Query khớp đúng tên khách sạn / chọn sắp theo giá, rating trong filters (_sorted_topk) không đưa vào batch encoder.
+    """
+    if not items:
+        return []
+    queries = [str(it.get("query") or "") for it in items]
+    top_ks = [int(it.get("top_k") or DEFAULT_TOP_K) for it in items]
+
+    with stage("resolve_constraints"):
+        cons_all = [_resolve_constraints(q, df, thr, it.get("filters")) for it, q in zip(items, queries)]
+    with stage("name_match"):
+        fast = [_name_fast_path(q, df, cons, top_k, names) for q, cons, top_k in zip(queries, cons_all, top_ks)]
+    out: List[List[Dict[str, Any]]] = [hotels for hotels, _name_ids in fast]
+    sort_keys = [_explicit_sort_key(it.get("filters")) for it in items]
+    rest = []
+    for i, hotels in enumerate(out):
+        if hotels:
+            continue
+        if sort_keys[i] in PRESORTED_SORT_KEYS:
+            out[i] = _sorted_topk(df, cons_all[i], sort_keys[i], top_ks[i], geo)
+        else:
+            rest.append(i)
+    if not rest:
+        return out
+
+    with stage("plan"):
+        planned = {i: _plan_search(df, cons_all[i], top_ks[i], geo) for i in rest}
+    # plan "exact" với tập đã lọc rỗng: không đưa vào encoder
+    search = [i for i in rest if planned[i][0].mode != "exact" or len(planned[i][1])]
+    exact = [i for i in search if planned[i][0].mode == "exact"]
+    topk = [i for i in search if planned[i][0].mode != "exact"]
+
+    with stage("vec_topk_batch"):
+        subsets = [
+            vector_db.labels_for_names(planned[i][1]["hotelname"]) if i in exact else None for i in search
+        ]
+        k_vec = max((planned[i][0].k_vec for i in topk), default=1)
+        vec_by_i = dict(zip(search, _vec_topk_batch(vector_db, [queries[i] for i in search], k=k_vec, subsets=subsets)))
+    with stage("lexical_topk_batch"):
+        # 1 lần k lớn nhất cho cả batch rồi cắt theo k của từng query (top-k nhỏ là tiền tố của top-k lớn)
+        k_lex = max((planned[i][0].k_lex for i in topk), default=1)
+        lex_by_i = dict(zip(topk, lexical_topk_batch([queries[i] for i in topk], lex, k=k_lex)))
+        for i in exact:
+            lex_by_i[i] = lexical_scan(queries[i], lex, planned[i][1].index.to_numpy())
+
+    for i in rest:
+        plan, df_cons = planned[i]
+        vec = vec_by_i.get(i, [])
+        lex_top = lex_by_i.get(i, [])
+        if plan.mode != "exact":
+            vec, lex_top = vec[: plan.k_vec], lex_top[: plan.k_lex]
+        filters = items[i].get("filters")
+        out[i] = _rank_candidates(
+            df, thr, cons_all[i], vec, lex_top, top_ks[i], filters, geo=geo, df_cons=df_cons, plan=plan,
+            name_ids=fast[i][1],
+        )
+    return out
+
+
 # =========================
 # ✅ Deterministic list answer (fallback)
 # =========================
@@ -1069,31 +1604,12 @@ def _pick_amenities_brief(h: Dict[str, Any], max_items: int = 4) -> str:
     """
     Trả về chuỗi tiện ích đẹp (không còn kiểu ['...']).
     """
-    raw = h.get("amenities") or ""
-    if not raw:
-        return "—"
-
-    s = str(raw).strip()
-
-    # Nếu là list dạng "['a', 'b']" => parse JSON-like
-    try:
-        # normalize dấu nháy đơn -> nháy kép để json.loads
-        if s.startswith("[") and s.endswith("]"):
-            s2 = s.replace("'", '"')
-            arr = json.loads(s2)
-            if isinstance(arr, list):
-                parts = [str(x).strip() for x in arr if str(x).strip()]
-            else:
-                parts = []
-        else:
-            parts = []
-    except Exception:
-        parts = []
-
-    if not parts:
-        # fallback: split theo dấu phẩy / xuống dòng / chấm phẩy
-        parts = re.split(r"[,\n;/•]+", s)
-        parts = [p.strip() for p in parts if p.strip()]
+    parts = h.get("amenities_list")
+    if parts is None:
+        # dict không đi qua load_hotel_dataframe: parse chuỗi dạng list giống loader
+        s = str(h.get("amenities") or "").strip()
+        parts = parse_list_value(s) if s.startswith("[") else re.split(r"[,\n;/•]+", s)
+    parts = [str(p).strip() for p in parts if str(p).strip()]
 
     if not parts:
         return "—"
@@ -1103,7 +1619,7 @@ def _pick_amenities_brief(h: Dict[str, Any], max_items: int = 4) -> str:
 
 
 
-def _compact_list_answer(hotels: List[Dict[str, Any]], criteria_text: str = "") -> str:
+def _compact_list_answer(hotels: List[Dict[str, Any]], criteria_text: str = "", start: int = 1) -> str:
     n = len(hotels)
 
     # ✅ Mở bài gọn gàng
@@ -1121,7 +1637,7 @@ def _compact_list_answer(hotels: List[Dict[str, Any]], criteria_text: str = "")
     lines = [intro, ""]
     lines.append(f"Mình đã tìm thấy {n} lựa chọn phù hợp:")
 
-    for i, h in enumerate(hotels, 1):
+    for i, h in enumerate(hotels, start):
         name = (h.get("hotelname") or h.get("name") or "").strip()
         district = str(h.get("district") or "—").split(",")[0].strip() or "—"
         price_text = (h.get("price_text") or "chưa cập nhật giá").strip()
@@ -1201,11 +1717,14 @@ def search_hotels_tool(
     user_query: str,
     df: pd.DataFrame,
     thr: Optional[PriceThresholds],
-    vector_db: FAISS,
+    vector_db: CompactVectorStore,
     lex: LexicalIndex,
     top_k: int = DEFAULT_TOP_K,
     filters: Optional[Dict[str, Any]] = None,
     memory_constraints: Optional[Dict[str, Any]] = None,
+    geo: Optional[GeoIndex] = None,
+    names: Optional[NameIndex] = None,
+    depth: Optional[int] = None,
 ) -> Dict[str, Any]:
     hotels = hybrid_search_hotels(
         user_query=user_query,
@@ -1216,6 +1735,9 @@ def search_hotels_tool(
         top_k=top_k,
         filters=filters,
         memory_constraints=memory_constraints,
+        geo=geo,
+        names=names,
+        depth=depth,
     )
     return {"tool_name": "search_hotels_tool", "query": user_query, "results": hotels}
 
@@ -1256,18 +1778,52 @@ def _is_greeting_only(text: str) -> bool:
 def _greeting_reply() -> str:
     # Ngắn gọn, không gợi ý khách sạn
     return "Chào bạn! 😊, tôi là trợ lý ảo của hệ thống gợi ý du lịch 3M2T1STAY, rất vui được hỗ trợ bạn."
+
+
+def _chat_next_page(user_input: str, cursor: str, df: Optional[pd.DataFrame]) -> Dict[str, Any]:
+    """Trang tiếp theo của lần tìm trước: cắt lát danh sách đã lưu trong RESULT_CURSORS."""
+    with stage("result_cursor"):
+        page = RESULT_CURSORS.page(cursor, id(df)) if df is not None else None
+    if page is None:
+        return {
+            "answer": "Danh sách gợi ý trước đã hết hạn, bạn hãy tìm lại giúp mình nhé.",
+            "tool_result": {
+                "tool_name": "search_hotels_tool", "query": user_input, "results": [], "next_cursor": None,
+                "expired": True,
+            },
+        }
+    with stage("row_to_hotel"):
+        hotels = _hotels_for_refs(df, page.refs)
+    answer_text = _compact_list_answer(hotels, criteria_text=page.meta.get("criteria_text", ""), start=page.offset + 1)
+    return {
+        "answer": answer_text,
+        "tool_result": {
+            "tool_name": "search_hotels_tool",
+            "query": user_input or page.meta.get("query", ""),
+            "results": hotels,
+            "next_cursor": page.next_cursor,
+        },
+    }
+
+
 def chat_with_agent(
     user_input: str,
     llm: Optional[ChatGoogleGenerativeAI] = None,
-    vector_db: Optional[FAISS] = None,
+    vector_db: Optional[CompactVectorStore] = None,
     df: Optional[pd.DataFrame] = None,
     thr: Optional[PriceThresholds] = None,
     lex: Optional[LexicalIndex] = None,
     filters: Optional[Dict[str, Any]] = None,
     top_k: int = DEFAULT_TOP_K,
     history: Optional[List[Dict[str, Any]]] = None,
+    geo: Optional[GeoIndex] = None,
+    names: Optional[NameIndex] = None,
+    cursor: Optional[str] = None,
 ) -> Dict[str, Any]:
+    """cursor: next_cursor của lần trả lời trước -> trang kết quả tiếp theo (không chạy lại retrieval)."""
     user_input = (user_input or "").strip()
+    if cursor:
+        return _chat_next_page(user_input, cursor, df)
     if _is_greeting_only(user_input):
         return {
             "answer": _greeting_reply(),
@@ -1289,13 +1845,19 @@ def chat_with_agent(
         vector_db = load_vector_db()
     if lex is None:
         lex = build_lexical_index(df, thr)
+    if geo is None:
+        geo = _geo_index_for(df)
+    if names is None:
+        names = _name_index_for(df)
     if llm is None:
         llm = load_llm()
 
     # ✅ memory constraints từ history
-    mem_cons = _constraints_from_history(history, thr)
+    with stage("constraints_from_history"):
+        mem_cons = _constraints_from_history(history, thr)
     criteria_text = _summarize_constraints(mem_cons)
 
+    compare = _detect_compare_intent(user_input)
     tool_result = search_hotels_tool(
         user_query=user_input,
         df=df,
@@ -1305,15 +1867,24 @@ def chat_with_agent(
         top_k=top_k,
         filters=filters,
         memory_constraints=mem_cons,
+        geo=geo,
+        names=names,
+        depth=None if compare else RESULT_CURSOR_DEPTH,
     )
 
     hotels = tool_result.get("results") or []
+    # ✅ "xem thêm": giữ cả danh sách sau cursor, trả trang đầu
+    next_cursor = None
+    if RESULT_CURSOR_DEPTH > 0 and not compare:
+        meta = {"query": user_input, "criteria_text": criteria_text}
+        next_cursor = RESULT_CURSORS.put([_result_ref(h) for h in hotels], top_k, id(df), meta)
     hotels = hotels[:top_k]
     tool_result["results"] = hotels
+    tool_result["next_cursor"] = next_cursor
     expected = min(top_k, len(hotels))
 
     # ✅ Compare mode: trả về Top 3 + bảng so sánh (không qua LLM để ổn định)
-    if _detect_compare_intent(user_input):
+    if compare:
         top3 = _pick_top3(hotels)
         tool_result["results"] = top3
         answer_text = _build_compare_markdown(top3)
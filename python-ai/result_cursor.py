@@ -0,0 +1,137 @@
+"""Phân trang kết quả tìm kiếm bằng cursor: danh sách đã xếp hạng đầy đủ của 1 lần tìm được giữ tạm
+trong RAM phía server, trang sau chỉ cắt lát danh sách đó (không embed / FAISS / TF-IDF / chấm điểm lại).
+
+- Mỗi kết quả chỉ giữ 1 tuple nhỏ (qabot: row_id, match_reason, distance_km), không giữ dict khách sạn
+  (review, mô tả...): dict của trang được dựng lại từ df khi đọc trang -> bộ nhớ tỉ lệ với số dòng.
+
+- Cursor là chuỗi mờ (base64 url-safe của token ngẫu nhiên + offset), client chỉ gửi lại nguyên văn.
+- Giới hạn bộ nhớ theo tổng số kết quả đang giữ (RESULT_CURSOR_MAX_ROWS) và số danh sách
+  (RESULT_CURSOR_MAX_ENTRIES); vượt thì bỏ danh sách dùng lâu nhất (LRU). Mỗi danh sách sống
+  RESULT_CURSOR_TTL_S giây kể từ lần dùng cuối.
+- Dữ liệu load lại (qabot.load_hotel_dataframe) -> clear(); mỗi danh sách còn nhớ id(df) đã tạo ra nó
+  nên cursor cũ đọc với df khác cũng coi như hết hạn.
+"""
+
+import base64
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import inc_cache
+
+
+RESULT_CURSOR_MAX_ENTRIES = int(os.getenv("RESULT_CURSOR_MAX_ENTRIES", "1000"))
+RESULT_CURSOR_MAX_ROWS = int(os.getenv("RESULT_CURSOR_MAX_ROWS", "20000"))
+RESULT_CURSOR_TTL_S = float(os.getenv("RESULT_CURSOR_TTL_S", "600"))
+
+
+@dataclass
+class _Entry:
+    refs: List[Tuple[Any, ...]]
+    page_size: int
+    data_id: int
+    meta: Dict[str, Any] = field(default_factory=dict)
+    touched: float = 0.0
+
+
+@dataclass
+class Page:
+    refs: List[Tuple[Any, ...]]
+    offset: int  # vị trí kết quả đầu trang trong cả danh sách
+    next_cursor: Optional[str]
+    meta: Dict[str, Any]
+
+
+def encode_cursor(token: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{token}:{int(offset)}".encode("ascii")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """(token, offset) | None nếu cursor hỏng."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii")
+        token, offset = raw.rsplit(":", 1)
+        return token, max(0, int(offset))
+    except Exception:
+        return None
+
+
+class CursorCache:
+    """token -> danh sách tham chiếu kết quả đã xếp hạng, LRU giới hạn theo số danh sách + tổng số dòng. Thread-safe."""
+
+    def __init__(
+        self,
+        max_entries: int = RESULT_CURSOR_MAX_ENTRIES,
+        max_rows: int = RESULT_CURSOR_MAX_ROWS,
+        ttl_s: float = RESULT_CURSOR_TTL_S,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.max_rows = max(1, int(max_rows))
+        self.ttl_s = float(ttl_s)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def rows(self) -> int:
+        return self._rows
+
+    def _drop(self, token: str) -> None:
+        entry = self._entries.pop(token)
+        self._rows -= len(entry.refs)
+
+    def _expire(self, now: float) -> None:
+        # OrderedDict theo thứ tự dùng: entry đầu là entry cũ nhất
+        while self._entries:
+            token, entry = next(iter(self._entries.items()))
+            if self.ttl_s <= 0 or now - entry.touched <= self.ttl_s:
+                break
+            self._drop(token)
+
+    def put(self, refs: List[Tuple[Any, ...]], page_size: int, data_id: int, meta: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """Lưu danh sách, trả cursor của trang 2 (None nếu không còn trang sau hoặc danh sách quá lớn)."""
+        page_size = max(1, int(page_size))
+        if len(refs) <= page_size or len(refs) > self.max_rows:
+            return None
+        token = secrets.token_urlsafe(12)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._entries[token] = _Entry(list(refs), page_size, data_id, dict(meta or {}), now)
+            self._rows += len(refs)
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                self._drop(next(iter(self._entries)))
+        return encode_cursor(token, page_size)
+
+    def page(self, cursor: str, data_id: int) -> Optional[Page]:
+        """cursor -> tham chiếu của trang; None = cursor hỏng / hết hạn / của dữ liệu khác."""
+        decoded = decode_cursor(cursor or "")
+        if decoded is None:
+            inc_cache("result_cursor", hit=False)
+            return None
+        token, offset = decoded
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(token)
+            if entry is None or entry.data_id != data_id:
+                inc_cache("result_cursor", hit=False)
+                return None
+            entry.touched = now
+            self._entries.move_to_end(token)
+        inc_cache("result_cursor", hit=True)
+        end = offset + entry.page_size
+        next_cursor = encode_cursor(token, end) if end < len(entry.refs) else None
+        return Page(entry.refs[offset:end], offset, next_cursor, entry.meta)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
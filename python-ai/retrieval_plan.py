@@ -0,0 +1,208 @@
+"""Planner cho hybrid retrieval: chọn độ sâu từng nhánh (vec / lex) hoặc quét hết tập đã lọc.
+
+Trước đây k cố định (vec 70, lex 100): query rộng lấy thừa, query lọc chặt ("4 sao quận 7 dưới 2 triệu")
+lấy thiếu vì phần lớn top-k toàn cục bị bộ lọc loại. Planner ước lượng số dòng qua bộ lọc từ thống kê cột
+(ColumnStats, tính 1 lần theo df) rồi chọn:
+
+- "exact": số dòng ước lượng x PLAN_CANDIDATE_COST_US vừa PLAN_LATENCY_BUDGET_MS -> lọc trước, FAISS /
+  TF-IDF chỉ trên các dòng đã lọc, chấm điểm tất cả (không sót dòng phù hợp nằm ngoài top-k toàn cục).
+- "topk": k vec = top_k x PLAN_OVERFETCH / độ chọn lọc (lọc càng chặt lấy càng sâu), k lex = k vec x
+  PLAN_LEX_RATIO, kẹp trong [PLAN_MIN_DEPTH, số ứng viên chấm điểm được trong budget].
+
+Độ chọn lọc từng điều kiện đọc bằng searchsorted trên mảng đã sắp / tra dict đếm, các điều kiện coi như
+độc lập (nhân tỉ lệ). PLAN_LOG=1: in plan kèm số dòng thực tế sau lọc của mỗi query để chỉnh tham số.
+"""
+
+import math
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from metrics import observe_size
+
+
+PLAN_LATENCY_BUDGET_MS = float(os.getenv("PLAN_LATENCY_BUDGET_MS", "30"))
+# chi phí chấm điểm + lọc 1 ứng viên trong _rank_candidates (đo trên catalog thật)
+PLAN_CANDIDATE_COST_US = float(os.getenv("PLAN_CANDIDATE_COST_US", "200"))
+PLAN_OVERFETCH = float(os.getenv("PLAN_OVERFETCH", "5"))
+PLAN_MIN_DEPTH = int(os.getenv("PLAN_MIN_DEPTH", "50"))
+# TF-IDF rẻ hơn encoder + FAISS và hay trúng từ khoá lọc (quận, tiện ích) -> lấy sâu hơn nhánh vec
+PLAN_LEX_RATIO = float(os.getenv("PLAN_LEX_RATIO", "1.4"))
+PLAN_LOG = os.getenv("PLAN_LOG", "0") == "1"
+
+KM_PER_DEG_LAT = 110.574
+
+
+def _numeric(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def _sorted_finite(values: np.ndarray) -> np.ndarray:
+    return np.sort(values[np.isfinite(values)])
+
+
+def _counts(df: pd.DataFrame, col: str) -> Dict[Any, int]:
+    if col not in df.columns:
+        return {}
+    return {k: int(v) for k, v in df[col].dropna().value_counts().items()}
+
+
+class ColumnStats:
+    """Thống kê cột của df cho planner: mảng đã sắp (giá, rating, sao, toạ độ), đếm theo quận,
+    tần suất tiện ích (tính lười khi gặp lần đầu, nhớ lại)."""
+
+    def __init__(self, df: pd.DataFrame, norm: Callable[[str], str]):
+        self.n = len(df)
+        self._norm = norm
+        price_min = _numeric(df, "_price_min_vnd")
+        price_max = _numeric(df, "_price_max_vnd")
+        self.price_min = _sorted_finite(price_min)
+        self.price_max = _sorted_finite(price_max)
+        self.price_min_nan = self.n - len(self.price_min)
+        self.price_max_nan = self.n - len(self.price_max)
+        self.price_any = int((np.isfinite(price_min) | np.isfinite(price_max)).sum())
+        self.rating = _sorted_finite(_numeric(df, "totalScore"))
+        self.star = _sorted_finite(_numeric(df, "_star_num"))
+        self.lat = _sorted_finite(_numeric(df, "lat"))
+        self.lon = _sorted_finite(_numeric(df, "lng"))
+        self.district_num = _counts(df, "_district_num")
+        self.district_norm = _counts(df, "_district_norm")
+        self._amenity_text = df["_amenities_text_norm"].fillna("") if "_amenities_text_norm" in df.columns else None
+        self._amenity_freq: Dict[str, float] = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, norm: Callable[[str], str]) -> "ColumnStats":
+        return cls(df, norm)
+
+    def _frac(self, count: float) -> float:
+        return min(1.0, max(0.0, count / self.n)) if self.n else 0.0
+
+    @staticmethod
+    def _at_least(arr: np.ndarray, x: float) -> int:
+        return len(arr) - int(np.searchsorted(arr, x, side="left"))
+
+    @staticmethod
+    def _at_most(arr: np.ndarray, x: float) -> int:
+        return int(np.searchsorted(arr, x, side="right"))
+
+    def _in_range(self, arr: np.ndarray, lo: float, hi: float) -> int:
+        return self._at_most(arr, hi) - int(np.searchsorted(arr, lo, side="left"))
+
+    def amenity_fraction(self, amenity: str) -> float:
+        a = self._norm(amenity)
+        if not a or self._amenity_text is None:
+            return 1.0
+        if a not in self._amenity_freq:
+            self._amenity_freq[a] = self._frac(int(self._amenity_text.str.contains(a, regex=False).sum()))
+        return self._amenity_freq[a]
+
+    def _geo_fraction(self, cons: Dict[str, Any]) -> float:
+        lat, lon, bbox = cons.get("near_lat"), cons.get("near_lon"), cons.get("bbox")
+        if not len(self.lat) or not len(self.lon):
+            return 1.0
+        frac = 1.0
+        if lat is not None and lon is not None and cons.get("radius_km"):
+            r = float(cons["radius_km"])
+            dlat = r / KM_PER_DEG_LAT
+            dlon = r / (KM_PER_DEG_LAT * max(math.cos(math.radians(float(lat))), 1e-6))
+            # hình tròn chiếm ~pi/4 khung vuông bao ngoài
+            frac *= (math.pi / 4.0) * (
+                self._in_range(self.lat, float(lat) - dlat, float(lat) + dlat) / len(self.lat)
+            ) * (self._in_range(self.lon, float(lon) - dlon, float(lon) + dlon) / len(self.lon))
+        if bbox:
+            south, west, north, east = (float(x) for x in bbox)
+            frac *= (self._in_range(self.lat, south, north) / len(self.lat)) * (
+                self._in_range(self.lon, west, east) / len(self.lon)
+            )
+        return frac
+
+    def selectivity(self, cons: Dict[str, Any]) -> float:
+        """Tỉ lệ dòng ước lượng qua được _apply_constraints (0..1)."""
+        frac = self._geo_fraction(cons)
+
+        if cons.get("district_nums"):
+            frac *= self._frac(sum(self.district_num.get(d, 0) for d in cons["district_nums"]))
+        elif cons.get("district_names"):
+            frac *= self._frac(sum(self.district_norm.get(d, 0) for d in cons["district_names"]))
+
+        strict = bool(cons.get("explicit_price") or cons.get("require_price"))
+        if cons.get("min_price") is not None:
+            n = self._at_least(self.price_max, float(cons["min_price"]))
+            frac *= self._frac(n if strict else n + self.price_max_nan)
+        if cons.get("max_price") is not None:
+            n = self._at_most(self.price_min, float(cons["max_price"]))
+            frac *= self._frac(n if strict else n + self.price_min_nan)
+        if cons.get("require_price") and cons.get("min_price") is None and cons.get("max_price") is None:
+            frac *= self._frac(self.price_any)
+
+        if cons.get("min_rating") is not None:
+            frac *= self._frac(self._at_least(self.rating, float(cons["min_rating"])))
+        if cons.get("min_star") is not None:
+            frac *= self._frac(self._at_least(self.star, float(cons["min_star"])))
+
+        ams = cons.get("amenities_any") or []
+        if ams:
+            # OR các tiện ích, coi như độc lập
+            miss = 1.0
+            for a in ams:
+                miss *= 1.0 - self.amenity_fraction(a)
+            frac *= 1.0 - miss
+        return max(0.0, min(1.0, frac))
+
+
+@dataclass
+class RetrievalPlan:
+    mode: str  # "exact" | "topk"
+    k_vec: int
+    k_lex: int
+    selectivity: float
+    est_rows: int
+    max_rows: int  # số ứng viên chấm điểm được trong budget
+
+    def describe(self, allowed: Optional[int] = None) -> str:
+        parts = [
+            f"mode={self.mode}", f"k_vec={self.k_vec}", f"k_lex={self.k_lex}",
+            f"sel={self.selectivity:.4f}", f"est_rows={self.est_rows}", f"max_rows={self.max_rows}",
+        ]
+        if allowed is not None:
+            parts.append(f"allowed={allowed}")
+        return " ".join(parts)
+
+
+def plan_retrieval(
+    stats: ColumnStats,
+    cons: Dict[str, Any],
+    top_k: int,
+    allowed: Optional[int] = None,
+    budget_ms: Optional[float] = None,
+) -> RetrievalPlan:
+    """Chọn plan cho 1 query. allowed: số dòng thực tế sau lọc nếu đã biết (thay cho ước lượng)."""
+    budget_ms = PLAN_LATENCY_BUDGET_MS if budget_ms is None else budget_ms
+    max_rows = max(int(budget_ms * 1000.0 / max(PLAN_CANDIDATE_COST_US, 1e-6)), top_k)
+    # est_rows / selectivity luôn là ước lượng (log so với số thật), quyết định theo số thật nếu có
+    sel = stats.selectivity(cons)
+    est_rows = int(math.ceil(sel * stats.n))
+    rows = est_rows if allowed is None else int(allowed)
+
+    if rows <= max_rows:
+        return RetrievalPlan("exact", rows, rows, sel, est_rows, max_rows)
+
+    depth = int(math.ceil(top_k * PLAN_OVERFETCH * stats.n / max(rows, 1)))
+    k_vec = max(PLAN_MIN_DEPTH, top_k, depth)
+    k_vec = min(k_vec, max(int(max_rows / (1.0 + PLAN_LEX_RATIO)), top_k), stats.n)
+    k_lex = min(max(int(math.ceil(k_vec * PLAN_LEX_RATIO)), top_k), stats.n)
+    return RetrievalPlan("topk", k_vec, k_lex, sel, est_rows, max_rows)
+
+
+def log_plan(plan: RetrievalPlan, allowed: Optional[int] = None) -> None:
+    """Ghi plan đã chọn: histogram độ sâu (metrics) + 1 dòng log khi PLAN_LOG=1."""
+    observe_size("plan_k_vec", plan.k_vec)
+    observe_size("plan_k_lex", plan.k_lex)
+    observe_size("plan_est_rows", plan.est_rows)
+    if PLAN_LOG:
+        print(f"[plan] {plan.describe(allowed)}")
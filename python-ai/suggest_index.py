@@ -0,0 +1,200 @@
+"""Gợi ý tự động hoàn thành (autocomplete) cho ô tìm kiếm: tên khách sạn, quận, tiện ích.
+
+SuggestIndex: radix trie (trie nén: mỗi cạnh là 1 chuỗi, không phải 1 ký tự) trên chuỗi đã bỏ dấu
+(name_index.name_tokens). Mỗi nhãn được chèn từ đầu và từ đầu mỗi từ ("cozy" -> "Pham's Cozy House"),
+mỗi nút giữ sẵn top SUGGEST_MAX_K mục phổ biến nhất trong cây con -> gợi ý = đi xuống trie theo
+tiền tố rồi cắt danh sách có sẵn, không duyệt cây con, không gọi model.
+
+Độ phổ biến (0..1, chuẩn hoá theo từng loại để khách sạn / quận / tiện ích so được với nhau):
+- hotel: log(1 + số review) x rating / 5
+- district, amenity: log(1 + số khách sạn)
+Khớp từ giữa nhãn bị nhân SUGGEST_INNER_WORD_WEIGHT; gõ trọn cả nhãn ("quan 1") thì nhãn đó lên đầu.
+"""
+
+import gc
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from name_index import name_tokens
+
+
+SUGGEST_MAX_K = int(os.getenv("SUGGEST_MAX_K", "10"))
+SUGGEST_INNER_WORD_WEIGHT = float(os.getenv("SUGGEST_INNER_WORD_WEIGHT", "0.8"))
+
+Entry = Dict[str, Any]
+
+
+class _Node:
+    # (-điểm, entry id): sort tuple thường ra điểm giảm dần, bằng điểm thì entry trước
+    __slots__ = ("edges", "items", "exact", "top")
+
+    def __init__(self) -> None:
+        self.edges: Dict[str, Tuple[str, "_Node"]] = {}  # ký tự đầu -> (nhãn cạnh, nút con)
+        self.items: Optional[List[Tuple[float, int]]] = None  # key kết thúc đúng tại nút
+        self.exact: Optional[List[Tuple[float, int]]] = None  # như items nhưng chỉ key là cả nhãn
+        self.top: List[Tuple[float, int]] = []
+
+
+def _fold(text: Any) -> str:
+    return " ".join(name_tokens(text))
+
+
+class SuggestIndex:
+    def __init__(self, entries: List[Entry], max_k: int = SUGGEST_MAX_K):
+        """entries: [{"text", "type", "score", ...}]; các key khác được trả nguyên trong gợi ý."""
+        self.entries = entries
+        self.max_k = max_k
+        self._root = _Node()
+        self.keys = 0
+        # build tạo hàng trăm nghìn object nhỏ không có vòng tham chiếu: tắt GC tạm thời để không quét
+        # lại cả heap (DataFrame lớn) nhiều lần, build nhanh ~2 lần
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for eid, e in enumerate(entries):
+                words = _fold(e["text"]).split()
+                for i in range(len(words)):
+                    weight = e["score"] * (1.0 if i == 0 else SUGGEST_INNER_WORD_WEIGHT)
+                    self._insert(" ".join(words[i:]), weight, eid, whole=i == 0)
+            self._finalize()
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _insert(self, key: str, weight: float, eid: int, whole: bool) -> None:
+        node, i = self._root, 0
+        while i < len(key):
+            edge = node.edges.get(key[i])
+            if edge is None:
+                child = _Node()
+                node.edges[key[i]] = (key[i:], child)
+                node = child
+                break
+            label, child = edge
+            if key.startswith(label, i):
+                node, i = child, i + len(label)
+                continue
+            n = 1
+            while n < len(label) and i + n < len(key) and label[n] == key[i + n]:
+                n += 1
+            if n < len(label):
+                # tách cạnh: label = label[:n] + label[n:]
+                mid = _Node()
+                mid.edges[label[n]] = (label[n:], child)
+                node.edges[key[i]] = (label[:n], mid)
+                child = mid
+            node, i = child, i + n
+        if node.items is None:
+            node.items = []
+        node.items.append((-weight, eid))
+        if whole:
+            if node.exact is None:
+                node.exact = []
+            node.exact.append((-weight, eid))
+        self.keys += 1
+
+    def _finalize(self) -> None:
+        # hậu thứ tự không đệ quy: top của nút = top-k (mỗi entry 1 lần, lấy điểm cao nhất) của items + top các con
+        stack: List[Tuple[_Node, bool]] = [(self._root, False)]
+        while stack:
+            node, done = stack.pop()
+            if not done:
+                stack.append((node, True))
+                stack.extend((child, False) for _label, child in node.edges.values())
+                continue
+            if node.exact:
+                node.exact.sort()
+            if not node.edges and node.items and len(node.items) == 1:
+                node.top = node.items  # lá: phần lớn các nút
+            elif not node.items and len(node.edges) == 1:
+                node.top = next(iter(node.edges.values()))[1].top
+            else:
+                cand = list(node.items or ())
+                for _label, child in node.edges.values():
+                    cand.extend(child.top)
+                cand.sort()
+                top: List[Tuple[float, int]] = []
+                seen = set()
+                for x in cand:
+                    if x[1] not in seen:
+                        seen.add(x[1])
+                        top.append(x)
+                        if len(top) == self.max_k:
+                            break
+                node.top = top
+            node.items = None
+
+    def _find(self, prefix: str) -> Tuple[Optional[_Node], bool]:
+        """(nút chứa mọi key bắt đầu bằng prefix, prefix kết thúc đúng tại nút?)."""
+        node, key = self._root, prefix
+        while key:
+            edge = node.edges.get(key[0])
+            if edge is None:
+                return None, False
+            label, child = edge
+            if key.startswith(label):
+                key = key[len(label):]
+                node = child
+            elif label.startswith(key):
+                return child, False
+            else:
+                return None, False
+        return node, True
+
+    def suggest(self, prefix: str, k: int = 8) -> List[Entry]:
+        """Top-k gợi ý cho tiền tố (không dấu / có dấu đều được); k > SUGGEST_MAX_K bị cắt về SUGGEST_MAX_K."""
+        q = _fold(prefix)
+        if not q:
+            return []
+        if prefix[-1:].isspace():
+            q += " "  # "pham " chỉ khớp từ "pham" trọn vẹn
+        node, at_node = self._find(q)
+        if node is None:
+            return []
+        ranked = node.top
+        if at_node and node.exact:
+            exact_ids = {eid for _w, eid in node.exact}
+            ranked = node.exact + [x for x in node.top if x[1] not in exact_ids]
+        return [{**self.entries[eid], "score": round(-w, 4)} for w, eid in ranked[: max(0, k)]]
+
+    @classmethod
+    def from_frame(
+        cls, df: pd.DataFrame, keywords: Optional[Dict[str, int]] = None, max_k: int = SUGGEST_MAX_K,
+    ) -> "SuggestIndex":
+        """Khách sạn + quận (_district_short) + tiện ích (_amenities_list và keywords {nhãn: số khách sạn})."""
+        entries: List[Entry] = []
+
+        reviews = pd.to_numeric(df.get("reviewsCount"), errors="coerce").fillna(0.0).clip(lower=0.0)
+        rating = pd.to_numeric(df.get("totalScore"), errors="coerce").fillna(3.0).clip(0.0, 5.0)
+        pop = (reviews.map(math.log1p) + 1.0) * rating / 5.0
+        pop_max = float(pop.max()) if len(pop) else 1.0
+        districts = df["_district_short"] if "_district_short" in df.columns else pd.Series("", index=df.index)
+        for rid, name, district, p in zip(df.index, df["hotelname"], districts, pop):
+            if isinstance(name, str) and name.strip():
+                entries.append({
+                    "text": name.strip(), "type": "hotel", "score": float(p) / (pop_max or 1.0),
+                    "row_id": int(rid), "district": district if isinstance(district, str) and district else None,
+                })
+
+        def add_counts(kind: str, counts: List[Tuple[str, int]]) -> None:
+            # gộp nhãn trùng sau khi bỏ dấu ("Spa" trong dữ liệu và trong keywords), giữ số lớn hơn
+            merged: Dict[str, Tuple[str, int]] = {}
+            for text, n in counts:
+                key = _fold(text)
+                if key and int(n) > merged.get(key, ("", -1))[1]:
+                    merged[key] = (str(text).strip(), int(n))
+            if not merged:
+                return
+            top = math.log1p(max(n for _t, n in merged.values())) or 1.0
+            for text, n in merged.values():
+                entries.append({"text": text, "type": kind, "score": math.log1p(n) / top, "count": n})
+
+        add_counts("district", list(districts.dropna().astype(str).value_counts().items()))
+        amenities = list((keywords or {}).items())
+        if "_amenities_list" in df.columns:
+            amenities += list(df["_amenities_list"].explode().dropna().astype(str).str.strip().value_counts().items())
+        add_counts("amenity", amenities)
+        return cls(entries, max_k)
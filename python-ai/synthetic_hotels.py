@@ -0,0 +1,161 @@
+"""Sinh dữ liệu khách sạn giả lập đúng schema hotels.csv (phục vụ benchmark ở quy mô lớn).
+
+Phân phối bám theo file thật: quận, chuỗi hạng sao "Khách sạn N sao", giá dạng "min - max",
+tiện ích / nhận xét dạng list Python, tọa độ quanh TP.HCM, tỉ lệ thiếu dữ liệu tương tự.
+Cùng seed -> cùng dữ liệu (benchmark lặp lại được).
+
+Usage:
+    python synthetic_hotels.py --rows 50000 --out hotels_50k.csv
+"""
+
+import argparse
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+COLUMNS = [
+    "hotelname", "address", "street", "district", "city", "lat", "lng", "searchString",
+    "categoryName", "categories", "description1", "description2", "url_google", "website",
+    "phone", "price", "imageUrl", "star", "rank", "totalScore", "oneStar", "twoStar",
+    "threeStar", "fourStar", "fiveStar", "reviewsCount", "amenities", "reviews",
+]
+
+# (tên quận, trọng số, lat tâm, lng tâm)
+DISTRICTS = [
+    ("Quận 1", 0.14, 10.7757, 106.7004),
+    ("Quận 3", 0.10, 10.7843, 106.6844),
+    ("Quận 4", 0.03, 10.7579, 106.7013),
+    ("Quận 5", 0.05, 10.7540, 106.6634),
+    ("Quận 7", 0.09, 10.7340, 106.7216),
+    ("Quận 10", 0.05, 10.7730, 106.6680),
+    ("Quận 12", 0.07, 10.8671, 106.6413),
+    ("Bình Thạnh", 0.11, 10.8106, 106.7091),
+    ("Gò Vấp", 0.07, 10.8387, 106.6653),
+    ("Phú Nhuận", 0.07, 10.7992, 106.6803),
+    ("Tân Bình", 0.08, 10.8015, 106.6520),
+    ("Tân Phú", 0.04, 10.7900, 106.6282),
+    ("Bình Tân", 0.03, 10.7653, 106.6035),
+    ("Thủ Đức", 0.05, 10.8494, 106.7537),
+    ("Nhà Bè", 0.02, 10.6952, 106.7048),
+]
+
+NAME_PREFIX = ["Khách sạn", "Hotel", "Nhà nghỉ", "Homestay", "Resort", "Căn hộ", "Boutique Hotel", ""]
+NAME_WORDS = [
+    "Sài Gòn", "Riverside", "Lotus", "Hoa Mai", "Phương Nam", "Golden", "Sunrise", "Green",
+    "Bến Thành", "Diamond", "Palace", "Cozy", "Star", "Mây", "An Bình", "Hoàng Gia", "Ngọc Lan",
+    "Central", "Garden", "Ocean", "Thanh Bình", "Minh Châu", "Happy", "Dream", "Sky", "Bảo Yến",
+]
+STREETS = [
+    "Nguyễn Huệ", "Lê Lợi", "Đồng Khởi", "Phạm Ngũ Lão", "Bùi Viện", "Cách Mạng Tháng 8",
+    "Nguyễn Trãi", "Võ Văn Tần", "Điện Biên Phủ", "Hai Bà Trưng", "Nguyễn Thị Minh Khai", "Lý Tự Trọng",
+]
+AMENITIES = [
+    "Wi-Fi miễn phí", "Có điều hòa nhiệt độ", "Dịch vụ giặt ủi", "Xe đưa đón ra sân bay",
+    "Bữa sáng miễn phí", "Hồ bơi", "Phòng tập thể dục", "Spa", "Bãi đỗ xe miễn phí", "Nhà hàng",
+    "Quầy bar", "Dịch vụ phòng", "Phù hợp cho trẻ em", "Cho phép thú cưng",
+]
+REVIEW_SNIPPETS = [
+    "Phòng sạch sẽ, lễ tân nhiệt tình", "Vị trí thuận tiện, gần trung tâm", "Giá hợp lý so với chất lượng",
+    "Bữa sáng ngon, nhiều lựa chọn", "Hồ bơi đẹp, view thành phố", "Hơi ồn vào buổi tối",
+    "Nhân viên thân thiện, hỗ trợ nhanh", "Phòng hơi nhỏ nhưng đầy đủ tiện nghi", "Wifi mạnh, giường êm",
+    "Sẽ quay lại lần sau", "Gần chợ Bến Thành, đi bộ được", "Đậu xe thuận tiện",
+]
+DESCRIPTIONS = [
+    "Khách sạn sang trọng nhìn ra sông, có phòng ốc trang nhã, nhà hàng, khu spa và bể bơi ngoài trời.",
+    "Khách sạn bình dân với phòng đơn giản, Wi-Fi miễn phí và lễ tân 24 giờ.",
+    "Căn hộ dịch vụ hiện đại có bếp nhỏ, phù hợp lưu trú dài ngày.",
+    "Resort yên tĩnh với vườn cây, hồ bơi và nhà hàng phục vụ món Việt.",
+]
+SEARCH_STRINGS = ["Khách sạn", "khách sạn", "hotel", "Hotel", "resort", "Nhà nghỉ"]
+CATEGORIES = ["Khách sạn", "Biệt thự", "Khách sạn lưu trú dài hạn", "Khách sạn nghỉ dưỡng", "Nhà khách"]
+STAR_WEIGHTS = [0.24, 0.20, 0.42, 0.02, 0.12]  # 1..5 sao
+
+
+def _py_list(items: List[str]) -> str:
+    """Giống cách hotels.csv lưu list: chuỗi literal Python."""
+    return "[" + ", ".join("None" if x is None else repr(x) for x in items) + "]"
+
+
+def generate_hotels(n: int, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    d_idx = rng.choice(len(DISTRICTS), size=n, p=np.array([d[1] for d in DISTRICTS]) / sum(d[1] for d in DISTRICTS))
+    stars = rng.choice(np.arange(1, 6), size=n, p=STAR_WEIGHTS)
+
+    # giá log-normal theo hạng sao, làm tròn 10.000 VND như dữ liệu thật
+    base = np.exp(rng.normal(np.log(180_000) + 0.45 * stars, 0.35))
+    lo = (np.round(base / 10_000) * 10_000).astype(np.int64)
+    hi = (np.round(lo * rng.uniform(1.3, 2.6, size=n) / 10_000) * 10_000).astype(np.int64)
+
+    reviews_count = rng.geometric(0.08, size=n) - 1
+    has_score = reviews_count > 0
+    total_score = np.where(has_score, np.clip(np.round(rng.normal(4.2, 0.5, size=n), 1), 1.0, 5.0), np.nan)
+
+    rows = []
+    for i in range(n):
+        dname, _w, clat, clng = DISTRICTS[d_idx[i]]
+        prefix = NAME_PREFIX[rng.integers(len(NAME_PREFIX))]
+        words = " ".join(rng.choice(NAME_WORDS, size=rng.integers(1, 3), replace=False))
+        name = f"{prefix} {words} {i}".strip()
+        street = f"{rng.integers(1, 400)} {STREETS[rng.integers(len(STREETS))]}"
+        district = f"{dname}, Thành phố Hồ Chí Minh"
+
+        n_amen = int(rng.integers(0, 8))
+        amenities = _py_list(list(rng.choice(AMENITIES, size=n_amen, replace=False))) if n_amen and rng.random() < 0.3 else np.nan
+        n_rev = int(min(reviews_count[i], 5))
+        reviews = _py_list([REVIEW_SNIPPETS[j] for j in rng.integers(len(REVIEW_SNIPPETS), size=n_rev)] or [None])
+        category = CATEGORIES[0] if rng.random() < 0.9 else CATEGORIES[rng.integers(len(CATEGORIES))]
+        description = DESCRIPTIONS[rng.integers(len(DESCRIPTIONS))] if rng.random() < 0.05 else np.nan
+
+        star_counts = rng.multinomial(int(reviews_count[i]), [0.03, 0.03, 0.09, 0.25, 0.60]) if has_score[i] else [np.nan] * 5
+
+        rows.append({
+            "hotelname": name,
+            "address": f"{street}, {district} 700000, Việt Nam",
+            "street": street,
+            "district": district,
+            "city": "Thành phố Hồ Chí Minh",
+            "lat": clat + rng.normal(0, 0.012),
+            "lng": clng + rng.normal(0, 0.012),
+            "searchString": SEARCH_STRINGS[rng.integers(len(SEARCH_STRINGS))],
+            "categoryName": category,
+            "categories": _py_list([category]),
+            "description1": description,
+            "description2": np.nan,
+            "url_google": f"https://www.google.com/maps/search/?api=1&query=synthetic&query_place_id=SYN{seed}_{i}",
+            "website": np.nan,
+            "phone": f"+84 9{rng.integers(10, 99)} {rng.integers(100, 999)} {rng.integers(100, 999)}",
+            "price": f"{lo[i]} - {hi[i]}",
+            "imageUrl": "",
+            "star": f"Khách sạn {stars[i]} sao",
+            "rank": int(rng.integers(1, 60)),
+            "totalScore": total_score[i],
+            "oneStar": star_counts[0],
+            "twoStar": star_counts[1],
+            "threeStar": star_counts[2],
+            "fourStar": star_counts[3],
+            "fiveStar": star_counts[4],
+            "reviewsCount": int(reviews_count[i]),
+            "amenities": amenities,
+            "reviews": reviews,
+        })
+
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinh hotels.csv giả lập")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", type=str, required=True)
+    args = parser.parse_args()
+
+    df = generate_hotels(args.rows, seed=args.seed)
+    df.to_csv(args.out, index=False)
+    print(f"Đã sinh {len(df)} khách sạn -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Kiểm tra NameIndex.lookup: chỉ khớp đúng khi tên đủ tin cậy (chạy: python -m pytest python-ai/test_name_index.py)."""
+
+import pytest
+
+from name_index import NameIndex
+
+
+NAMES = ["Pham's Cozy House", "Khách Sạn Đông Á", "Tan Son Nhat", "Minh Ngoc Hotel"]
+
+
+@pytest.fixture(scope="module")
+def names() -> NameIndex:
+    return NameIndex(NAMES, list(range(len(NAMES))))
+
+
+@pytest.mark.parametrize("max_edits", [0, 2])
+def test_exact_name(names, max_edits):
+    assert names.lookup("Pham's Cozy House còn phòng không", max_edits=max_edits) == ([0], True)
+    assert names.lookup("so sánh Minh Ngoc Hotel và Khách Sạn Đông Á", max_edits=max_edits) == ([3, 1], True)
+
+
+@pytest.mark.parametrize("max_edits", [0, 2])
+def test_name_after_near_is_not_exact(names, max_edits):
+    for name in NAMES:
+        ids, exact = names.lookup(f"khách sạn gần {name} có hồ bơi giá rẻ", max_edits=max_edits)
+        assert not exact, name
+    assert names.lookup("hotel gần sân bay tân sơn nhất", max_edits=max_edits) == ([2], False)
+
+
+@pytest.mark.parametrize("max_edits", [0, 2])
+def test_low_coverage_is_not_exact(names, max_edits):
+    ids, exact = names.lookup("minh ngoc hotel quận 1 view sông yên tĩnh có bồn tắm ban công", max_edits=max_edits)
+    assert ids == [3] and not exact
+
+
+def test_missing_token_is_not_exact(names):
+    ids, exact = names.lookup("khách sạn phương đông")
+    assert 1 not in ids or not exact
@@ -0,0 +1,254 @@
+"""Chọn / build / tinh chỉnh FAISS index cho vector DB khách sạn.
+
+Loại index:
+- flat      : IndexFlatL2, tìm chính xác (brute-force). Hợp với catalog nhỏ.
+- ivf_flat  : IndexIVFFlat, chia nlist cụm; query chỉ quét nprobe cụm.
+- ivf_pq    : IndexIVFPQ, như ivf_flat nhưng nén vector (product quantization) -> ít RAM.
+- hnsw      : IndexHNSWFlat, đồ thị HNSW; query-time knob là efSearch.
+- auto      : chọn theo số lượng khách sạn (xem choose_index_type).
+
+Vector đã chuẩn hoá L2 (normalize_embeddings=True) nên khoảng cách L2 tương đương cosine,
+giống FAISS.from_documents mặc định của LangChain.
+"""
+
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+INDEX_TYPES = ("auto", "flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Ngưỡng chọn index khi index_type="auto"
+AUTO_FLAT_MAX_ROWS = 20_000
+AUTO_HNSW_MAX_ROWS = 500_000
+
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+PQ_NBITS = 8
+
+# recall@k tối thiểu khi tự chọn nprobe / efSearch mặc định từ recall report
+TARGET_RECALL = 0.95
+
+
+def choose_index_type(n_rows: int, requested: Optional[str] = None) -> str:
+    t = (requested or "auto").lower()
+    if t not in INDEX_TYPES:
+        raise ValueError(f"index_type không hợp lệ: {requested}. Chọn một trong {INDEX_TYPES}")
+    if t != "auto":
+        return t
+    if n_rows <= AUTO_FLAT_MAX_ROWS:
+        return "flat"
+    if n_rows <= AUTO_HNSW_MAX_ROWS:
+        return "hnsw"
+    return "ivf_pq"
+
+
+def _default_nlist(n_rows: int) -> int:
+    # ~4*sqrt(N), mỗi cụm cần đủ điểm để train (>= 39 điểm / centroid theo khuyến nghị FAISS)
+    return int(max(1, min(4 * math.sqrt(max(n_rows, 1)), n_rows // 39 or 1)))
+
+
+def _default_pq_m(dim: int) -> int:
+    # số sub-quantizer phải chia hết dim; lấy ước lớn nhất <= 48 (~8 chiều / sub-vector với dim 384)
+    for m in range(min(48, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def new_index(index_type: str, dim: int, n_rows: int) -> Tuple[Any, Dict[str, Any]]:
+    """Tạo index rỗng (chưa train) cho catalog n_rows dòng. Trả (faiss_index, params)."""
+    import faiss
+
+    params: Dict[str, Any] = {"type": index_type, "dim": int(dim), "metric": "l2"}
+
+    if index_type == "ivf_pq" and n_rows < (2 ** PQ_NBITS) * 39:
+        # không đủ điểm train codebook PQ -> dùng IVF-Flat
+        index_type = "ivf_flat"
+        params["type"] = index_type
+        params["fallback_from"] = "ivf_pq"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = _default_nlist(n_rows)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+        else:
+            m = _default_pq_m(dim)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, PQ_NBITS)
+            params.update({"pq_m": m, "pq_nbits": PQ_NBITS})
+        nprobe = max(1, nlist // 16)
+        index.nprobe = nprobe
+        params.update({"nlist": nlist, "nprobe": nprobe})
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        params.update({"hnsw_m": HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION, "ef_search": HNSW_EF_SEARCH})
+    else:
+        raise ValueError(f"index_type không hợp lệ: {index_type}")
+    return index, params
+
+
+def training_rows(params: Dict[str, Any]) -> int:
+    """Số vector cần gom trước khi train (0 = index không cần train)."""
+    if params.get("type") == "ivf_pq":
+        return int(max(params["nlist"], 2 ** PQ_NBITS) * 39)
+    if params.get("type") == "ivf_flat":
+        return int(params["nlist"] * 39)
+    return 0
+
+
+def build_index(vectors: np.ndarray, index_type: str) -> Tuple[Any, Dict[str, Any]]:
+    """Train (nếu cần) + add vectors. Trả (faiss_index, params để ghi vào db_meta.json)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    t0 = time.perf_counter()
+
+    index, params = new_index(index_type, dim, n)
+    if not index.is_trained:
+        index.train(vectors)
+        params["trained_on"] = int(n)
+
+    index.add(vectors)
+    params["build_seconds"] = round(time.perf_counter() - t0, 3)
+    return index, params
+
+
+def apply_query_params(index: Any, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Dict[str, int]:
+    """Đặt knob lúc query: nprobe (IVF) / efSearch (HNSW). Trả về các giá trị đã áp dụng."""
+    import faiss
+
+    applied: Dict[str, int] = {}
+    if nprobe is not None:
+        try:
+            ivf = faiss.extract_index_ivf(index)
+        except Exception:
+            ivf = None
+        if ivf is not None:
+            ivf.nprobe = int(nprobe)
+            applied["nprobe"] = int(nprobe)
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(ef_search)
+        applied["ef_search"] = int(ef_search)
+    return applied
+
+
+def sample_queries(vectors: np.ndarray, n_queries: int = 200, seed: int = 0) -> np.ndarray:
+    """Query giả lập = vector của chính catalog cộng nhiễu nhỏ rồi chuẩn hoá lại (gần giống query thật,
+    tránh trường hợp tầm thường luôn khớp chính nó)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(n, size=min(n_queries, n), replace=False)
+    queries = vectors[sample] + rng.normal(0, 0.05, size=(len(sample), dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True) + 1e-12
+    return queries
+
+
+class ExactTopK:
+    """Top-k L2 chính xác của một tập query cố định, cập nhật dần theo từng chunk vector.
+
+    Dùng khi ingest streaming: không giữ toàn bộ vectors để dựng IndexFlatL2 làm ground truth.
+    Label = thứ tự vector được add (trùng label của index FAISS khi add tuần tự).
+    """
+
+    def __init__(self, queries: np.ndarray, k: int):
+        self.queries = np.ascontiguousarray(queries, dtype=np.float32)
+        self.k = int(k)
+        self.dist = np.full((len(self.queries), self.k), np.inf, dtype=np.float32)
+        self.labels = np.full((len(self.queries), self.k), -1, dtype=np.int64)
+        self.seconds = 0.0
+        self._q_sq = (self.queries ** 2).sum(axis=1)[:, None]
+
+    def add(self, vectors: np.ndarray, start: int) -> None:
+        t0 = time.perf_counter()
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        d = self._q_sq - 2.0 * (self.queries @ vectors.T) + (vectors ** 2).sum(axis=1)[None, :]
+        dist = np.concatenate([self.dist, d], axis=1)
+        labels = np.concatenate([self.labels, np.broadcast_to(np.arange(start, start + len(vectors)), d.shape)], axis=1)
+        top = np.argpartition(dist, self.k - 1, axis=1)[:, : self.k]
+        self.dist = np.take_along_axis(dist, top, axis=1)
+        self.labels = np.take_along_axis(labels, top, axis=1)
+        self.seconds += time.perf_counter() - t0
+
+
+def recall_report(
+    index: Any,
+    vectors: Optional[np.ndarray],
+    params: Dict[str, Any],
+    k: int = 10,
+    n_queries: int = 200,
+    seed: int = 0,
+    target_recall: float = TARGET_RECALL,
+    exact: Optional[ExactTopK] = None,
+) -> Dict[str, Any]:
+    """So sánh recall@k + latency của index với IndexFlatL2 (chính xác) trên cùng vectors.
+
+    Query lấy từ sample_queries. Quét nhiều giá trị nprobe / efSearch,
+    "recommended" = giá trị nhỏ nhất đạt target_recall (hoặc chạm trần recall nếu index không đạt được).
+    Index được để lại ở trạng thái recommended.
+    exact: ground truth đã tính sẵn (ingest streaming), khi đó không cần vectors.
+    """
+    import faiss
+
+    if exact is None:
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        queries = sample_queries(vectors, n_queries, seed)
+        k = min(k, len(vectors))
+        ref = faiss.IndexFlatL2(vectors.shape[1])
+        ref.add(vectors)
+        t0 = time.perf_counter()
+        _, truth = ref.search(queries, k)
+        exact_ms = (time.perf_counter() - t0) * 1000.0 / len(queries)
+    else:
+        queries, truth, k = exact.queries, exact.labels, exact.k
+        exact_ms = exact.seconds * 1000.0 / len(queries)
+
+    def _measure() -> Dict[str, float]:
+        t = time.perf_counter()
+        _, got = index.search(queries, k)
+        ms = (time.perf_counter() - t) * 1000.0 / len(queries)
+        hits = sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(truth, got))
+        return {"recall_at_k": hits / float(truth.size), "ms_per_query": round(ms, 4)}
+
+    rows: List[Dict[str, Any]] = []
+    knob: Optional[str] = None
+    t = params.get("type")
+    if t in ("ivf_flat", "ivf_pq"):
+        knob = "nprobe"
+        nlist = int(params.get("nlist") or 1)
+        for nprobe in sorted({1, 2, 4, 8, 16, 32, 64, 128, 256, nlist} & set(range(1, nlist + 1))):
+            apply_query_params(index, nprobe=nprobe)
+            rows.append({"nprobe": nprobe, **_measure()})
+    elif t == "hnsw":
+        knob = "ef_search"
+        for ef in (16, 32, 64, 128, 256, 512):
+            apply_query_params(index, ef_search=ef)
+            rows.append({"ef_search": ef, **_measure()})
+    else:
+        rows.append(_measure())
+
+    recommended: Dict[str, Any] = {}
+    if knob is not None:
+        # PQ có trần recall do nén: không đạt target thì lấy điểm nhỏ nhất đã chạm trần (±0.01)
+        ceiling = max(r["recall_at_k"] for r in rows)
+        goal = min(target_recall, ceiling - 0.01)
+        best = next(r for r in rows if r["recall_at_k"] >= goal)
+        recommended = {knob: best[knob], "recall_at_k": best["recall_at_k"]}
+        apply_query_params(index, **{knob: best[knob]})
+
+    return {
+        "index": t,
+        "k": k,
+        "queries": int(len(queries)),
+        "target_recall": target_recall,
+        "exact_ms_per_query": round(exact_ms, 4),
+        "settings": rows,
+        "recommended": recommended,
+    }
@@ -0,0 +1,278 @@
+"""Vector store gọn cho khách sạn: FAISS index + bảng phụ dạng cột (numpy .npy), không pickle.
+
+Luồng hybrid chỉ cần hotelname của các vector trúng, nên không lưu page_content / metadata đầy đủ
+như InMemoryDocstore của LangChain (phải unpickle toàn bộ với allow_dangerous_deserialization=True).
+
+Thư mục vector DB:
+- index.faiss               : faiss.write_index, load bằng mmap nếu bản faiss hỗ trợ
+- rows/labels.npy           : int64, label FAISS của từng dòng (tăng dần)
+- rows/<cột>.bin            : chuỗi UTF-8 của cả cột nối liền
+- rows/<cột>.offsets.npy    : int64, offset đầu/cuối từng dòng trong <cột>.bin (n + 1 phần tử)
+Cột: key (key ổn định của khách sạn, xem prepare_vector_db._hotel_keys) + hotelname.
+"""
+
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from vector_index import apply_query_params, build_index
+
+
+STORE_COLUMNS = ("key", "hotelname")
+INDEX_FILE = "index.faiss"
+ROWS_DIR = "rows"
+_IVF_TYPES = ("ivf_flat", "ivf_pq")
+
+
+class StringColumn:
+    """Cột chuỗi: blob UTF-8 + offsets, đọc từng ô không cần decode cả cột."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_list(cls, values: Iterable[str]) -> "StringColumn":
+        encoded = [str(v).encode("utf-8") for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def tolist(self) -> List[str]:
+        return [self[i] for i in range(len(self))]
+
+    def take(self, rows: Sequence[int]) -> "StringColumn":
+        return StringColumn.from_list(self[int(i)] for i in rows)
+
+    def save(self, directory: str, name: str) -> None:
+        self.blob.tofile(os.path.join(directory, f"{name}.bin"))
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), self.offsets)
+
+    @classmethod
+    def load(cls, directory: str, name: str, mmap: bool = True) -> "StringColumn":
+        bin_path = os.path.join(directory, f"{name}.bin")
+        offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode="r" if mmap else None)
+        if os.path.getsize(bin_path) == 0:
+            blob = np.zeros(0, dtype=np.uint8)
+        elif mmap:
+            blob = np.memmap(bin_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.fromfile(bin_path, dtype=np.uint8)
+        return cls(blob, offsets)
+
+
+def _read_index(path: str, mmap: bool) -> Any:
+    import faiss
+
+    if mmap:
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None) or getattr(faiss, "IO_FLAG_MMAP", None)
+        if flag is not None:
+            try:
+                return faiss.read_index(path, flag)
+            except Exception:
+                pass
+    return faiss.read_index(path)
+
+
+class CompactVectorStore:
+    """FAISS index + cột key / hotelname, dòng sắp theo label tăng dần."""
+
+    def __init__(self, index: Any, labels: np.ndarray, columns: Dict[str, StringColumn], embeddings=None):
+        self.index = index
+        self.labels = labels
+        self.columns = columns
+        self.embeddings = embeddings
+        self._name_labels: Optional[Dict[str, List[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    # ---------- build / convert ----------
+
+    @classmethod
+    def from_rows(cls, index: Any, keys: List[str], hotelnames: List[str], embeddings=None) -> "CompactVectorStore":
+        """Index vừa build, vector thứ i (label i) ứng với keys[i] / hotelnames[i]."""
+        return cls(
+            index,
+            np.arange(len(keys), dtype=np.int64),
+            {"key": StringColumn.from_list(keys), "hotelname": StringColumn.from_list(hotelnames)},
+            embeddings,
+        )
+
+    @classmethod
+    def from_langchain(cls, db: Any) -> "CompactVectorStore":
+        """Chuyển DB LangChain FAISS cũ (index.pkl) sang định dạng gọn, chỉ giữ cột cần."""
+        labels = np.array(sorted(db.index_to_docstore_id), dtype=np.int64)
+        keys = [db.index_to_docstore_id[int(i)] for i in labels]
+        names = [(getattr(db.docstore.search(k), "metadata", None) or {}).get("hotelname") or "" for k in keys]
+        return cls(
+            db.index,
+            labels,
+            {"key": StringColumn.from_list(keys), "hotelname": StringColumn.from_list(names)},
+            db.embeddings,
+        )
+
+    # ---------- persistence ----------
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, ROWS_DIR, "labels.npy"))
+
+    def save(self, path: str) -> None:
+        import faiss
+
+        rows_dir = os.path.join(path, ROWS_DIR)
+        os.makedirs(rows_dir, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(path, INDEX_FILE))
+        np.save(os.path.join(rows_dir, "labels.npy"), np.asarray(self.labels, dtype=np.int64))
+        for name, col in self.columns.items():
+            col.save(rows_dir, name)
+        # docstore pickle của định dạng LangChain cũ không còn dùng
+        legacy = os.path.join(path, "index.pkl")
+        if os.path.exists(legacy):
+            os.remove(legacy)
+
+    @classmethod
+    def load(cls, path: str, embeddings=None, mmap: bool = True) -> "CompactVectorStore":
+        """mmap=True: index + bảng phụ map thẳng từ file (chỉ đọc). Cần sửa (update) thì mmap=False."""
+        rows_dir = os.path.join(path, ROWS_DIR)
+        index = _read_index(os.path.join(path, INDEX_FILE), mmap)
+        labels = np.load(os.path.join(rows_dir, "labels.npy"), mmap_mode="r" if mmap else None)
+        columns = {name: StringColumn.load(rows_dir, name, mmap) for name in STORE_COLUMNS}
+        return cls(index, labels, columns, embeddings)
+
+    # ---------- query ----------
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        if len(queries) == 1:
+            return np.asarray([self.embeddings.embed_query(queries[0])], dtype=np.float32)
+        return np.asarray(self.embeddings.embed_documents(list(queries)), dtype=np.float32)
+
+    def rows_for(self, labels: np.ndarray) -> np.ndarray:
+        """label FAISS -> vị trí dòng trong bảng phụ (-1 nếu không có)."""
+        labels = np.asarray(labels, dtype=np.int64)
+        known = np.asarray(self.labels)
+        if not len(known):
+            return np.full(labels.shape, -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(known, labels), len(known) - 1)
+        return np.where((labels >= 0) & (known[rows] == labels), rows, -1)
+
+    def labels_for_names(self, names: Iterable[str]) -> np.ndarray:
+        """Label FAISS của các dòng có hotelname (so khớp strip + lower) nằm trong names."""
+        if self._name_labels is None:
+            by_name: Dict[str, List[int]] = {}
+            for label, name in zip(np.asarray(self.labels).tolist(), self.columns["hotelname"].tolist()):
+                by_name.setdefault(name.strip().lower(), []).append(int(label))
+            self._name_labels = by_name
+        out: List[int] = []
+        for nm in set(str(n).strip().lower() for n in names):
+            out.extend(self._name_labels.get(nm, ()))
+        return np.array(sorted(out), dtype=np.int64)
+
+    def _search_subset(self, vectors: np.ndarray, k: int, labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """index.search chỉ trên các label cho trước, quét đủ tập con.
+
+        - ivf_*: IDSelector + dò mọi list (nprobe = nlist).
+        - hnsw: lọc trong lúc duyệt đồ thị bỏ sót nhiều -> lấy lại vector của tập con, tính L2 trực tiếp.
+        - flat: IDSelector.
+        """
+        import faiss
+
+        labels = np.ascontiguousarray(labels, dtype=np.int64)
+        if hasattr(self.index, "hnsw"):
+            sub = self.index.reconstruct_batch(labels)
+            dists = ((vectors[:, None, :] - sub[None, :, :]) ** 2).sum(axis=2)
+            order = np.argsort(dists, axis=1, kind="stable")[:, :k]
+            return np.take_along_axis(dists, order, axis=1), labels[order]
+        sel = faiss.IDSelectorBatch(labels)
+        try:
+            ivf = faiss.extract_index_ivf(self.index)
+        except Exception:
+            ivf = None
+        if ivf is not None:
+            params = faiss.SearchParametersIVF(sel=sel, nprobe=int(ivf.nlist))
+        else:
+            params = faiss.SearchParameters(sel=sel)
+        return self.index.search(vectors, k, params=params)
+
+    def search_names(
+        self, vectors: np.ndarray, k: int, labels: Optional[np.ndarray] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Mỗi query -> [(hotelname, L2 distance)] theo thứ tự gần nhất.
+        labels: chỉ tìm trong các label này (tập đã lọc, xem labels_for_names)."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if labels is None:
+            dists, ids = self.index.search(vectors, k)
+        elif not len(labels) or k <= 0:
+            return [[] for _ in range(len(vectors))]
+        else:
+            k = min(k, len(labels))
+            dists, ids = self._search_subset(vectors, k, labels)
+        rows = self.rows_for(ids.ravel()).reshape(ids.shape)
+        names = self.columns["hotelname"]
+        return [
+            [(names[int(r)], float(d)) for d, r in zip(row_dists, row_rows) if r >= 0]
+            for row_dists, row_rows in zip(dists, rows)
+        ]
+
+    # ---------- incremental update ----------
+
+    def key_to_label(self) -> Dict[str, int]:
+        return dict(zip(self.columns["key"].tolist(), (int(x) for x in self.labels)))
+
+    def remove(self, keys: List[str], index_params: Dict[str, Any]) -> None:
+        """Xoá vector + dòng theo key, xử lý riêng từng loại index.
+
+        - flat: IndexFlat.remove_ids dồn vị trí -> label đánh lại 0..n-1.
+        - ivf_*: remove_ids giữ nguyên label các vector còn lại.
+        - hnsw: không hỗ trợ remove_ids -> lấy lại vector còn lại từ index và build lại đồ thị
+          (không phải embed lại, nhưng tốn O(N) so với kích thước catalog).
+        """
+        if not keys:
+            return
+        self._name_labels = None
+        row_of = {k: i for i, k in enumerate(self.columns["key"].tolist())}
+        drop = np.array(sorted(row_of[k] for k in keys), dtype=np.int64)
+        keep = np.setdiff1d(np.arange(len(self.labels)), drop)
+        t = index_params.get("type")
+
+        if t == "hnsw":
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)[np.asarray(self.labels)[keep]]
+            index, _ = build_index(vectors, t)
+            apply_query_params(index, ef_search=index_params.get("ef_search"))
+            self.index = index
+        else:
+            self.index.remove_ids(np.asarray(self.labels)[drop])
+
+        if t in _IVF_TYPES:
+            self.labels = np.asarray(self.labels)[keep]
+        else:
+            self.labels = np.arange(len(keep), dtype=np.int64)
+        self.columns = {name: col.take(keep) for name, col in self.columns.items()}
+
+    def add(self, vectors: np.ndarray, keys: List[str], hotelnames: List[str], index_params: Dict[str, Any]) -> None:
+        if not keys:
+            return
+        self._name_labels = None
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if index_params.get("type") in _IVF_TYPES:
+            # label IVF không bị dồn khi xoá -> cấp label mới sau label lớn nhất
+            start = int(self.labels[-1]) + 1 if len(self.labels) else 0
+            new_labels = np.arange(start, start + len(vectors), dtype=np.int64)
+            self.index.add_with_ids(vectors, new_labels)
+        else:
+            start = int(self.index.ntotal)
+            new_labels = np.arange(start, start + len(vectors), dtype=np.int64)
+            self.index.add(vectors)
+        self.labels = np.concatenate([np.asarray(self.labels, dtype=np.int64), new_labels])
+        self.columns = {
+            "key": StringColumn.from_list(self.columns["key"].tolist() + list(keys)),
+            "hotelname": StringColumn.from_list(self.columns["hotelname"].tolist() + list(hotelnames)),
+        }
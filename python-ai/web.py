@@ -2,14 +2,16 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from transformers import AutoTokenizer, AutoModel
-from sklearn.metrics.pairwise import cosine_similarity
+from dataclasses import dataclass
+from typing import Dict
 import folium
 from streamlit_folium import folium_static
-import requests
-import time
 import torch
 import torch.nn.functional as F
 from CreateVectorEmbeddings import encode_batch, create_vector_embeddings
+from geo_client import get_client
+from hotel_data import apply_coords_overlay, coords_overlay_path, missing_coords_mask
+from map_layers import MAP_MAX_ROUTES, add_hotel_markers, simplify_route
 import os
 
 # Cấu hình trang
@@ -20,10 +22,6 @@ st.set_page_config(
 )
 
 # Constants
-NOMINATIM = "https://nominatim.openstreetmap.org"
-OSRM = "https://router.project-osrm.org"
-UA = {"User-Agent": "Hotel-Finder-Streamlit/1.0"}
-
 DISTRICTS = [
     "Tất cả",
     "Quận 1", "Quận 3", "Quận 4", "Quận 5",
@@ -36,6 +34,9 @@ DISTRICTS = [
 
 ACCOMMODATION_TYPES = ["Tất cả", "khách sạn", "resort", "homestay"]
 
+# số entry tối đa của cache query / kết quả trong session_state
+SESSION_CACHE_SIZE = 64
+
 # Caching functions
 @st.cache_resource
 def load_model():
@@ -43,13 +44,17 @@ def load_model():
     model = AutoModel.from_pretrained('AITeamVN/Vietnamese_Embedding')
     return tokenizer, model
 
-@st.cache_data
+# cache_resource: trả đúng object đã load (cache_data copy df + embeddings ở mỗi rerun);
+# các hàm bên dưới chỉ đọc, không sửa df
+@st.cache_resource
 def load_data(): 
     if not os.path.exists('hotels.csv'):
         st.error("Không tìm thấy file hotels.csv!")
         return None, None
     
     df = pd.read_csv('hotels.csv')
+    # toạ độ thiếu đã geocode lúc ingest (bulk_geocode.py -> hotels.coords.csv)
+    df = apply_coords_overlay(df, coords_overlay_path('hotels.csv'), "lat", "lon")
     
     if not os.path.exists('hotel_embeddings.npy'):
         st.warning("Đang tạo embeddings... Vui lòng đợi")
@@ -58,78 +63,95 @@ def load_data():
     embeddings = np.load('hotel_embeddings.npy')
     return df, embeddings
 
+# Geocode / route qua geo_client: cache sqlite + token bucket, rerun cùng vị trí không gọi mạng
 def geocode(q):
-    time.sleep(1.0)
     try:
-        r = requests.get(
-            f"{NOMINATIM}/search",
-            params={"q": q, "format": "jsonv2", "limit": 1},
-            headers=UA,
-            timeout=10
-        )
-        r.raise_for_status()
-        j = r.json()
-        if not j:
-            return 10.7626, 106.6822, q
-        return float(j[0]["lat"]), float(j[0]["lon"]), j[0].get("display_name", q)
-    except:
-        return 10.7626, 106.6822, q
+        hit = get_client().geocode(q)
+    except Exception:
+        hit = None
+    return hit if hit is not None else (10.7626, 106.6822, q)
 
-def osrm_geom(lon1, lat1, lon2, lat2):
-    try:
-        r = requests.get(
-            f"{OSRM}/route/v1/driving/{lon1},{lat1};{lon2},{lat2}",
-            params={"overview": "full", "geometries": "geojson"},
-            headers=UA,
-            timeout=30
-        )
-        r.raise_for_status()
-        data = r.json()
-        return data["routes"][0]["geometry"]
-    except:
-        return {"coordinates": [[lon1, lat1], [lon2, lat2]]}
+def osrm_geoms(lon, lat, dests):
+    """Tuyến tới nhiều khách sạn: gọi song song, có deadline chung (quá hạn -> đường thẳng)."""
+    return get_client().routes_from(lon, lat, dests)
+
+@dataclass
+class FilterIndex:
+    """Mask bool tính sẵn cho từng lựa chọn quận / loại chỗ ở + cột số dạng numpy, theo vị trí dòng df."""
+    district: Dict[str, np.ndarray]
+    accommodation: Dict[str, np.ndarray]
+    star: np.ndarray
+    price: np.ndarray
+    star_options: list
+    embeddings: np.ndarray  # đã chuẩn hoá L2 -> dot product = cosine
+
+# tham số có "_" -> streamlit không hash df / embeddings mỗi rerun (load_data luôn trả cùng object)
+@st.cache_resource
+def build_filter_index(_df, _embeddings):
+    def contains(col, text):
+        if col not in _df.columns:
+            return np.zeros(len(_df), dtype=bool)
+        return _df[col].str.contains(text, case=False, na=False, regex=False).to_numpy(dtype=bool)
+    
+    emb = np.asarray(_embeddings, dtype=np.float32)
+    norms = np.linalg.norm(emb, axis=1, keepdims=True)
+    return FilterIndex(
+        district={d: contains('address', d) for d in DISTRICTS if d != "Tất cả"},
+        accommodation={t: contains('hotelname', t) | contains('searchString', t) for t in ACCOMMODATION_TYPES if t != "Tất cả"},
+        star=pd.to_numeric(_df['star'], errors='coerce').to_numpy(dtype=float),
+        price=pd.to_numeric(_df['price'], errors='coerce').to_numpy(dtype=float),
+        star_options=["Tất cả"] + [str(i) for i in sorted(_df['star'].unique()) if pd.notna(i)],
+        embeddings=emb / np.where(norms > 0, norms, 1.0),
+    )
 
-def filter_hotels(df, district, price_range, accommodation_type, star_rating):
-    filtered_df = df.copy()
+def filter_hotels(fidx, district, price_range, accommodation_type, star_rating):
+    """Vị trí (iloc) các khách sạn thoả bộ lọc: chỉ AND các mask đã tính sẵn, không copy / quét chuỗi."""
+    mask = (fidx.price >= price_range[0]) & (fidx.price <= price_range[1])
     if district != "Tất cả":
-        filtered_df = filtered_df[
-            filtered_df['address'].str.contains(district, case=False, na=False)
-        ]
-    filtered_df = filtered_df[
-        (filtered_df['price'] >= price_range[0]) & 
-        (filtered_df['price'] <= price_range[1])
-    ]
+        mask &= fidx.district[district]
     if accommodation_type != "Tất cả":
-        filtered_df = filtered_df[
-            filtered_df['hotelname'].str.contains(accommodation_type, case=False, na=False) |
-            filtered_df['searchString'].str.contains(accommodation_type, case=False, na=False)
-        ]
+        mask &= fidx.accommodation[accommodation_type]
     if star_rating != "Tất cả":
-        filtered_df = filtered_df[filtered_df['star'] == int(float(star_rating))]
-    return filtered_df
+        mask &= fidx.star == int(float(star_rating))
+    return np.flatnonzero(mask)
+
+def _session_cache(name):
+    return st.session_state.setdefault(name, {})
+
+def _cache_put(cache, key, value):
+    if len(cache) >= SESSION_CACHE_SIZE:
+        cache.pop(next(iter(cache)))
+    cache[key] = value
 
-def search_hotels(query, df, embeddings, tokenizer, model, top_k=10):
-    if len(df) == 0:
+def search_hotels(query, df, positions, fidx, tokenizer, model, filter_key, top_k=10):
+    """Top-k theo cosine trong các vị trí đã lọc. Embedding query + kết quả cache theo
+    (query, bộ lọc, top_k) trong session_state -> rerun do widget khác không encode / tính lại."""
+    if len(positions) == 0:
         return pd.DataFrame()
     
-    df_reset = df.reset_index(drop=True)
-    # Lấy indices tương ứng với embeddings
-    df_indices = df.index.to_numpy()
-    filtered_embeddings = embeddings[df_indices]
-    
-    query_embedding = encode_batch([query], tokenizer, model).numpy()
-    similarities = cosine_similarity(query_embedding, filtered_embeddings)
-    
-    top_k = min(top_k, len(df))
-    top_indices = similarities.argsort()[0][-top_k:][::-1]
-    top_scores = similarities[0][top_indices]
+    results = _session_cache("search_results")
+    key = (query, filter_key, top_k)
+    if key not in results:
+        query_embs = _session_cache("query_embeddings")
+        if query not in query_embs:
+            _cache_put(query_embs, query, encode_batch([query], tokenizer, model).numpy().astype(np.float32)[0])
+        q = query_embs[query]
+        q = q / (np.linalg.norm(q) or 1.0)
+        
+        similarities = fidx.embeddings[positions] @ q
+        k = min(top_k, len(positions))
+        top = np.argpartition(-similarities, k - 1)[:k] if k < len(positions) else np.arange(len(positions))
+        top = top[np.argsort(-similarities[top], kind="stable")]
+        _cache_put(results, key, (positions[top], similarities[top]))
     
-    result_df = df_reset.iloc[top_indices].copy()
+    top_positions, top_scores = results[key]
+    result_df = df.iloc[top_positions].copy()
     result_df['score'] = top_scores
     return result_df
 
 def create_map(recommendations, user_location):
     user_lat, user_lon, _ = geocode(user_location)
+    recommendations = recommendations[~missing_coords_mask(recommendations, "lat", "lon")]
     
     if len(recommendations) == 0:
         m = folium.Map(location=[user_lat, user_lon], zoom_start=13)
@@ -144,27 +166,28 @@ def create_map(recommendations, user_location):
         icon=folium.Icon(color='red', icon='home', prefix='fa')
     ).add_to(m)
     
-    for idx, row in recommendations.iterrows():
-        popup_html = f"""
-        <div style="width: 200px;">
-            <h4>{row['hotelname']}</h4>
-            <p><b>Địa chỉ:</b> {row['address']}</p>
-            <p><b>Sao:</b> {row.get('star', 'N/A')} ⭐</p>
-            <p><b>Giá:</b> {row.get('price', 0):,.0f} VNĐ</p>
-            <p><b>Score:</b> {row.get('score', 0):.3f}</p>
-        </div>
-        """
-        folium.Marker(
-            [row["lat"], row["lon"]],
-            popup=folium.Popup(popup_html, max_width=250),
-            icon=folium.Icon(color='blue', icon='hotel', prefix='fa')
+    # marker: dữ liệu nhúng 1 lần, cluster khi nhiều khách sạn, popup dựng lúc click (map_layers.py)
+    add_hotel_markers(
+        m, recommendations,
+        fields=[("Địa chỉ", "address"), ("Sao", "star"), ("Giá", "price"), ("Score", "score")],
+        formatters={
+            "star": lambda v: f"{'N/A' if v is None or v != v else v} ⭐",
+            "price": lambda v: f"{(v if v is not None and v == v else 0):,.0f} VNĐ",
+            "score": lambda v: f"{(v if v is not None and v == v else 0):.3f}",
+        },
+    )
+    
+    # lấy tất cả tuyến 1 lần (song song) -> thời gian vẽ map ~ tuyến chậm nhất, không phải tổng
+    routed = recommendations.head(MAP_MAX_ROUTES)
+    geoms = osrm_geoms(user_lon, user_lat, list(zip(routed["lon"], routed["lat"])))
+    
+    for geom in geoms:
+        # overview=full có hàng trăm điểm / tuyến -> Douglas–Peucker theo sai số pixel
+        latlon = [(lat, lon) for lon, lat in simplify_route(geom)["coordinates"]]
+        folium.PolyLine(
+            latlon, color='blue', weight=3, opacity=0.6,
+            dash_array='6' if geom.get("fallback") else None
         ).add_to(m)
-        try:
-            geom = osrm_geom(user_lon, user_lat, row["lon"], row["lat"])
-            latlon = [(lat, lon) for lon, lat in geom["coordinates"]]
-            folium.PolyLine(latlon, color='blue', weight=3, opacity=0.6).add_to(m)
-        except:
-            pass
     return m
 
 # Main App
@@ -188,8 +211,10 @@ def main():
     
     district = st.sidebar.selectbox("🏙️ Quận/Huyện", options=DISTRICTS)
     
-    min_price = int(df['price'].min())
-    max_price = int(df['price'].max())
+    fidx = build_filter_index(df, embeddings)
+    
+    min_price = int(np.nanmin(fidx.price))
+    max_price = int(np.nanmax(fidx.price))
     price_range = st.sidebar.slider(
         "💰 Khoảng giá (VNĐ)",
         min_value=min_price,
@@ -201,8 +226,7 @@ def main():
     
     accommodation_type = st.sidebar.selectbox("🏠 Loại chỗ ở", options=ACCOMMODATION_TYPES)
     
-    star_options = ["Tất cả"] + [str(i) for i in sorted(df['star'].unique()) if pd.notna(i)]
-    star_rating = st.sidebar.selectbox("⭐ Số sao", options=star_options)
+    star_rating = st.sidebar.selectbox("⭐ Số sao", options=fidx.star_options)
     
     top_k = st.sidebar.slider("📊 Số kết quả hiển thị", 5, 20, 10, 5)
     st.sidebar.markdown("---")
@@ -219,12 +243,17 @@ def main():
     with col2:
         search_button = st.button("🔍 Tìm kiếm", use_container_width=True, type="primary")
     
-    filtered_df = filter_hotels(df, district, price_range, accommodation_type, star_rating)
-    st.info(f"Tìm thấy **{len(filtered_df)}** khách sạn phù hợp với bộ lọc")
+    filter_key = (district, tuple(price_range), accommodation_type, star_rating)
+    positions = filter_hotels(fidx, district, price_range, accommodation_type, star_rating)
+    st.info(f"Tìm thấy **{len(positions)}** khách sạn phù hợp với bộ lọc")
     
+    # giữ kết quả qua các rerun do widget khác (kết quả lấy từ cache trong session_state)
     if search_button and search_query:
+        st.session_state["active_query"] = search_query
+    
+    if search_query and st.session_state.get("active_query") == search_query:
         with st.spinner("Đang tìm kiếm..."):
-            results = search_hotels(search_query, filtered_df, embeddings, tokenizer, model, top_k)
+            results = search_hotels(search_query, df, positions, fidx, tokenizer, model, filter_key, top_k)
         if len(results) == 0:
             st.warning("Không tìm thấy khách sạn phù hợp.")
         else:
@@ -247,9 +276,9 @@ def main():
                     with col2:
                         st.metric("Độ phù hợp", f"{row['score']:.1%}")
     
-    elif not search_query and len(filtered_df) > 0:
+    elif not search_query and len(positions) > 0:
         st.markdown("### 🏆 Top khách sạn theo bộ lọc")
-        display_df = filtered_df.head(top_k).copy()
+        display_df = df.iloc[positions[:top_k]].copy()
         if len(display_df) > 0:
             display_df['score'] = 1.0
             map_obj = create_map(display_df, user_location)